@@ -0,0 +1,380 @@
+"""
+Offline bulk ingestion of scanned KYC images, without going through HTTP.
+
+Walks a directory or a zip archive, runs the OCR -> classification -> parsing
+pipeline over the images in a pool of worker processes, and streams the
+results to JSONL (or Parquet, if pyarrow is installed). Optionally loads the
+parsed records into MongoDB as well.
+
+Usage:
+
+    python -m app.ingest scans/ results.jsonl
+    python -m app.ingest scans.zip results.parquet --mongo --workers 8
+
+Runs are resumable: the keys (relative path or archive member name) already
+in the output and in the error log are skipped when the same command is run
+again. Per-document failures go to `<output>.errors.jsonl` and do not stop the
+run; pass `--retry-errors` to process them again.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+
+from app import config
+
+# --- Inputs ---
+
+def list_inputs(source: str) -> list[str]:
+    """Returns the keys of every image under `source`, in a stable order."""
+    if os.path.isdir(source):
+        keys = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(config.IMAGE_EXTENSIONS):
+                    keys.append(os.path.relpath(os.path.join(root, name), source))
+        return sorted(keys)
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return sorted(
+                info.filename for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(config.IMAGE_EXTENSIONS)
+            )
+    raise ValueError(f"{source} is neither a directory nor a zip archive.")
+
+
+# Open archives, per worker process, so members are not re-indexed per chunk.
+_ARCHIVES: dict[str, zipfile.ZipFile] = {}
+
+
+def _read_input(source: str, key: str, max_bytes: int) -> bytes:
+    if os.path.isdir(source):
+        path = os.path.join(source, key)
+        if os.path.getsize(path) > max_bytes:
+            raise ValueError(f"File is larger than {max_bytes} bytes.")
+        with open(path, "rb") as f:
+            return f.read()
+    if source not in _ARCHIVES:
+        _ARCHIVES[source] = zipfile.ZipFile(source)
+    archive = _ARCHIVES[source]
+    # Checked before inflating, as for uploaded archives.
+    if archive.getinfo(key).file_size > max_bytes:
+        raise ValueError(f"File is larger than {max_bytes} bytes.")
+    return archive.read(key)
+
+
+# --- Work done in the worker processes ---
+
+def _init_worker():
+    from app.services import model_registry
+    model_registry.warm_up()
+
+
+def _to_record(key: str, output, include_text: bool) -> dict:
+    record = {
+        "key": key,
+        "document_type": output.document_type.value,
+        "data": output.data.model_dump() if output.data is not None else None,
+    }
+    if include_text:
+        record["raw_text"] = output.raw_text
+    return record
+
+
+def _error(key: str, message: str, details: str | None = None) -> dict:
+    return {"key": key, "error": message, "details": details}
+
+
+def process_chunk(source: str, keys: list[str], max_bytes: int, include_text: bool) -> tuple[list[dict], list[dict]]:
+    """
+    Processes a chunk of images with one batched OCR pass. Returns the result
+    records and the error records.
+    """
+    from app.services import pipeline
+
+    records, errors = [], []
+    loaded_keys, images = [], []
+    for key in keys:
+        try:
+            images.append(_read_input(source, key, max_bytes))
+            loaded_keys.append(key)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            errors.append(_error(key, f"Could not read file: {e}"))
+
+    try:
+        outputs = pipeline.process_batch(images)
+    except Exception:
+        # Isolate the document that broke the batch.
+        outputs = []
+        for key, image in zip(loaded_keys, images):
+            try:
+                outputs.append(pipeline.process_document(image))
+            except Exception as e:
+                outputs.append(None)
+                errors.append(_error(key, f"{type(e).__name__}: {e}", traceback.format_exc()))
+
+    for key, output in zip(loaded_keys, outputs):
+        if output is None:
+            continue
+        if output.error:
+            errors.append(_error(key, output.error))
+        else:
+            records.append(_to_record(key, output, include_text))
+    return records, errors
+
+
+# --- Outputs ---
+
+class JSONLWriter:
+    def __init__(self, path: str):
+        _truncate_partial_line(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, records: list[dict]):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Writes one part file per run into the directory `path`, one row group per
+    chunk. `data` is stored as a JSON string, since its fields depend on the
+    document type.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow: pip install pyarrow")
+        self._pa = pa
+        os.makedirs(path, exist_ok=True)
+        part = len([name for name in os.listdir(path) if name.endswith(".parquet")])
+        self._schema = pa.schema([
+            ("key", pa.string()), ("document_type", pa.string()),
+            ("data", pa.string()), ("raw_text", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(os.path.join(path, f"part-{part:05d}.parquet"), self._schema)
+
+    def write(self, records: list[dict]):
+        if not records:
+            return
+        columns = {
+            "key": [r["key"] for r in records],
+            "document_type": [r["document_type"] for r in records],
+            "data": [json.dumps(r["data"], ensure_ascii=False) if r["data"] is not None else None for r in records],
+            "raw_text": [r.get("raw_text") for r in records],
+        }
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _truncate_partial_line(path: str):
+    """Drops a half-written last line left by an interrupted run."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        # Scan backwards for the last newline instead of reading the whole file.
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            block = f.read(end - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end != f.seek(0, os.SEEK_END):
+            f.truncate(end)
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith(".parquet")
+
+
+def done_keys(output: str, error_log: str, retry_errors: bool) -> set[str]:
+    """The keys finished by previous runs, read back from their output."""
+    keys: set[str] = set()
+    if _is_parquet(output):
+        if os.path.isdir(output):
+            import pyarrow.parquet as pq
+            for name in os.listdir(output):
+                if name.endswith(".parquet"):
+                    try:
+                        keys.update(pq.read_table(os.path.join(output, name), columns=["key"]).column("key").to_pylist())
+                    except Exception:
+                        # A part file whose footer was never written; its rows are redone.
+                        pass
+    else:
+        keys.update(_jsonl_keys(output))
+    if not retry_errors:
+        keys.update(_jsonl_keys(error_log))
+    return keys
+
+
+def _jsonl_keys(path: str) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+    keys = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                keys.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                continue
+    return keys
+
+
+class MongoLoader:
+    """Bulk-inserts parsed records into the KYC collections."""
+
+    def __init__(self):
+        import asyncio
+        from pymongo.errors import BulkWriteError
+        from app import persistence
+        from app.database import sync_database
+        from app.services.document_classifier import DocumentType
+
+        # The unique indexes are what reject numbers already on record.
+        asyncio.run(persistence.ensure_indexes())
+        database = sync_database()
+        self._collections = {
+            doc_type.value: database[collection.name]
+            for doc_type, (collection, _) in persistence.KYC_COLLECTIONS.items()
+        }
+        self._number_fields = {
+            doc_type.value: field for doc_type, (_, field) in persistence.KYC_COLLECTIONS.items()
+        }
+        self._bulk_write_error = BulkWriteError
+        self._duplicate_key = persistence.DUPLICATE_KEY_ERROR
+        self._unknown = DocumentType.UNKNOWN.value
+        self.inserted = 0
+        self.duplicates = 0
+        self.without_number = 0
+
+    def load(self, records: list[dict]):
+        by_type: dict[str, list[dict]] = {}
+        for record in records:
+            if record["data"] is None or record["document_type"] == self._unknown:
+                continue
+            # As in persistence.save_if_new: the partial unique indexes only
+            # cover records with a number, so records without one are not stored.
+            if not record["data"].get(self._number_fields[record["document_type"]]):
+                self.without_number += 1
+                continue
+            # As in persistence.save_if_new: what the API's indexes catch up by.
+            document = {**record["data"], "inserted_at": datetime.now(timezone.utc)}
+            by_type.setdefault(record["document_type"], []).append(document)
+        for doc_type, documents in by_type.items():
+            try:
+                result = self._collections[doc_type].insert_many(documents, ordered=False)
+                self.inserted += len(result.inserted_ids)
+            except self._bulk_write_error as e:
+                errors = e.details.get("writeErrors", [])
+                duplicates = sum(1 for error in errors if error.get("code") == self._duplicate_key)
+                if duplicates != len(errors):
+                    raise
+                self.duplicates += duplicates
+                self.inserted += len(documents) - duplicates
+
+
+# --- Driver ---
+
+def run(args) -> int:
+    error_log = args.errors or f"{args.output}.errors.jsonl"
+    keys = list_inputs(args.source)
+    finished = done_keys(args.output, error_log, args.retry_errors)
+    pending = [key for key in keys if key not in finished]
+    print(f"{len(keys)} images, {len(keys) - len(pending)} already done, {len(pending)} to process.")
+    if not pending:
+        return 0
+
+    from tqdm import tqdm
+
+    writer = ParquetWriter(args.output) if _is_parquet(args.output) else JSONLWriter(args.output)
+    errors_writer = JSONLWriter(error_log)
+    loader = MongoLoader() if args.mongo else None
+    chunks = [pending[i:i + args.chunk_size] for i in range(0, len(pending), args.chunk_size)]
+    error_count = 0
+    started = time.perf_counter()
+
+    executor = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context(config.OCR_START_METHOD),
+        initializer=_init_worker,
+    )
+    progress = tqdm(total=len(pending), unit="doc", smoothing=0.05)
+    try:
+        in_flight = set()
+        next_chunk = 0
+        # Only a few chunks per worker are submitted at a time, so results
+        # stream out and a large run does not hold every image in memory.
+        while next_chunk < len(chunks) or in_flight:
+            while next_chunk < len(chunks) and len(in_flight) < args.workers * 2:
+                in_flight.add(executor.submit(
+                    process_chunk, args.source, chunks[next_chunk], args.max_file_bytes, args.include_text
+                ))
+                next_chunk += 1
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                records, errors = future.result()
+                # The output is the checkpoint, so it is written last: a record
+                # found there on resume has also been loaded into MongoDB.
+                if loader is not None:
+                    loader.load(records)
+                writer.write(records)
+                errors_writer.write(errors)
+                error_count += len(errors)
+                progress.update(len(records) + len(errors))
+                progress.set_postfix(errors=error_count)
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume.", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    finally:
+        progress.close()
+        writer.close()
+        errors_writer.close()
+    executor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    summary = f"Processed {len(pending)} images in {elapsed:.1f} s ({len(pending) / elapsed:.1f} docs/s), {error_count} errors"
+    if loader is not None:
+        summary += (f"; MongoDB: {loader.inserted} inserted, {loader.duplicates} duplicates, "
+                    f"{loader.without_number} without a number")
+    print(summary + ".")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory or zip archive of images")
+    parser.add_argument("output", help="JSONL file, or a directory ending in .parquet")
+    parser.add_argument("--workers", type=int, default=config.OCR_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=config.OCR_BATCH_SIZE,
+                        help="Images per worker task, OCR'd in one batch")
+    parser.add_argument("--max-file-bytes", type=int, default=config.JOB_MAX_UPLOAD_BYTES)
+    parser.add_argument("--errors", help="Error log (default: <output>.errors.jsonl)")
+    parser.add_argument("--retry-errors", action="store_true", help="Process documents that failed before again")
+    parser.add_argument("--include-text", action="store_true", help="Keep the raw OCR text in the output")
+    parser.add_argument("--mongo", action="store_true", help="Also insert parsed records into MongoDB")
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
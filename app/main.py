@@ -1,17 +1,80 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from app.models import PANCardDetails
-from app.services.pan_parser import parse_pan_details
-from app.models import PANCardDetails, AadhaarCardDetails, UnifiedProcessingResult
-from app.services.ocr_service import extract_text
-from app.services.pan_parser import parse_pan_details
-from app.services.voter_id_parser import parse_voter_id_details
-from app.services.aadhaar_parser import parse_aadhaar_details
-from app.services.document_classifier import classify_document, DocumentType
-from app.database import pan_collection, aadhaar_collection
-
-app = FastAPI(title="Document Processing API")
+from app import config
+from app.models import (
+    PANCardDetails, AadhaarCardDetails, UnifiedProcessingResult,
+    BatchItemResult, BatchProcessingResult, JobStatus, PageResult, IdentityMatch,
+    CardResult, CardsProcessingResult,
+)
+from app.services import pipeline
+from app.services import pages
+from app.services.document_classifier import DocumentType
+from app.services.ocr_pool import ocr_pool, OCRPoolBusy, OCRPoolTimeout, OCRPoolUnavailable
+from app.services.result_cache import result_cache, content_digest
+from app.services import jobs
+from app.services.dedup_index import dedup_index
+from app.services.identity_index import identity_index, mask_number
+from app.services.near_duplicates import compute_fingerprint, near_duplicate_index
+from app.services.preprocessing import ImageDecodeError
+from app.services import model_registry
+from app.services import metrics, tracing
+from app import persistence
+from app.database import check_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_up():
+    # Models load in the background; /health/ready reports 503 until this is done.
+    workers = await ocr_pool.warm_up()
+    startup_seconds = time.monotonic() - model_registry.PROCESS_STARTED_AT
+    logger.info("Ready after %.2fs; worker RSS: %s", startup_seconds,
+                ", ".join(f"{w['pid']}={w['rss_bytes'] // 2**20}MB" for w in workers))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not await check_connection():
+        raise RuntimeError("Database connection is required to run the application.")
+    await persistence.ensure_indexes()
+    # Run in the background. Until the dedup index is warm every number takes
+    # the upsert path; until the identity index is, documents are not matched,
+    # and until the near-duplicate index is, every upload runs OCR.
+    index_tasks = [
+        asyncio.create_task(persistence.warm_dedup_index()),
+        asyncio.create_task(persistence.snapshot_dedup_index_periodically()),
+        asyncio.create_task(persistence.warm_identity_index()),
+        asyncio.create_task(persistence.warm_near_duplicate_index()),
+    ]
+    if config.WRITE_BEHIND != "off":
+        persistence.write_buffer.start()
+    await result_cache.setup()
+    if config.WARM_UP_ON_STARTUP:
+        app.state.warm_up_task = asyncio.create_task(_warm_up())
+    await job_runner.start()
+    yield
+    await job_runner.stop()
+    # Flush buffered records before the dedup snapshot, which then includes them.
+    await persistence.write_buffer.close()
+    for task in index_tasks:
+        task.cancel()
+    await persistence.snapshot_dedup_index()
+    ocr_pool.shutdown()
+
+
+app = FastAPI(title="Document Processing API", lifespan=lifespan)
 
 # This allows your React app to communicate with the backend.
 origins = [
@@ -24,68 +87,516 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Allows all methods (GET, POST, etc.)
     allow_headers=["*"], # Allows all headers
+    # Lets the browser's network panel show the Server-Timing breakdown.
+    expose_headers=["Server-Timing"],
 )
 
+def _observe_stages(timings: dict[str, float]):
+    for stage, seconds in timings.items():
+        metrics.STAGE_LATENCY.observe(seconds, stage=stage)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Collects per-stage timings for the request, reports them as metrics and
+    in the `Server-Timing` response header.
+    """
+    started = time.perf_counter()
+    with tracing.collect() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    metrics.HTTP_REQUESTS.inc(method=request.method, route=route_path, status=response.status_code)
+    metrics.HTTP_LATENCY.observe(elapsed, route=route_path)
+    _observe_stages(timings)
+    if timings:
+        response.headers["Server-Timing"] = tracing.server_timing_header({**timings, "total": elapsed})
+    return response
+
+async def _run_traced(fn, *args, timeout: float | None = None):
+    """
+    Runs `fn` in the OCR pool and adds the stage timings measured in the
+    worker to the current trace. The rest of the round trip is reported as
+    `queue`: waiting for a free worker plus moving data between processes.
+    """
+    started = time.perf_counter()
+    result = await ocr_pool.run(fn, *args, timeout=timeout)
+    elapsed = time.perf_counter() - started
+    outputs = result if isinstance(result, list) else [result]
+    # Batch outputs all carry the timings of the whole batch.
+    worker_timings = getattr(outputs[0], "timings", None) if outputs else None
+    if worker_timings:
+        tracing.merge(worker_timings)
+        tracing.record("queue", max(0.0, elapsed - sum(worker_timings.values())))
+    else:
+        tracing.record("worker", elapsed)
+    for output in outputs:
+        _count_ocr_tier(output)
+        _count_card(output)
+    return result
+
+def _count_ocr_tier(output):
+    if getattr(output, "ocr_tier", None) is None:
+        return
+    metrics.OCR_RESULTS.inc(tier=output.ocr_tier)
+    if output.escalation:
+        metrics.OCR_ESCALATIONS.inc(document_type=output.document_type.value, reason=output.escalation)
+
+def _count_card(output):
+    if not config.CARD_DETECTION or not isinstance(output, pipeline.PipelineOutput) or output.error:
+        return
+    if output.card is None:
+        metrics.CARD_CROPS.inc(outcome="whole")
+    else:
+        metrics.CARD_CROPS.inc(outcome="cropped")
+        metrics.CARD_PIXEL_RATIO.observe(output.card.pixel_ratio)
+
+async def run_in_ocr_pool(fn, *args, timeout: float | None = None):
+    """
+    Runs blocking OCR work in the worker pool and maps pool errors to HTTP errors.
+    """
+    try:
+        return await _run_traced(fn, *args, timeout=timeout)
+    except OCRPoolBusy as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Server is busy processing other documents. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except OCRPoolTimeout:
+        raise HTTPException(status_code=504, detail="Document processing timed out.")
+    except OCRPoolUnavailable:
+        raise HTTPException(status_code=503, detail="Document processing failed, please retry.")
+
+def _output_error(output: pipeline.PipelineOutput) -> str | None:
+    """Why a pipeline output cannot be used, if it cannot. Counted as a failed document."""
+    if output.error:
+        message = output.error
+    elif not output.raw_text.strip():
+        message = "Could not extract text."
+    else:
+        return None
+    metrics.DOCUMENTS.inc(document_type=output.document_type.value, outcome="error")
+    return message
+
+async def process_upload(image_bytes: bytes, digest: str, run) -> pipeline.PipelineOutput:
+    """
+    `pipeline.process_document` on an upload, run with `run` (the OCR pool),
+    unless it is a near-duplicate of an earlier upload: then that upload's
+    stored result is returned without OCR.
+    """
+    fingerprint = None
+    if config.NEAR_DUPLICATES and near_duplicate_index.ready:
+        try:
+            with tracing.stage("fingerprint"):
+                fingerprint = await asyncio.to_thread(compute_fingerprint, image_bytes)
+        except ImageDecodeError:
+            pass  # Reported by the pipeline.
+        else:
+            with tracing.stage("near_duplicate"):
+                match = await near_duplicate_index.find(fingerprint)
+            if match is not None:
+                return match.output
+    output = await run(pipeline.process_document, image_bytes)
+    if fingerprint is not None:
+        with tracing.stage("near_duplicate"):
+            await near_duplicate_index.add(digest, fingerprint, output)
+    return output
+
+async def build_result(output: pipeline.PipelineOutput, digest: str | None = None) -> UnifiedProcessingResult:
+    """
+    Runs duplicate validation on a parsed document and wraps it in the API result.
+    """
+    doc_type = output.document_type
+    if doc_type == DocumentType.UNKNOWN:
+        metrics.DOCUMENTS.inc(document_type=doc_type.value, outcome="unknown")
+        return UnifiedProcessingResult(
+            document_type=DocumentType.UNKNOWN.value,
+            is_successfully_parsed=False,
+            is_duplicate=None,
+            data=None,
+            digest=digest,
+            near_duplicate_of=output.near_duplicate_of,
+        )
+
+    # Looked up before saving, so a new record does not match itself.
+    identity_matches = None
+    if config.IDENTITY_INDEX and identity_index.ready:
+        with tracing.stage("identity"):
+            # Off the event loop: scoring takes a while, and waits while a refresh holds the index.
+            matches = await asyncio.to_thread(identity_index.match, doc_type, output.data)
+            identity_matches = [
+                IdentityMatch(document_type=match.document_type.value, number=mask_number(match.number),
+                              score=match.score, matched_on=match.matched_on)
+                for match in matches
+            ]
+
+    # Check whether the identity number exists and, if not, save the
+    # document, in a single atomic database operation.
+    with tracing.stage("db"):
+        is_duplicate = await persistence.save_if_new(doc_type, output.data)
+    metrics.DOCUMENTS.inc(document_type=doc_type.value, outcome="parsed")
+    if is_duplicate:
+        metrics.DUPLICATES.inc(document_type=doc_type.value)
+    return UnifiedProcessingResult(
+        document_type=doc_type.value,
+        is_successfully_parsed=True,
+        is_duplicate=is_duplicate,
+        data=output.data,
+        digest=digest,
+        identity_matches=identity_matches,
+        near_duplicate_of=output.near_duplicate_of,
+    )
+
 @app.post("/v1/process_document", response_model=UnifiedProcessingResult, tags=["V1 - Core Processing"])
 async def process_document_endpoint(image: UploadFile = File(...)):
-    # ... (steps 1 and 2 for OCR and classification remain the same) ...
+    # Steps 1 and 2: OCR, classification and parsing run in the worker pool,
+    # unless the very same image has been processed before.
     image_bytes = await image.read()
-    raw_text = extract_text(image_bytes)
-    if not raw_text.strip():
-        raise HTTPException(status_code=400, detail="Could not extract text.")
-    doc_type = classify_document(raw_text)
-
-    # Step 3: Route, Parse, and VALIDATE
-    if doc_type == DocumentType.PAN_CARD:
-        data = parse_pan_details(raw_text)
-        is_duplicate = False
-        # Check if the PAN number exists and was parsed correctly
-        if data.pan_number:
-            if pan_collection.find_one({"pan_number": data.pan_number}):
-                is_duplicate = True
-            else:
-                # Save to DB if not a duplicate. We convert Pydantic model to dict.
-                pan_collection.insert_one(data.dict())
-        
-        return UnifiedProcessingResult(
-            document_type=doc_type.value,
-            is_successfully_parsed=True,
-            is_duplicate=is_duplicate,
-            data=data
+    digest = content_digest(image_bytes)
+    with tracing.stage("cache"):
+        output, _ = await result_cache.get_or_compute(
+            digest, lambda: process_upload(image_bytes, digest, run_in_ocr_pool)
         )
-    elif doc_type == DocumentType.AADHAAR_CARD:
-        data = parse_aadhaar_details(raw_text)
-        is_duplicate = False
-        # Check if Aadhaar number exists and was parsed correctly
-        if data.aadhaar_number:
-            if aadhaar_collection.find_one({"aadhaar_number": data.aadhaar_number}):
-                is_duplicate = True
-            else:
-                aadhaar_collection.insert_one(data.dict())
+    error = _output_error(output)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    # Step 3: VALIDATE
+    return await build_result(output, digest)
+
+@app.post("/v1/process_cards", response_model=CardsProcessingResult, tags=["V1 - Core Processing"])
+async def process_cards_endpoint(image: UploadFile = File(...)):
+    """
+    Processes every card in one photo (up to CARD_MAX_CARDS), e.g. a PAN and
+    an Aadhaar card photographed side by side, with a result per card,
+    largest first. A photo in which no card is found is read as a whole.
+    Results are not cached: the cache holds one result per image.
+    """
+    image_bytes = await image.read()
+    outputs = await run_in_ocr_pool(pipeline.process_cards, image_bytes)
+    if len(outputs) == 1 and outputs[0].card is None and outputs[0].error:
+        raise HTTPException(status_code=400, detail=outputs[0].error)
+
+    cards = []
+    for number, output in enumerate(outputs, 1):
+        corners = [list(corner) for corner in output.card.corners] if output.card is not None else None
+        error = _output_error(output)
+        if error:
+            cards.append(CardResult(card=number, corners=corners, error=error))
+        else:
+            cards.append(CardResult(card=number, corners=corners, result=await build_result(output)))
+    return CardsProcessingResult(
+        total=len(cards), succeeded=sum(card.result is not None for card in cards), cards=cards,
+    )
 
+@app.get("/v1/results/{digest}", response_model=UnifiedProcessingResult, tags=["V1 - Core Processing"])
+async def get_result_endpoint(digest: str):
+    """
+    Returns the stored result for a previously uploaded image, identified by the
+    SHA-256 of its bytes. Duplicate validation is not re-run, so `is_duplicate` is null.
+    """
+    output = await result_cache.get(digest.lower())
+    if output is None:
+        raise HTTPException(status_code=404, detail="No result stored for this digest.")
+    if output.document_type == DocumentType.UNKNOWN:
         return UnifiedProcessingResult(
-            document_type=doc_type.value,
-            is_successfully_parsed=True,
-            is_duplicate=is_duplicate,
-            data=data
+            document_type=DocumentType.UNKNOWN.value, is_successfully_parsed=False, digest=digest.lower()
         )
-        
-    elif doc_type == DocumentType.VOTER_ID_CARD:
-        # We won't add DB validation for this one yet to keep it simple
-        data = parse_voter_id_details(raw_text)
-        return UnifiedProcessingResult(
-            document_type=doc_type.value,
-            is_successfully_parsed=True,
-            is_duplicate=False, # Defaulting to false for now
-            data=data
+    return UnifiedProcessingResult(
+        document_type=output.document_type.value,
+        is_successfully_parsed=True,
+        data=output.data,
+        digest=digest.lower(),
+    )
+
+@app.get("/v1/cache/stats", tags=["V1 - Core Processing"])
+async def cache_stats_endpoint():
+    return result_cache.stats()
+
+@app.get("/v1/dedup/stats", tags=["V1 - Core Processing"])
+async def dedup_stats_endpoint():
+    return dedup_index.stats()
+
+@app.get("/v1/identity/stats", tags=["V1 - Core Processing"])
+async def identity_stats_endpoint():
+    return identity_index.stats()
+
+@app.get("/v1/near_duplicates/stats", tags=["V1 - Core Processing"])
+async def near_duplicate_stats_endpoint():
+    return near_duplicate_index.stats()
+
+def _read_archive(archive_bytes: bytes) -> list[tuple[str, bytes]]:
+    """Extracts the image files from a zip archive, enforcing the batch limits."""
+    try:
+        zip_file = zipfile.ZipFile(io.BytesIO(archive_bytes))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Archive is not a valid zip file.")
+
+    members = [
+        info for info in zip_file.infolist()
+        if not info.is_dir() and info.filename.lower().endswith(config.IMAGE_EXTENSIONS)
+    ]
+    if len(members) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {config.BATCH_MAX_ITEMS} images.")
+    # Check the declared sizes before inflating anything, so a zip bomb is
+    # rejected without being decompressed.
+    if sum(info.file_size for info in members) > config.BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Batch is too large.")
+    return [(info.filename, zip_file.read(info)) for info in members]
+
+@app.post("/v1/process_batch", response_model=BatchProcessingResult, tags=["V1 - Core Processing"])
+async def process_batch_endpoint(
+    files: Optional[list[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+):
+    """
+    Processes many documents in one request, either as several `files` or as
+    a zip `archive` of images. OCR runs batched on a single worker.
+    """
+    items = []
+    for upload in files or []:
+        items.append((upload.filename or f"file_{len(items)}", await upload.read()))
+    if archive is not None:
+        items.extend(_read_archive(await archive.read()))
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No images were uploaded.")
+    if len(items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {config.BATCH_MAX_ITEMS} images.")
+    if sum(len(image_bytes) for _, image_bytes in items) > config.BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Batch is too large.")
+
+    # Only images that are not cached already go through OCR.
+    digests = [content_digest(image_bytes) for _, image_bytes in items]
+    with tracing.stage("cache"):
+        outputs = [await result_cache.get(digest) for digest in digests]
+    missing = [i for i, output in enumerate(outputs) if output is None]
+    if missing:
+        computed = await run_in_ocr_pool(
+            pipeline.process_batch, [items[i][1] for i in missing],
+            timeout=config.OCR_TIMEOUT_SECONDS * len(missing),
         )
+        for i, output in zip(missing, computed):
+            outputs[i] = output
+            await result_cache.put(digests[i], output)
+
+    async def _item_result(filename: str, digest: str, output: pipeline.PipelineOutput) -> BatchItemResult:
+        error = _output_error(output)
+        if error:
+            return BatchItemResult(filename=filename, error=error)
+        return BatchItemResult(filename=filename, result=await build_result(output, digest))
+
+    # Duplicate checks for all items run concurrently over the connection pool.
+    results = await asyncio.gather(*[
+        _item_result(filename, digest, output)
+        for (filename, _), digest, output in zip(items, digests, outputs)
+    ])
+
+    return BatchProcessingResult(
+        total=len(results),
+        succeeded=sum(1 for item in results if item.result and item.result.is_successfully_parsed),
+        results=list(results),
+    )
+
+async def _spool_upload(upload: UploadFile, max_bytes: int) -> str:
+    """
+    Copies an upload to a file the OCR workers can read, chunk by chunk, so
+    it is never held in memory as a whole.
+    """
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=config.PAGES_SPOOL_DIR or None)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await upload.read(1024 * 1024):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Upload is too large.")
+                f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+async def _process_page(path: str, index: int) -> PageResult:
+    # Pages stream out after the response headers, so each has a trace of its own.
+    with tracing.collect() as timings:
+        try:
+            return await _page_result(path, index)
+        except Exception:
+            # One failed page must not cut the stream of the others short.
+            logger.exception("Page %d of %s failed", index + 1, path)
+            return PageResult(page=index + 1, error="Page processing failed.")
+        finally:
+            _observe_stages(timings)
+
+async def _page_result(path: str, index: int) -> PageResult:
+    loop = asyncio.get_running_loop()
+    # A page waits for a free worker at most as long as it may take to process.
+    deadline = loop.time() + config.OCR_TIMEOUT_SECONDS
+    try:
+        while True:
+            try:
+                output = await _run_traced(pipeline.process_page, path, index)
+                break
+            except OCRPoolBusy:
+                # Other requests hold the workers; this page waits its turn.
+                if loop.time() + 0.5 > deadline:
+                    return PageResult(page=index + 1, error="Server is busy; the page was not processed.")
+                await asyncio.sleep(0.5)
+    except OCRPoolTimeout:
+        return PageResult(page=index + 1, error="Page processing timed out.")
+    except OCRPoolUnavailable:
+        return PageResult(page=index + 1, error="Page processing failed, please retry.")
+    error = _output_error(output)
+    if error:
+        return PageResult(page=index + 1, error=error)
+    return PageResult(page=index + 1, result=await build_result(output))
+
+async def _stream_pages(path: str, page_count: int, stream_format: str):
+    """Yields the page results in completion order, then removes the spooled file."""
+    semaphore = asyncio.Semaphore(config.PAGES_PARALLELISM)
+
+    async def run(index: int) -> PageResult:
+        async with semaphore:
+            return await _process_page(path, index)
+
+    tasks = [asyncio.create_task(run(index)) for index in range(page_count)]
+    succeeded = 0
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            page = await next_page
+            succeeded += page.result is not None and page.result.is_successfully_parsed
+            if stream_format == "sse":
+                yield f"event: page\ndata: {page.model_dump_json()}\n\n"
+            else:
+                yield page.model_dump_json() + "\n"
+        if stream_format == "sse":
+            yield f'event: done\ndata: {{"pages": {page_count}, "succeeded": {succeeded}}}\n\n'
+    finally:
+        # Also reached when the client disconnects mid-stream.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        os.unlink(path)
+
+@app.post("/v1/process_pages", tags=["V1 - Core Processing"])
+async def process_pages_endpoint(
+    document: UploadFile = File(...),
+    stream: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson or sse"),
+):
+    """
+    Processes every page of a multi-page PDF or TIFF (or a single image) as a
+    separate document. Pages run in parallel, and their results are streamed
+    back as soon as each one finishes, as NDJSON lines or Server-Sent Events
+    of `PageResult`. Results therefore arrive in completion order; use `page`
+    to put them back in order.
+    """
+    path = await _spool_upload(document, config.PAGES_MAX_UPLOAD_BYTES)
+    try:
+        page_count = await asyncio.to_thread(pages.count_pages, path)
+        if page_count > config.PAGES_MAX_PAGES:
+            raise HTTPException(status_code=413, detail=f"A document may have at most {config.PAGES_MAX_PAGES} pages.")
+    except pages.PageError as e:
+        os.unlink(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    media_type = "text/event-stream" if stream == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_pages(path, page_count, stream), media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Page-Count": str(page_count)},
+    )
+
+async def _process_job(image_bytes: bytes) -> UnifiedProcessingResult:
+    """Job handler: the same pipeline as /v1/process_document, reporting errors as job failures."""
+    # Jobs run outside of any request, so they get a trace of their own.
+    with tracing.collect() as timings:
+        try:
+            return await _run_job(image_bytes)
+        finally:
+            _observe_stages(timings)
+
+async def _run_job(image_bytes: bytes) -> UnifiedProcessingResult:
+    digest = content_digest(image_bytes)
+    try:
+        with tracing.stage("cache"):
+            output, _ = await result_cache.get_or_compute(
+                digest, lambda: process_upload(image_bytes, digest, _run_traced)
+            )
+    except OCRPoolTimeout:
+        raise jobs.JobFailed("Document processing timed out.")
+    except OCRPoolUnavailable:
+        raise jobs.JobFailed("Document processing failed.")
+    error = _output_error(output)
+    if error:
+        raise jobs.JobFailed(error)
+    return await build_result(output, digest)
+
+job_runner = jobs.JobRunner(
+    jobs.build_job_store(), jobs.InProcessQueue(), _process_job,
+    concurrency=config.JOB_CONCURRENCY,
+    lease_seconds=config.JOB_LEASE_SECONDS,
+)
+
+def _job_status(job: dict) -> JobStatus:
+    return JobStatus(
+        job_id=job["_id"],
+        status=job["status"],
+        filename=job.get("filename"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        result=job.get("result"),
+        error=job.get("error"),
+    )
+
+@app.post("/v1/jobs", response_model=JobStatus, status_code=202, tags=["V1 - Jobs"])
+async def create_job_endpoint(image: UploadFile = File(...)):
+    """
+    Queues a document for processing and returns immediately with a job id.
+    """
+    image_bytes = await image.read()
+    if len(image_bytes) > config.JOB_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload is too large.")
+    job = await job_runner.submit(image_bytes, image.filename)
+    return _job_status(job)
+
+@app.get("/v1/jobs/{job_id}", response_model=JobStatus, tags=["V1 - Jobs"])
+async def get_job_endpoint(job_id: str, wait: float = Query(0, ge=0, description="Seconds to wait for completion (long-poll).")):
+    """
+    Returns the job status, and the result once it has finished. With `wait`,
+    the request is held open until the job finishes or the wait runs out.
+    """
+    if wait:
+        job = await job_runner.wait(job_id, min(wait, config.JOB_MAX_WAIT_SECONDS))
     else:
-        return UnifiedProcessingResult(
-            document_type=DocumentType.UNKNOWN.value,
-            is_successfully_parsed=False,
-            is_duplicate=None,
-            data=None
-        )
+        job = await job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return _job_status(job)
+
+@app.get("/v1/jobs/{job_id}/events", tags=["V1 - Jobs"])
+async def job_events_endpoint(job_id: str):
+    """
+    Server-Sent Events stream of the job's status changes, ending with the final state.
+    """
+    job = await job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        async for current in job_runner.events(job_id, config.JOB_SSE_HEARTBEAT_SECONDS):
+            if current is None:
+                # Comment line that keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {current['status']}\ndata: {_job_status(current).model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.post("/ocr/pan_card", response_model=PANCardDetails, tags=["OCR - KYC Documents"])
 async def ocr_pan_card_endpoint(image: UploadFile = File(...)):
@@ -93,8 +604,10 @@ async def ocr_pan_card_endpoint(image: UploadFile = File(...)):
     Extracts structured data from a PAN Card image.
     """
     image_bytes = await image.read()
-    raw_text = extract_text(image_bytes)
-    structured_data = parse_pan_details(raw_text)
+    try:
+        structured_data = await run_in_ocr_pool(pipeline.process_pan_card, image_bytes)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return structured_data
 
 @app.post("/ocr/aadhaar_card", response_model=AadhaarCardDetails, tags=["OCR - KYC Documents"])
@@ -103,12 +616,88 @@ async def ocr_aadhaar_card_endpoint(image: UploadFile = File(...)):
     Extracts structured data from an Aadhaar Card image.
     """
     image_bytes = await image.read()
-    # Step 1: Reuse our generic OCR service
-    raw_text = extract_text(image_bytes)
-    # Step 2: Use our new, specific Aadhaar parser
-    structured_data = parse_aadhaar_details(raw_text)
+    # Generic OCR followed by the Aadhaar parser, off the event loop
+    try:
+        structured_data = await run_in_ocr_pool(pipeline.process_aadhaar_card, image_bytes)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return structured_data
 
+def _collect_runtime_metrics():
+    """Values tracked by other components, read on every scrape of /metrics."""
+    cache = result_cache.stats()
+    yield ("bfsi_result_cache_events_total", "counter", "Result cache lookups by outcome, and evictions.",
+           [({"event": event}, cache[event]) for event in ("hits", "backing_hits", "misses", "coalesced", "evictions")])
+    yield ("bfsi_result_cache_entries", "gauge", "Entries in the in-memory result cache.",
+           [({}, cache["memory_entries"])])
+    yield ("bfsi_ocr_pool_pending", "gauge", "OCR work units running or waiting for a worker.",
+           [({}, ocr_pool.pending)])
+    yield ("bfsi_ocr_pool_capacity", "gauge", "OCR work units admitted before requests get 429.",
+           [({}, ocr_pool.max_pending)])
+    yield ("bfsi_job_queue_depth", "gauge", "Jobs waiting for a job worker.",
+           [({}, job_runner.queue.qsize())])
+    dedup = dedup_index.stats()["types"]
+    for key, kind in (("items", "gauge"), ("memory_bytes", "gauge"), ("definitely_new", "counter"),
+                      ("maybe_present", "counter"), ("false_positives", "counter")):
+        suffix = "_total" if kind == "counter" else ""
+        yield (f"bfsi_dedup_index_{key}{suffix}", kind, f"Duplicate index: {key.replace('_', ' ')}.",
+               [({"document_type": doc_type}, values[key]) for doc_type, values in dedup.items()])
+    identity = identity_index.stats()
+    yield ("bfsi_identity_index_records", "gauge", "Records in the identity resolution index.",
+           [({}, identity["records"])])
+    yield ("bfsi_identity_index_memory_bytes", "gauge", "Memory held by the identity resolution index.",
+           [({}, identity["memory_bytes"])])
+    yield ("bfsi_identity_lookups_total", "counter", "Identity index lookups, candidates scored and matches returned.",
+           [({"event": event}, identity[event]) for event in ("lookups", "candidates", "matches", "skipped_blocks")])
+    near = near_duplicate_index.stats()
+    yield ("bfsi_near_duplicate_index_records", "gauge", "Upload fingerprints in the near-duplicate index.",
+           [({}, near["records"])])
+    yield ("bfsi_near_duplicate_index_memory_bytes", "gauge", "Memory held by the near-duplicate index.",
+           [({}, near["memory_bytes"])])
+    yield ("bfsi_near_duplicate_lookups_total", "counter",
+           "Near-duplicate lookups, candidates verified, candidates rejected and results reused.",
+           [({"event": event}, near[event]) for event in ("lookups", "candidates", "rejected", "hits")])
+    buffer = persistence.write_buffer.stats()
+    yield ("bfsi_write_behind_pending", "gauge", "Records waiting in the write-behind buffer.",
+           [({}, buffer["pending"])])
+    yield ("bfsi_write_behind_records_total", "counter", "Records written by the write-behind buffer, by outcome.",
+           [({"outcome": outcome}, buffer[outcome]) for outcome in ("inserted", "duplicates", "errors")])
+    memory = model_registry.memory_usage()
+    yield ("bfsi_process_resident_memory_bytes", "gauge", "Resident memory of this API process.",
+           [({}, memory["rss_bytes"])])
+    yield ("bfsi_process_unique_memory_bytes", "gauge",
+           "Memory private to this API process (USS), not shared with forked siblings.",
+           [({}, memory["uss_bytes"])])
+
+metrics.registry.add_collector(_collect_runtime_metrics)
+
+@app.get("/metrics", tags=["Health"])
+async def metrics_endpoint():
+    """Prometheus metrics of this API process."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live", tags=["Health"])
+async def liveness_endpoint():
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness_endpoint():
+    """
+    Ready once the OCR workers have loaded their models and the database answers.
+    Also reports startup time and resident memory of the API and worker processes.
+    """
+    database_ok = await check_connection()
+    models_loaded = ocr_pool.warmed or not config.WARM_UP_ON_STARTUP
+    ready = models_loaded and database_ok
+    body = {
+        "ready": ready,
+        "database": database_ok,
+        "models_loaded": models_loaded,
+        "api_process": model_registry.registry.status(),
+        "workers": ocr_pool.worker_status,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 # This part is now optional, as we'll run the app with a command.
 # But it's good practice to keep it for direct execution.
 if __name__ == "__main__":
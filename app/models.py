@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
 from typing import Optional, Union 
@@ -12,18 +13,74 @@ class AadhaarCardDetails(BaseModel):   # for Aadhaar
     name: Optional[str] = None
     date_of_birth: Optional[str] = None
     gender: Optional[str] = None
+
+class VoterIDCardDetails(BaseModel):
+    voter_id: Optional[str] = None
+    name: Optional[str] = None
+    name_hindi: Optional[str] = None
     
+class IdentityMatch(BaseModel):
+    # A stored record that probably belongs to the same person
+    document_type: str
+    # Its identity number, masked except for the last 4 characters
+    number: str
+    # Similarity from 0 to 1, over the fields both records have
+    score: float
+    # Fields that matched closely: number, name, date_of_birth
+    matched_on: list[str]
+
 # Find the UnifiedProcessingResult class and add the new field
 class UnifiedProcessingResult(BaseModel):
     document_type: str
     is_successfully_parsed: bool
     is_duplicate: Optional[bool] = None 
-    data: Optional[Union[PANCardDetails, AadhaarCardDetails]] = None
-    
-class VoterIDCardDetails(BaseModel):
-    voter_id: Optional[str] = None
-    name: Optional[str] = None
-    name_hindi: Optional[str] = None
+    data: Optional[Union[PANCardDetails, AadhaarCardDetails, VoterIDCardDetails]] = None
+    # SHA-256 of the uploaded image; can be used with GET /v1/results/{digest}
+    digest: Optional[str] = None
+    # Similar records already on file, best first (fuzzy identity resolution)
+    identity_matches: Optional[list[IdentityMatch]] = None
+    # Digest of an earlier upload of the same image (recompressed, resized or
+    # screenshotted) whose result was returned without running OCR
+    near_duplicate_of: Optional[str] = None
+
+class BatchItemResult(BaseModel):
+    filename: str
+    result: Optional[UnifiedProcessingResult] = None
+    error: Optional[str] = None
+
+class BatchProcessingResult(BaseModel):
+    total: int
+    succeeded: int
+    results: list[BatchItemResult]
+
+
+
+
+class PageResult(BaseModel):
+    # 1-based page number within the uploaded document
+    page: int
+    result: Optional[UnifiedProcessingResult] = None
+    error: Optional[str] = None
 
+class CardResult(BaseModel):
+    # 1-based, largest card first
+    card: int
+    # Corners (top-left, top-right, bottom-right, bottom-left) as fractions of
+    # the photo's width and height; None if no card was found and the whole photo was read
+    corners: Optional[list[list[float]]] = None
+    result: Optional[UnifiedProcessingResult] = None
+    error: Optional[str] = None
 
+class CardsProcessingResult(BaseModel):
+    total: int
+    succeeded: int
+    cards: list[CardResult]
 
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    filename: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[UnifiedProcessingResult] = None
+    error: Optional[str] = None
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from pydantic import BaseModel
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+
+from app.database import pan_collection, aadhaar_collection, voter_id_collection
+from app import config
+from app.services.dedup_index import dedup_index
+from app.services.identity_index import identity_index
+from app.services.near_duplicates import near_duplicate_index
+from app.services.document_classifier import DocumentType
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Where each KYC document type is stored, and the field that identifies it.
+KYC_COLLECTIONS = {
+    DocumentType.PAN_CARD: (pan_collection, "pan_number"),
+    DocumentType.AADHAAR_CARD: (aadhaar_collection, "aadhaar_number"),
+    DocumentType.VOTER_ID_CARD: (voter_id_collection, "voter_id"),
+}
+
+# Types whose unique index exists. Only for these may a number the dedup index
+# calls new be inserted blindly: the index still rejects it if the filter was
+# stale (e.g. another API process inserted it since warm-up).
+_unique_indexed: set[DocumentType] = set()
+
+
+async def ensure_indexes():
+    """
+    Creates a unique index on the identity number of every KYC collection.
+
+    The index is partial, so records saved without a number do not collide.
+    If existing data already holds duplicates the index cannot be built; that
+    is logged and the app keeps running without the race protection. An index
+    on `inserted_at` serves the in-memory indexes' catch-up loads.
+    """
+    for doc_type, (collection, field) in KYC_COLLECTIONS.items():
+        await collection.create_index("inserted_at")
+        try:
+            await collection.create_index(
+                field, unique=True, name=f"{field}_unique",
+                partialFilterExpression={field: {"$type": "string"}},
+            )
+            _unique_indexed.add(doc_type)
+        except OperationFailure as e:
+            logger.error("Could not create unique index on %s.%s: %s", collection.name, field, e)
+
+
+class WriteBehindBuffer:
+    """
+    Collects new KYC records and writes them with one unordered `insert_many`
+    per document type, once `max_batch` records are waiting or `flush_interval`
+    seconds after the first one arrived.
+
+    The collections' unique indexes decide duplicates: a record rejected with
+    a duplicate-key error resolves its future to True, an inserted one to
+    False, and any other failure to the exception. A failed flush never stops
+    the buffer.
+    """
+
+    def __init__(self, max_batch: int, flush_interval: float):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: list[tuple[DocumentType, dict, asyncio.Future]] = []
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self.counters = {"flushes": 0, "inserted": 0, "duplicates": 0, "errors": 0}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stops accepting records and waits until the buffer is flushed."""
+        self._closing = True
+        self._has_pending.set()
+        self._full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def submit(self, doc_type: DocumentType, document: dict) -> asyncio.Future:
+        if self._closing or self._task is None:
+            raise RuntimeError("The write-behind buffer is not running.")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc_type, document, future))
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        while True:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._flush()
+            except Exception:
+                # The batch's futures are settled by _insert; later records still get written.
+                logger.exception("Write-behind flush failed")
+            if self._closing and not self._pending:
+                return
+
+    async def _flush(self):
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if not self._pending:
+            self._has_pending.clear()
+        # While closing, the rest is flushed without waiting for the interval.
+        if len(self._pending) < self.max_batch and not self._closing:
+            self._full.clear()
+        if not batch:
+            return
+        by_type: dict[DocumentType, list[tuple[dict, asyncio.Future]]] = {}
+        for doc_type, document, future in batch:
+            by_type.setdefault(doc_type, []).append((document, future))
+        await asyncio.gather(*(self._insert(doc_type, records) for doc_type, records in by_type.items()))
+        self.counters["flushes"] += 1
+
+    async def _insert(self, doc_type: DocumentType, records: list[tuple[dict, asyncio.Future]]):
+        collection, _ = KYC_COLLECTIONS[doc_type]
+        errors: dict[int, dict] = {}
+        try:
+            await collection.insert_many([document for document, _ in records], ordered=False)
+        except BulkWriteError as e:
+            errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+        except PyMongoError as e:
+            logger.error("Bulk insert of %d %s records failed: %s", len(records), doc_type.value, e)
+            self._fail(records, e)
+            return
+        except BaseException as e:
+            # Anything else (a document that cannot be encoded, cancellation)
+            # must still settle the futures, or their callers wait forever.
+            if isinstance(e, Exception):
+                logger.exception("Bulk insert of %d %s records failed", len(records), doc_type.value)
+            self._fail(records, e)
+            raise
+
+        for index, (_, future) in enumerate(records):
+            error = errors.get(index)
+            if error is None:
+                self.counters["inserted"] += 1
+                outcome = False
+            elif error.get("code") == DUPLICATE_KEY_ERROR:
+                self.counters["duplicates"] += 1
+                outcome = True
+            else:
+                self.counters["errors"] += 1
+                outcome = OperationFailure(error.get("errmsg", "write error"), error.get("code"), error)
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _fail(self, records: list[tuple[dict, asyncio.Future]], error: BaseException):
+        self.counters["errors"] += len(records)
+        for _, future in records:
+            if future.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), **self.counters}
+
+
+write_buffer = WriteBehindBuffer(config.WRITE_BEHIND_MAX_BATCH, config.WRITE_BEHIND_FLUSH_SECONDS)
+
+
+def _settle_unacknowledged(doc_type: DocumentType, number: str, future: asyncio.Future):
+    # Records acknowledged before their flush: the caller already got an answer.
+    # The number only counts as seen once the write has settled it.
+    if future.cancelled():
+        logger.error("Acknowledged %s record %s was not stored: the write was cancelled", doc_type.value, number)
+        return
+    if future.exception() is not None:
+        logger.error("Acknowledged %s record %s was not stored: %s", doc_type.value, number, future.exception())
+        return
+    if future.result():
+        logger.warning("Acknowledged %s record %s as new, but it was a duplicate", doc_type.value, number)
+    dedup_index.add(doc_type, number)
+
+
+async def _upsert(collection, field: str, number: str, document: dict) -> bool:
+    try:
+        result = await collection.update_one({field: number}, {"$setOnInsert": document}, upsert=True)
+    except DuplicateKeyError:
+        # Lost an insert race against the same number: the other one won.
+        return True
+    return result.upserted_id is None
+
+
+async def _insert(collection, document: dict) -> bool:
+    try:
+        await collection.insert_one(document)
+    except DuplicateKeyError:
+        return True
+    return False
+
+
+async def save_if_new(doc_type: DocumentType, data: BaseModel) -> bool:
+    """
+    Stores a parsed document unless one with the same identity number exists.
+
+    Returns True if the number was already on record (a duplicate). The check
+    and the insert are a single atomic upsert, so concurrent submissions of the
+    same number cannot both be inserted. Documents without a number are not
+    stored and count as new.
+
+    Numbers the dedup index has never seen are inserted directly, without the
+    read half of the upsert. With `WRITE_BEHIND` enabled, inserts go through
+    the bulk write buffer: "flush" answers once the record is written,
+    "immediate" answers right away for numbers the dedup index proves new.
+    """
+    collection, field = KYC_COLLECTIONS[doc_type]
+    number = getattr(data, field)
+    if not number:
+        return False
+    document = data.model_dump()
+    # What the in-memory indexes catch up by; ObjectIds are not ordered across processes.
+    document["inserted_at"] = datetime.now(timezone.utc)
+    # Blind inserts rely on the unique index to reject duplicates.
+    indexed = doc_type in _unique_indexed
+    use_index = indexed and dedup_index.ready
+
+    if indexed and config.WRITE_BEHIND == "flush":
+        is_duplicate = await write_buffer.submit(doc_type, document)
+        dedup_index.add(doc_type, number)
+    elif use_index and dedup_index.is_definitely_new(doc_type, number):
+        if config.WRITE_BEHIND == "immediate":
+            future = write_buffer.submit(doc_type, document)
+            future.add_done_callback(lambda f: _settle_unacknowledged(doc_type, number, f))
+            # Not added to the dedup index until the write succeeds (see the callback).
+            is_duplicate = False
+        else:
+            is_duplicate = await _insert(collection, document)
+            dedup_index.add(doc_type, number)
+    else:
+        is_duplicate = await _upsert(collection, field, number, document)
+        if use_index and not is_duplicate:
+            dedup_index.record_false_positive(doc_type)
+        dedup_index.add(doc_type, number)
+    if not is_duplicate and config.IDENTITY_INDEX:
+        await asyncio.to_thread(identity_index.add, doc_type, data)
+    return is_duplicate
+
+
+async def warm_dedup_index():
+    """Loads the stored numbers into the dedup index, starting from the snapshot."""
+    if not config.DEDUP_INDEX:
+        return
+    try:
+        await dedup_index.warm_up(KYC_COLLECTIONS, config.DEDUP_SNAPSHOT_PATH)
+    except Exception:
+        logger.exception("Dedup index warm-up failed; every submission will query the database")
+
+
+async def warm_identity_index():
+    if not config.IDENTITY_INDEX:
+        return
+    try:
+        await identity_index.warm_up(KYC_COLLECTIONS)
+    except Exception:
+        logger.exception("Identity index warm-up failed; documents are not matched")
+        return
+    while True:
+        await asyncio.sleep(config.IDENTITY_REFRESH_SECONDS)
+        try:
+            await identity_index.refresh(KYC_COLLECTIONS)
+        except PyMongoError as e:
+            logger.warning("Identity index refresh failed: %s", e)
+
+
+async def warm_near_duplicate_index():
+    if not config.NEAR_DUPLICATES:
+        return
+    try:
+        await near_duplicate_index.setup()
+        await near_duplicate_index.warm_up()
+    except Exception:
+        logger.exception("Near-duplicate index warm-up failed; every upload runs OCR")
+        return
+    while True:
+        await asyncio.sleep(config.NEAR_DUP_REFRESH_SECONDS)
+        try:
+            await near_duplicate_index.refresh()
+        except PyMongoError as e:
+            logger.warning("Near-duplicate index refresh failed: %s", e)
+
+
+async def snapshot_dedup_index_periodically():
+    while True:
+        await asyncio.sleep(config.DEDUP_SNAPSHOT_INTERVAL_SECONDS)
+        await snapshot_dedup_index()
+
+
+async def snapshot_dedup_index():
+    if not dedup_index.ready:
+        return
+    try:
+        await asyncio.to_thread(dedup_index.snapshot, config.DEDUP_SNAPSHOT_PATH)
+    except OSError as e:
+        logger.warning("Could not write dedup snapshot %s: %s", config.DEDUP_SNAPSHOT_PATH, e)
@@ -0,0 +1,196 @@
+"""
+Prefork server: loads the models once and forks API workers that share them.
+
+With `uvicorn app.main:app --workers N` (or one OCR pool per API process),
+every process loads its own EasyOCR readers and spaCy pipeline, several
+hundred MB each. Here a master process imports the app and loads every model
+first. It then freezes the garbage collector's view of the heap and forks
+the workers. The workers share the weights, compiled patterns and keyword
+tables copy-on-write, and only pay for the memory they dirty themselves.
+
+Usage:
+
+    python -m app.serve [--host 0.0.0.0] [--port 8000] [--workers 4]
+
+Every worker is a full API process serving the same socket. It runs OCR
+in-process on `--ocr-threads` threads, because forking fresh OCR workers
+from it would give up the sharing. Torch and OpenCV are limited to
+`--torch-threads` threads per worker, the cores split evenly by default. The
+master restarts workers that die, logs the RSS and unique memory (USS) of
+each worker every PREFORK_MEMORY_REPORT_SECONDS, and stops the workers on
+SIGTERM or SIGINT.
+
+The master must not start threads, open database connections or run a model
+before forking; the workers would inherit them in an unusable state. That is
+why the duplicate, identity and near-duplicate indexes are not shared: they
+are read from the database, so every worker loads and refreshes its own copy
+after the fork, and pays for their memory in full.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from app import config
+
+logger = logging.getLogger("app.serve")
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def load_shared_state(torch_threads: int) -> dict:
+    """
+    Imports the app and loads every model in the current process, then moves
+    everything allocated so far out of the garbage collector's reach. Run in
+    the master before forking.
+    """
+    # Read by torch and OpenMP when they are first imported.
+    os.environ.setdefault("OMP_NUM_THREADS", str(torch_threads))
+    # Workers serve OCR from the models loaded here, on threads of their own.
+    config.OCR_EXECUTOR = "thread"
+
+    import app.main  # noqa: F401  (compiles the field specs and keyword tables)
+    from app.services import model_registry
+    model_registry.limit_threads(torch_threads)
+    status = model_registry.warm_up()
+
+    # A collection in a worker would write to the header of every object it
+    # visits, copying the pages it touches. Frozen objects are never visited.
+    gc.collect()
+    gc.freeze()
+    return status
+
+
+def _run_worker(sock: socket.socket, torch_threads: int, log_level: str):
+    import uvicorn
+    from app.main import app
+    from app.services import model_registry
+    # Thread pools are not inherited across fork; size the worker's own.
+    model_registry.limit_threads(torch_threads)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, sock: socket.socket, workers: int, torch_threads: int, log_level: str):
+        self.sock = sock
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.log_level = log_level
+        self.children: dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            # The master's handlers are inherited; uvicorn installs its own.
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            status = 1
+            try:
+                _run_worker(self.sock, self.torch_threads, self.log_level)
+                status = 0
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+            finally:
+                os._exit(status)
+        self.children[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+
+    def stop(self, signum, _frame):
+        if not self.stopping:
+            logger.info("Received %s, stopping %d workers", signal.Signals(signum).name, len(self.children))
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report_memory(self):
+        from app.services.model_registry import memory_usage
+        for pid in [os.getpid(), *self.children]:
+            usage = memory_usage(pid)
+            role = "master" if pid == os.getpid() else "worker"
+            logger.info("%s %d: rss=%s uss=%s pss=%s", role, pid,
+                        *(_megabytes(usage[key]) for key in ("rss_bytes", "uss_bytes", "pss_bytes")))
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        next_report = time.monotonic() + config.PREFORK_MEMORY_REPORT_SECONDS
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.5)
+                if config.PREFORK_MEMORY_REPORT_SECONDS > 0 and time.monotonic() >= next_report:
+                    self.report_memory()
+                    next_report = time.monotonic() + config.PREFORK_MEMORY_REPORT_SECONDS
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.warning("Worker %d exited with status %d after %.0fs; restarting it",
+                           pid, os.waitstatus_to_exitcode(status), time.monotonic() - started)
+            # Do not spin if workers die on startup (e.g. the database is down).
+            time.sleep(max(0.0, 1.0 - (time.monotonic() - started)))
+            self.spawn()
+        return 0
+
+
+def _set_ocr_workers(count: int):
+    """
+    Overrides OCR_WORKERS along with the settings that default to it, which
+    config computed from the original value. Must run before the app is imported.
+    """
+    config.OCR_WORKERS = count
+    config.JOB_CONCURRENCY = config._env_int("JOB_CONCURRENCY", count)
+    config.PAGES_PARALLELISM = config._env_int("PAGES_PARALLELISM", count)
+
+
+def _megabytes(value: int | None) -> str:
+    return "n/a" if value is None else f"{value / 2**20:.0f}MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.PREFORK_WORKERS)
+    parser.add_argument("--ocr-threads", type=int, default=config.PREFORK_OCR_THREADS,
+                        help="Concurrent OCR jobs per worker")
+    parser.add_argument("--torch-threads", type=int, default=config.PREFORK_TORCH_THREADS,
+                        help="Torch/OpenCV threads per worker (0: cores / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("Prefork mode needs os.fork (Linux or macOS).")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    _set_ocr_workers(args.ocr_threads)
+    sock = _bind(args.host, args.port)
+
+    started = time.perf_counter()
+    status = load_shared_state(torch_threads)
+    logger.info("Loaded models in %.2fs (rss=%s); forking %d workers with %d torch threads each",
+                time.perf_counter() - started, _megabytes(status["rss_bytes"]), args.workers, torch_threads)
+    sys.exit(Master(sock, args.workers, torch_threads, args.log_level).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,7 @@
 import re
-import spacy
 from app.models import AadhaarCardDetails
-
-# Load the spaCy model
-try:
-    NLP = spacy.load("en_core_web_sm")
-except OSError:
-    from spacy.cli import download
-    download("en_core_web_sm")
-    NLP = spacy.load("en_core_web_sm")
+from app.services.ner import find_person_names
+from app.services.field_engine import Analysis, analyze
 
 ## REFINE 1: A comprehensive list of keywords and labels to exclude from names.
 EXCLUDE_KEYWORDS = {
@@ -17,55 +10,25 @@ EXCLUDE_KEYWORDS = {
     'जन्म', 'तिथि', 'DOB', 'BIRTH', 'NAME', 'FATHER'
 }
 
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+_WHITESPACE = re.compile(r'[\n\r\s]+')
+
 def _clean_text(text: str) -> str:
     """Removes unwanted characters and extra whitespace."""
-    return re.sub(r'[\n\r\s]+', ' ', text).strip()
-
-def _extract_aadhaar_number(text: str) -> str | None:
-    """
-    Finds a 12-digit number by concatenating all digits from the text block.
-    This is robust against numbers split by newlines or spaces.
-    """
-    ## REFINE 2: This is the robust concatenation strategy.
-    all_digits = re.sub(r'\D', '', text)
-    if len(all_digits) >= 12:
-        # Often the Aadhaar is the first long number. We can add more logic here if needed.
-        # For now, let's search for any 12-digit sequence within the concatenated digits.
-        match = re.search(r'\d{12}', all_digits)
-        if match:
-            return match.group(0)
-    return None
-
-def _extract_dob(text: str) -> str | None:
-    """Finds a Date of Birth using a standard dd/mm/yyyy regex."""
-    dob_regex = r'\b(\d{2}/\d{2}/\d{4})\b'
-    match = re.search(dob_regex, text)
-    if match:
-        return match.group(0)
-    return None
+    return _WHITESPACE.sub(' ', text).strip()
 
-def _extract_gender(text: str) -> str | None:
-    """Finds gender using regex with word boundaries and Hindi words."""
-    if re.search(r'\b(Female|FEMALE|महिला)\b', text):
-        return "Female"
-    if re.search(r'\b(Male|MALE|पुरुष)\b', text):
-        return "Male"
-    return None
-
-def _extract_name(doc: spacy.tokens.doc.Doc, lines: list[str]) -> str | None:
+def _extract_name(person_names: list[str], lines: list[str]) -> str | None:
     """
     Extracts the name using a robust multi-stage filtering strategy.
     """
     candidate_names = []
     
     # Stage 1: Get candidates from NER
-    for ent in doc.ents:
-        if ent.label_ == "PERSON":
-            candidate_names.append(ent.text)
+    candidate_names.extend(person_names)
             
     # Stage 2: Get candidate from "line before DOB" heuristic
     for i, line in enumerate(lines):
-        if re.search(r'\d{2}/\d{2}/\d{4}', line):
+        if DATE_PATTERN.search(line):
             if i > 0:
                 candidate_names.append(lines[i-1])
 
@@ -95,23 +58,24 @@ def _extract_name(doc: spacy.tokens.doc.Doc, lines: list[str]) -> str | None:
 
 
 # --- Main Parsing Function ---
-def parse_aadhaar_details(raw_text: str) -> AadhaarCardDetails:
+def parse_aadhaar_details(raw_text: str, person_names: list[str] | None = None,
+                          analysis: Analysis | None = None) -> AadhaarCardDetails:
     """
     The main orchestrator function to parse Aadhaar card details.
+    `person_names` can carry PERSON entities found by a batched NER run, and
+    `analysis` the field-engine result if the text was already analysed.
     """
-    doc = NLP(raw_text)
-    lines = raw_text.split('\n')
-
-    aadhaar_number = _extract_aadhaar_number(raw_text) # Pass the whole text
-    dob = _extract_dob(raw_text)
-    gender = _extract_gender(raw_text)
-    name = _extract_name(doc, lines)
+    analysis = analysis or analyze(raw_text)
+    if person_names is None:
+        person_names = find_person_names(raw_text)
 
+    ## REFINE 2: The Aadhaar number comes from all digits of the text
+    # concatenated, which is robust against numbers split by newlines or spaces.
     return AadhaarCardDetails(
-        aadhaar_number=aadhaar_number,
-        date_of_birth=dob,
-        gender=gender,
-        name=name
+        aadhaar_number=analysis.fields["aadhaar_number"],
+        date_of_birth=analysis.fields["aadhaar_date_of_birth"],
+        gender=analysis.fields["gender"],
+        name=_extract_name(person_names, analysis.text.lines)
     )
 
 
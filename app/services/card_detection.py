@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from app import config
+from app.services.preprocessing import limit_size
+
+# Card detection for photos of cards lying on a table. Only the card is worth
+# reading: the rest of the frame costs OCR time and adds text (newspapers,
+# packaging) that confuses classification and the name heuristics.
+#
+# Candidates are found on a small grayscale copy, as the outlines of closed
+# edge regions and, for cards with a faint border, of regions brighter than
+# their surroundings. A candidate is kept if it is (close to) a convex
+# quadrilateral with roughly the proportions of an ID-1 card, as PAN,
+# Aadhaar (PVC) and Voter ID cards are. Each card is then warped from the
+# full-size photo to a canonical upright rectangle, which also removes
+# perspective and skew.
+
+# ISO/IEC 7810 ID-1: 85.60 x 53.98 mm.
+CARD_ASPECT = 85.60 / 53.98
+# Accepted width/height ratios of a candidate, allowing for perspective.
+MIN_ASPECT, MAX_ASPECT = 1.2, 2.1
+# A contour counts as a rectangle if it fills this much of its bounding rotated rectangle.
+MIN_FILL = 0.88
+
+
+@dataclass
+class CardLocation:
+    # Corners (top-left, top-right, bottom-right, bottom-left) as fractions
+    # of the photo's width and height.
+    corners: tuple[tuple[float, float], ...]
+    # Pixels of the crop OCR ran on, over pixels of the photo.
+    pixel_ratio: float
+
+
+def order_corners(points: np.ndarray) -> np.ndarray:
+    """Orders four points as top-left, top-right, bottom-right, bottom-left."""
+    points = points.reshape(4, 2).astype(np.float32)
+    # Clockwise around the centre (y points down). Picking each corner by the
+    # sum and difference of its coordinates instead can pick one point twice
+    # for a card turned near 45 degrees.
+    centre = points.mean(axis=0)
+    points = points[np.argsort(np.arctan2(points[:, 1] - centre[1], points[:, 0] - centre[0]))]
+    return np.roll(points, -int(np.argmin(points.sum(axis=1))), axis=0)
+
+
+def _side_lengths(corners: np.ndarray) -> tuple[float, float]:
+    """Mean width and height of an ordered quadrilateral."""
+    top, bottom = np.linalg.norm(corners[1] - corners[0]), np.linalg.norm(corners[2] - corners[3])
+    left, right = np.linalg.norm(corners[3] - corners[0]), np.linalg.norm(corners[2] - corners[1])
+    return (top + bottom) / 2, (left + right) / 2
+
+
+def _quadrilateral(contour: np.ndarray) -> np.ndarray | None:
+    hull = cv2.convexHull(contour)
+    approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+    if len(approx) == 4:
+        return order_corners(approx)
+    # Rounded corners or a finger over the edge: fall back to the rotated
+    # bounding rectangle if the region is rectangular enough.
+    rect = cv2.minAreaRect(contour)
+    width, height = rect[1]
+    if width * height and cv2.contourArea(hull) / (width * height) >= MIN_FILL:
+        return order_corners(cv2.boxPoints(rect))
+    return None
+
+
+def _candidate_masks(gray: np.ndarray) -> list[np.ndarray]:
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    median = float(np.median(blurred))
+    edges = cv2.Canny(blurred, 0.66 * median, min(255.0, 1.33 * median))
+    # Closes small gaps in the card's outline.
+    edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8), iterations=2)
+    _, bright = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    bright = cv2.morphologyEx(bright, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+    return [edges, bright]
+
+
+def find_cards(image: np.ndarray, max_cards: int = config.CARD_MAX_CARDS,
+               detect_side: int = config.CARD_DETECT_MAX_SIDE) -> list[np.ndarray]:
+    """
+    Corners of the cards in `image` (ordered, in its pixel coordinates),
+    largest first. Empty if no card is found, or if one card fills most of
+    the image already (a scan or a close-up), where cropping gains nothing.
+    """
+    small = limit_size(image, detect_side)
+    scale = max(small.shape[:2]) / max(image.shape[:2])
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    area = gray.shape[0] * gray.shape[1]
+
+    candidates = []
+    for mask in _candidate_masks(gray):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            if cv2.contourArea(contour) < config.CARD_MIN_AREA * area:
+                continue
+            corners = _quadrilateral(contour)
+            if corners is None:
+                continue
+            width, height = _side_lengths(corners)
+            if not MIN_ASPECT <= max(width, height) / max(min(width, height), 1.0) <= MAX_ASPECT:
+                continue
+            candidates.append((cv2.contourArea(corners), corners))
+
+    cards: list[np.ndarray] = []
+    for card_area, corners in sorted(candidates, key=lambda c: c[0], reverse=True):
+        if card_area >= config.CARD_FULL_FRAME * area:
+            return []
+        # The same card found by both masks, or a region inside a card (its photo).
+        centre = tuple(float(v) for v in corners.mean(axis=0))
+        if any(cv2.pointPolygonTest(card, centre, False) >= 0 for card in cards):
+            continue
+        cards.append(corners)
+        if len(cards) == max_cards:
+            break
+    return [corners / scale for corners in cards]
+
+
+def card_width(corners: np.ndarray) -> int:
+    """Pixels along the long side of the card with the given corners."""
+    return round(max(_side_lengths(corners)))
+
+
+def warp_card(image: np.ndarray, corners: np.ndarray, width: int = config.CARD_CROP_WIDTH) -> np.ndarray:
+    """
+    Warps the card with the given corners to an upright rectangle with the
+    ID-1 proportions, `width` pixels along its long side. Cards photographed
+    in portrait orientation stay in portrait.
+    """
+    quad_width, quad_height = _side_lengths(corners)
+    long_side, short_side = width, round(width / CARD_ASPECT)
+    size = (long_side, short_side) if quad_width >= quad_height else (short_side, long_side)
+    target = np.array([[0, 0], [size[0] - 1, 0], [size[0] - 1, size[1] - 1], [0, size[1] - 1]], np.float32)
+    matrix = cv2.getPerspectiveTransform(corners.astype(np.float32), target)
+    return cv2.warpPerspective(image, matrix, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def locate(image: np.ndarray, corners: np.ndarray, crop: np.ndarray) -> CardLocation:
+    height, width = image.shape[:2]
+    return CardLocation(
+        corners=tuple((round(float(x) / width, 4), round(float(y) / height, 4)) for x, y in corners),
+        pixel_ratio=round(crop.shape[0] * crop.shape[1] / (width * height), 4),
+    )
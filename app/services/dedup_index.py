@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+
+from app import config
+from app.services.document_classifier import DocumentType
+
+logger = logging.getLogger(__name__)
+
+# An in-process membership index of the identity numbers already stored in
+# MongoDB, one Bloom filter per document type. A Bloom filter never says "no"
+# for a number it has seen, so a miss proves the submission is new and the
+# database read can be skipped. A hit only means "maybe": those go through
+# the regular atomic upsert.
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float, bits: bytearray | None = None, count: int = 0):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        # Optimal size and number of hash functions for the target rate.
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        # Double hashing: k positions from two independent 64-bit hashes.
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """
+    A chain of Bloom filters. When the newest one reaches its capacity, a twice
+    as large one with half the error rate is added, which keeps the overall
+    false-positive rate under `fp_rate` however many numbers are stored.
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, initial_capacity: int, fp_rate: float, filters: list[BloomFilter] | None = None):
+        self.initial_capacity = initial_capacity
+        self.fp_rate = fp_rate
+        self.filters = filters or [BloomFilter(initial_capacity, fp_rate * (1 - self.TIGHTENING))]
+
+    def add(self, value: str):
+        if self.filters[-1].is_full:
+            last = self.filters[-1]
+            self.filters.append(BloomFilter(last.capacity * self.GROWTH, last.fp_rate * self.TIGHTENING))
+        self.filters[-1].add(value)
+
+    def __contains__(self, value: str) -> bool:
+        return any(value in bloom for bloom in self.filters)
+
+    def __len__(self) -> int:
+        return sum(bloom.count for bloom in self.filters)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+
+class DedupIndex:
+    def __init__(self, initial_capacity: int, fp_rate: float):
+        self.initial_capacity = initial_capacity
+        self.fp_rate = fp_rate
+        self.filters: dict[DocumentType, ScalableBloomFilter] = {}
+        # The newest `inserted_at` loaded per type, so a restored snapshot only
+        # needs the records stored around and after it.
+        self.loaded_until: dict[DocumentType, datetime] = {}
+        self.ready = False
+        self.stats_by_type: dict[DocumentType, dict[str, int]] = {}
+
+    def _filter(self, doc_type: DocumentType) -> ScalableBloomFilter:
+        if doc_type not in self.filters:
+            self.filters[doc_type] = ScalableBloomFilter(self.initial_capacity, self.fp_rate)
+        return self.filters[doc_type]
+
+    def _count(self, doc_type: DocumentType, name: str):
+        counters = self.stats_by_type.setdefault(doc_type, {"definitely_new": 0, "maybe_present": 0, "false_positives": 0})
+        counters[name] += 1
+
+    def is_definitely_new(self, doc_type: DocumentType, number: str) -> bool:
+        """True only when `number` has certainly never been stored for `doc_type`."""
+        if not self.ready:
+            return False
+        if number in self._filter(doc_type):
+            self._count(doc_type, "maybe_present")
+            return False
+        self._count(doc_type, "definitely_new")
+        return True
+
+    def record_false_positive(self, doc_type: DocumentType):
+        self._count(doc_type, "false_positives")
+
+    def add(self, doc_type: DocumentType, number: str):
+        self._filter(doc_type).add(number)
+
+    # --- Warm-up and snapshots ---
+
+    async def warm_up(self, collections: dict[DocumentType, tuple], snapshot_path: str | None = None):
+        """
+        Restores the snapshot (if any), then loads every record inserted since.
+
+        ObjectIds are generated by the clients and do not follow insertion
+        order across processes, so records are found by their `inserted_at`
+        instead. The catch-up starts INDEX_CATCH_UP_SECONDS before the newest
+        one loaded: the writers' clocks differ, and a write may become visible
+        after later ones. Numbers re-read in that window are already present.
+        """
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                await asyncio.to_thread(self.restore, snapshot_path)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable dedup snapshot %s: %s", snapshot_path, e)
+                self.filters, self.loaded_until = {}, {}
+
+        for doc_type, (collection, field) in collections.items():
+            query = {field: {"$type": "string"}}
+            since = self.loaded_until.get(doc_type)
+            if since is not None:
+                query["inserted_at"] = {"$gte": since - timedelta(seconds=config.INDEX_CATCH_UP_SECONDS)}
+            known = self.filters.get(doc_type)
+            loaded = 0
+            async for record in collection.find(query, {field: 1, "inserted_at": 1}):
+                inserted_at = record.get("inserted_at")
+                if inserted_at is not None:
+                    inserted_at = _utc(inserted_at)
+                    if since is None or inserted_at > since:
+                        since = inserted_at
+                if known is not None and record[field] in known:
+                    continue
+                self.add(doc_type, record[field])
+                loaded += 1
+            if since is not None:
+                self.loaded_until[doc_type] = since
+            logger.info("Dedup index for %s: loaded %d new records, %d total",
+                        doc_type.value, loaded, len(self._filter(doc_type)))
+        self.ready = True
+
+    def snapshot(self, path: str):
+        # Copied up front: requests keep adding numbers (and maybe new filter
+        # stages) while the file is written.
+        blooms = {doc_type: list(scalable.filters) for doc_type, scalable in list(self.filters.items())}
+        header = {
+            "fp_rate": self.fp_rate,
+            "initial_capacity": self.initial_capacity,
+            "types": {
+                doc_type.value: {
+                    "loaded_until": self.loaded_until[doc_type].isoformat() if doc_type in self.loaded_until else None,
+                    "filters": [{"capacity": b.capacity, "fp_rate": b.fp_rate, "count": b.count} for b in stages],
+                }
+                for doc_type, stages in blooms.items()
+            },
+        }
+        encoded = json.dumps(header).encode()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack("<I", len(encoded)))
+            f.write(encoded)
+            for stages in blooms.values():
+                for bloom in stages:
+                    f.write(bloom.bits)
+        os.replace(tmp_path, path)
+
+    def restore(self, path: str):
+        with open(path, "rb") as f:
+            (header_length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length))
+            if header["fp_rate"] != self.fp_rate or header["initial_capacity"] != self.initial_capacity:
+                raise ValueError("snapshot was taken with different filter settings")
+            filters, loaded_until = {}, {}
+            for type_value, entry in header["types"].items():
+                doc_type = DocumentType(type_value)
+                blooms = []
+                for spec in entry["filters"]:
+                    bloom = BloomFilter(spec["capacity"], spec["fp_rate"], count=spec["count"])
+                    bloom.bits = bytearray(f.read(len(bloom.bits)))
+                    blooms.append(bloom)
+                filters[doc_type] = ScalableBloomFilter(self.initial_capacity, self.fp_rate, blooms)
+                if "loaded_until" not in entry:
+                    raise ValueError("snapshot predates inserted_at tracking")
+                if entry["loaded_until"]:
+                    loaded_until[doc_type] = datetime.fromisoformat(entry["loaded_until"])
+        self.filters, self.loaded_until = filters, loaded_until
+
+    def stats(self) -> dict:
+        result = {"ready": self.ready, "fp_rate": self.fp_rate, "types": {}}
+        for doc_type, scalable in self.filters.items():
+            counters = self.stats_by_type.get(doc_type, {"definitely_new": 0, "maybe_present": 0, "false_positives": 0})
+            checks = counters["definitely_new"] + counters["maybe_present"]
+            result["types"][doc_type.value] = {
+                "items": len(scalable),
+                "memory_bytes": scalable.size_bytes,
+                "filters": len(scalable.filters),
+                **counters,
+                # Share of lookups answered without a database read.
+                "skip_rate": counters["definitely_new"] / checks if checks else None,
+            }
+        return result
+
+
+def _utc(value: datetime) -> datetime:
+    # The driver returns naive UTC datetimes unless the client is tz-aware.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+dedup_index = DedupIndex(config.DEDUP_INITIAL_CAPACITY, config.DEDUP_FP_RATE)
@@ -1,58 +1,11 @@
-import re
-from enum import Enum
+from app.services.field_engine import DocumentType, analyze
 
-class DocumentType(Enum):
-    PAN_CARD = "PAN_CARD"
-    AADHAAR_CARD = "AADHAAR_CARD"
-    VOTER_ID_CARD = "VOTER_ID_CARD"
-    UNKNOWN = "UNKNOWN"
+# The keywords and identifier patterns used for classification are declared
+# in the field engine (KEYWORDS, FIELD_SPECS and CLASSIFICATION_RULES), so
+# that they are compiled once and shared with the parsers.
 
 def classify_document(text: str) -> DocumentType:
     """
     Classifies a document based on key patterns and identifiers in the text.
     """
-    text = text.upper()
-
-    # Clean text for pattern matching
-    text_no_spaces = text.replace(" ", "").replace("\n", "")
-
-    # --------------------
-    # Aadhaar Detection
-    # --------------------
-    aadhaar_keywords = ['AADHAAR', 'UNIQUE IDENTIFICATION', 'VID', 'GOVERNMENT OF INDIA']
-    aadhaar_number_pattern = re.compile(r'\b\d{4}\s\d{4}\s\d{4}\b')  # 12-digit format with spaces
-    aadhaar_number_compact_pattern = re.compile(r'\b\d{12}\b')  # in case OCR removes spaces
-
-    if (
-        any(keyword in text for keyword in aadhaar_keywords) or
-        aadhaar_number_pattern.search(text) or
-        aadhaar_number_compact_pattern.search(text_no_spaces)
-    ):
-        return DocumentType.AADHAAR_CARD
-
-    # --------------------
-    # PAN Detection
-    # --------------------
-    pan_keywords = ['INCOME TAX DEPARTMENT', 'PERMANENT ACCOUNT NUMBER', 'GOVT. OF INDIA', 'INDIA', 'INCOMETAX']
-    pan_number_pattern = re.compile(r'\b[A-Z]{5}[0-9]{4}[A-Z]\b')
-
-    # Try to find a valid PAN format
-    if pan_number_pattern.search(text_no_spaces):
-        return DocumentType.PAN_CARD
-
-    # Fallback on PAN-related keywords
-    if any(keyword in text for keyword in pan_keywords):
-        # If keywords match but PAN pattern fails, still likely to be PAN
-        return DocumentType.PAN_CARD
-    
-        # Keywords for Voter ID Card (in English or Hindi)
-    voter_id_keywords = ["ELECTION COMMISSION OF INDIA", "निर्वाचन आयोग"]
-    if any(keyword in text for keyword in voter_id_keywords):
-        return DocumentType.VOTER_ID_CARD
-
-
-    # --------------------
-    # Default: Unknown
-    # --------------------
-    return DocumentType.UNKNOWN
-
+    return analyze(text).document_type
@@ -0,0 +1,190 @@
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import cached_property
+
+from app.services.ocr_types import OCRResult
+
+# A declarative description of every KYC document we understand: the
+# keywords and patterns that identify it, and the fields we pull out of it.
+# Everything is compiled once at import. `analyze` then looks at an OCR text a
+# single time and returns the document type together with all candidate
+# fields, so the classifier and the parsers no longer re-scan and re-split
+# the same text on their own.
+
+
+class DocumentType(Enum):
+    PAN_CARD = "PAN_CARD"
+    AADHAAR_CARD = "AADHAAR_CARD"
+    VOTER_ID_CARD = "VOTER_ID_CARD"
+    UNKNOWN = "UNKNOWN"
+
+
+class TextView:
+    """The normalised forms of one OCR text, each computed at most once."""
+
+    def __init__(self, raw: str):
+        self.raw = raw
+
+    @cached_property
+    def upper(self) -> str:
+        return self.raw.upper()
+
+    @cached_property
+    def no_spaces(self) -> str:
+        # Uppercased, with spaces and newlines removed (numbers split by OCR).
+        return self.upper.replace(" ", "").replace("\n", "")
+
+    @cached_property
+    def digits(self) -> str:
+        # Every digit of the text concatenated, robust to numbers split by newlines.
+        return _NON_DIGITS.sub("", self.raw)
+
+    @cached_property
+    def lines(self) -> list[str]:
+        return self.raw.split("\n")
+
+    def source(self, name: str) -> str:
+        return getattr(self, name)
+
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """
+    A field found by searching one view of the text with a pattern. The first
+    match wins; `value`, if set, is returned instead of the matched text.
+    """
+    name: str
+    pattern: str
+    source: str = "raw"
+    group: int = 0
+    value: str | None = None
+    compiled: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "compiled", re.compile(self.pattern))
+
+    def find(self, text: TextView) -> str | None:
+        match = self.compiled.search(text.source(self.source))
+        if match is None:
+            return None
+        return self.value if self.value is not None else match.group(self.group)
+
+
+@dataclass(frozen=True)
+class ClassificationRule:
+    """
+    Assigns `document_type` when any of the keyword groups or signal fields
+    matched. Rules are tried in order.
+    """
+    document_type: DocumentType
+    keyword_groups: tuple[str, ...] = ()
+    signals: tuple[str, ...] = ()
+
+
+class KeywordMatcher:
+    """
+    Finds every occurrence of a set of keywords, tagged by group, with one
+    compiled pattern: an alternation inside a lookahead matches at every
+    position, so overlapping keywords are all seen.
+    """
+
+    def __init__(self, keywords: dict[str, tuple[str, ...]]):
+        self._group_of: dict[str, str] = {}
+        for group, words in keywords.items():
+            for word in words:
+                self._group_of[word] = group
+        ordered = sorted(self._group_of, key=len, reverse=True)
+        # At any one position only the longest keyword is reported. That is
+        # only lossless if no keyword is a prefix of one from another group.
+        for i, longer in enumerate(ordered):
+            for shorter in ordered[i + 1:]:
+                if longer.startswith(shorter) and self._group_of[longer] != self._group_of[shorter]:
+                    raise ValueError(f"Keyword {shorter!r} is a prefix of {longer!r} in another group.")
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(word) for word in ordered) + "))")
+
+    def groups(self, text: str) -> frozenset[str]:
+        return frozenset(self._group_of[match.group(1)] for match in self._pattern.finditer(text))
+
+
+# --- The KYC document specification ---
+
+KEYWORDS = {
+    "aadhaar": ("AADHAAR", "UNIQUE IDENTIFICATION", "VID", "GOVERNMENT OF INDIA"),
+    "pan": ("INCOME TAX DEPARTMENT", "PERMANENT ACCOUNT NUMBER", "GOVT. OF INDIA", "INDIA", "INCOMETAX"),
+    # Keywords for Voter ID Card (in English or Hindi)
+    "voter_id": ("ELECTION COMMISSION OF INDIA", "निर्वाचन आयोग"),
+}
+
+FIELD_SPECS = (
+    # Classification signals
+    FieldSpec("aadhaar_spaced", r"\b\d{4}\s\d{4}\s\d{4}\b", source="upper"),  # 12-digit format with spaces
+    FieldSpec("aadhaar_compact", r"\b\d{12}\b", source="no_spaces"),  # in case OCR removes spaces
+    FieldSpec("pan_compact", r"\b[A-Z]{5}[0-9]{4}[A-Z]\b", source="no_spaces"),
+    # PAN: a 10-character token shaped 5 letters, 4 digits, 1 letter.
+    FieldSpec("pan_number", r"\b[A-Z]{5}[0-9]{4}[A-Z]\b", source="upper"),
+    FieldSpec("pan_date_of_birth", r"\d{2}/\d{2}/\d{4}", source="upper"),
+    # Aadhaar: the first 12 digits in a row once all other characters are dropped.
+    FieldSpec("aadhaar_number", r"\d{12}", source="digits"),
+    FieldSpec("aadhaar_date_of_birth", r"\b(\d{2}/\d{2}/\d{4})\b"),
+    FieldSpec("gender", r"\b(Female|FEMALE|महिला)\b", value="Female"),
+    FieldSpec("gender", r"\b(Male|MALE|पुरुष)\b", value="Male"),
+    # Voter ID (EPIC number): a 10-character token shaped 3 letters, 7 digits.
+    FieldSpec("voter_id", r"\b[A-Z]{3}[0-9]{7}\b", source="upper"),
+)
+
+CLASSIFICATION_RULES = (
+    ClassificationRule(DocumentType.AADHAAR_CARD, ("aadhaar",), ("aadhaar_spaced", "aadhaar_compact")),
+    # A valid PAN format is decisive on its own
+    ClassificationRule(DocumentType.PAN_CARD, signals=("pan_compact",)),
+    # Checked before the PAN keywords, which include the bare word "INDIA"
+    ClassificationRule(DocumentType.VOTER_ID_CARD, ("voter_id",)),
+    # If keywords match but PAN pattern fails, still likely to be PAN
+    ClassificationRule(DocumentType.PAN_CARD, ("pan",)),
+)
+
+_KEYWORD_MATCHER = KeywordMatcher(KEYWORDS)
+
+
+@dataclass
+class Analysis:
+    text: TextView
+    document_type: DocumentType
+    keyword_groups: frozenset[str]
+    fields: dict[str, str | None]
+    # The boxes and confidences behind the text, when it came from EasyOCR.
+    ocr: OCRResult | None = None
+
+
+def _extract_fields(text: TextView) -> dict[str, str | None]:
+    fields: dict[str, str | None] = {}
+    for spec in FIELD_SPECS:
+        if fields.get(spec.name) is None:
+            fields[spec.name] = spec.find(text)
+    return fields
+
+
+def _classify(keyword_groups: frozenset[str], fields: dict[str, str | None]) -> DocumentType:
+    for rule in CLASSIFICATION_RULES:
+        if (keyword_groups.intersection(rule.keyword_groups)
+                or any(fields[signal] for signal in rule.signals)):
+            return rule.document_type
+    return DocumentType.UNKNOWN
+
+
+def analyze(raw_text: str, ocr: OCRResult | None = None) -> Analysis:
+    """
+    Classifies an OCR text and extracts every candidate field in one go.
+    Text read through a layout template keeps the type it was read as.
+    """
+    text = TextView(raw_text)
+    keyword_groups = _KEYWORD_MATCHER.groups(text.upper)
+    fields = _extract_fields(text)
+    if ocr is not None and ocr.read_as is not None:
+        document_type = DocumentType(ocr.read_as)
+    else:
+        document_type = _classify(keyword_groups, fields)
+    return Analysis(text=text, document_type=document_type, keyword_groups=keyword_groups, fields=fields, ocr=ocr)
@@ -0,0 +1,432 @@
+import asyncio
+import difflib
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from app import config
+from app.services.document_classifier import DocumentType
+
+logger = logging.getLogger(__name__)
+
+# Fuzzy identity resolution across stored KYC records. The unique indexes
+# only catch a number seen before character for character. This index also
+# finds the same person behind a number with an OCR error, or behind another
+# document type, without comparing against every record.
+#
+# Each record is filed under a handful of blocking keys:
+#   - each half of its identity number, by position: a number with one wrong
+#     character still shares the other half exactly;
+#   - the phonetic code of each name token together with the date of birth;
+#   - the phonetic codes of the whole name.
+# A lookup gathers the records sharing a key with the query and scores only
+# those. Postings live in sorted numpy arrays (binary search) plus a small
+# dict of recent additions that is merged in as it grows, so lookups stay
+# logarithmic in the number of records and memory is ~12 bytes per posting.
+# Keys that match too many records (a common name) carry no information and
+# are skipped.
+
+TYPE_CODES = {
+    DocumentType.PAN_CARD: 0,
+    DocumentType.AADHAAR_CARD: 1,
+    DocumentType.VOTER_ID_CARD: 2,
+}
+DOCUMENT_TYPES = list(TYPE_CODES)
+
+NUMBER_FIELDS = {
+    DocumentType.PAN_CARD: "pan_number",
+    DocumentType.AADHAAR_CARD: "aadhaar_number",
+    DocumentType.VOTER_ID_CARD: "voter_id",
+}
+
+NUMBER_WIDTH = 12
+NAME_WIDTH = 32
+_KEY_MASK = 2**64 - 1
+
+# Score weights of the compared fields; the score is over the fields both records have.
+WEIGHTS = {"number": 0.5, "name": 0.3, "date_of_birth": 0.2}
+# A field counts as matched (in `matched_on`) at this similarity.
+FIELD_MATCH = 0.85
+# Records that share only a name are scored lower than the name similarity,
+# below the default IDENTITY_MIN_SCORE: at millions of records, a name alone
+# is shared by different people. Lower the threshold to report them.
+NAME_ONLY_FACTOR = 0.7
+
+_NOT_LETTERS = re.compile(r"[^A-Z]+")
+_DATE = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+
+# Spelling variants common in transliterated Indian names, folded before Soundex.
+_SPELLING_VARIANTS = (("PH", "F"), ("W", "V"), ("Z", "J"), ("Q", "K"), ("CK", "K"))
+_SOUNDEX = {
+    **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"), **dict.fromkeys("DT", "3"),
+    "L": "4", **dict.fromkeys("MN", "5"), "R": "6",
+}
+
+
+def normalize_name(name: str | None) -> str:
+    return " ".join(_NOT_LETTERS.sub(" ", (name or "").upper()).split())
+
+
+@lru_cache(maxsize=65536)
+def phonetic_key(token: str) -> str:
+    """Soundex of a name token, after folding common spelling variants."""
+    for variant, replacement in _SPELLING_VARIANTS:
+        token = token.replace(variant, replacement)
+    if not token:
+        return ""
+    code, previous = token[0], _SOUNDEX.get(token[0], "")
+    for char in token[1:]:
+        digit = _SOUNDEX.get(char, "")
+        if digit and digit != previous:
+            code += digit
+        # H and W do not separate equal codes; vowels do.
+        if char not in "HW":
+            previous = digit
+    return (code + "000")[:4]
+
+
+def parse_date(value: str | None) -> int:
+    """DD/MM/YYYY as the integer YYYYMMDD, 0 if missing or malformed."""
+    match = _DATE.search(value or "")
+    if match is None:
+        return 0
+    day, month, year = match.groups()
+    return int(year + month + day)
+
+
+def mask_number(number: str) -> str:
+    return "X" * max(0, len(number) - 4) + number[-4:]
+
+
+def _hash(key: str) -> int:
+    # The index lives in one process and is rebuilt on start, so the
+    # per-process string hash is stable enough.
+    return hash(key) & _KEY_MASK
+
+
+def blocking_keys(type_code: int, number: str, date: int, name: str) -> list[int]:
+    keys = []
+    if number:
+        half = (len(number) + 1) // 2
+        keys += [f"n{type_code}|0|{number[:half]}", f"n{type_code}|1|{number[half:]}"]
+    codes = sorted({phonetic_key(token) for token in name.split() if len(token) > 1})
+    if date:
+        keys += [f"pd|{code}|{date}" for code in codes]
+    if len(codes) >= 2:
+        keys.append("pn|" + "|".join(codes))
+    return [_hash(key) for key in keys]
+
+
+class RecordStore:
+    """The fields scoring needs, for every indexed record, in flat arrays."""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.types = np.zeros(capacity, np.uint8)
+        self.numbers = np.zeros(capacity, f"S{NUMBER_WIDTH}")
+        self.dates = np.zeros(capacity, np.uint32)
+        self.names = np.zeros(capacity, f"S{NAME_WIDTH}")
+
+    def _reserve(self, count: int):
+        if self.size + count <= len(self.types):
+            return
+        capacity = max(self.size + count, 2 * len(self.types))
+        for attribute in ("types", "numbers", "dates", "names"):
+            old = getattr(self, attribute)
+            new = np.zeros(capacity, old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, attribute, new)
+
+    def extend(self, rows: list[tuple[int, str, int, str]]) -> int:
+        """Appends (type code, number, date, normalised name) rows; returns the first new id."""
+        self._reserve(len(rows))
+        first = self.size
+        end = first + len(rows)
+        types, numbers, dates, names = zip(*rows)
+        self.types[first:end] = types
+        self.numbers[first:end] = [number.encode("ascii", "ignore") for number in numbers]
+        self.dates[first:end] = dates
+        self.names[first:end] = [name.encode("ascii", "ignore")[:NAME_WIDTH] for name in names]
+        self.size = end
+        return first
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, a).nbytes for a in ("types", "numbers", "dates", "names"))
+
+
+class PostingIndex:
+    """Blocking key -> record ids."""
+
+    # Recent additions are merged into the sorted arrays once they exceed
+    # this, or 2% of the postings, whichever is larger.
+    MIN_MERGE = 100_000
+
+    def __init__(self):
+        self.keys = np.empty(0, np.uint64)
+        self.ids = np.empty(0, np.uint32)
+        self.recent: dict[int, list[int]] = {}
+        self.recent_count = 0
+        self._bulk: list[tuple[np.ndarray, np.ndarray]] = []
+
+    def add(self, keys: list[int], record_id: int):
+        for key in keys:
+            self.recent.setdefault(key, []).append(record_id)
+        self.recent_count += len(keys)
+        if self.recent_count > max(self.MIN_MERGE, len(self.keys) // 50):
+            self.merge()
+
+    def add_bulk(self, keys: np.ndarray, ids: np.ndarray):
+        """Queues many postings; they are sorted in at the next `merge`."""
+        self._bulk.append((keys, ids))
+
+    def merge(self):
+        if self._bulk:
+            keys = np.concatenate([self.keys] + [k for k, _ in self._bulk])
+            ids = np.concatenate([self.ids] + [i for _, i in self._bulk])
+            order = np.argsort(keys, kind="stable")
+            self.keys, self.ids = keys[order], ids[order]
+            self._bulk = []
+        if self.recent:
+            # Sorted insert of the (few) recent postings: one linear copy, no full sort.
+            new_keys = np.fromiter((k for k, ids in self.recent.items() for _ in ids), np.uint64, self.recent_count)
+            new_ids = np.fromiter((i for ids in self.recent.values() for i in ids), np.uint32, self.recent_count)
+            order = np.argsort(new_keys, kind="stable")
+            new_keys, new_ids = new_keys[order], new_ids[order]
+            positions = np.searchsorted(self.keys, new_keys, side="right")
+            self.keys = np.insert(self.keys, positions, new_keys)
+            self.ids = np.insert(self.ids, positions, new_ids)
+            self.recent, self.recent_count = {}, 0
+
+    def get(self, key: int) -> np.ndarray:
+        key = np.uint64(key)
+        start, end = np.searchsorted(self.keys, key, "left"), np.searchsorted(self.keys, key, "right")
+        found = self.ids[start:end]
+        recent = self.recent.get(int(key))
+        if recent:
+            found = np.concatenate([found, np.asarray(recent, np.uint32)])
+        return found
+
+    def __len__(self) -> int:
+        return len(self.keys) + self.recent_count
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.ids.nbytes
+
+
+@dataclass
+class Candidate:
+    record_id: int
+    document_type: DocumentType
+    number: str
+    score: float
+    matched_on: list[str] = field(default_factory=list)
+
+
+def _name_similarity(a: str, b: str) -> float:
+    similarity = difflib.SequenceMatcher(None, a, b).ratio()
+    a_tokens, b_tokens = a.split(), b.split()
+    if sorted(a_tokens) != a_tokens or sorted(b_tokens) != b_tokens:
+        # Token order differs between documents ("SHARMA RAHUL").
+        similarity = max(similarity, difflib.SequenceMatcher(None, " ".join(sorted(a_tokens)),
+                                                             " ".join(sorted(b_tokens))).ratio())
+    if {phonetic_key(t) for t in a_tokens} == {phonetic_key(t) for t in b_tokens}:
+        similarity = max(similarity, 0.9)
+    return similarity
+
+
+def _date_similarity(a: int, b: int) -> float:
+    if a == b:
+        return 1.0
+    # Day and month swapped by the parser or the card's format.
+    if a // 10000 == b // 10000 and a % 100 == (b // 100) % 100 and (a // 100) % 100 == b % 100:
+        return 0.5
+    return 0.0
+
+
+def _number_similarity(a: str, b: str) -> float:
+    if len(a) != len(b):
+        return 0.0
+    return 1.0 - sum(x != y for x, y in zip(a, b)) / len(a)
+
+
+def _combine(similarities: dict[str, float]) -> float:
+    if list(similarities) == ["name"]:
+        return NAME_ONLY_FACTOR * similarities["name"]
+    value = sum(WEIGHTS[f] * s for f, s in similarities.items()) / sum(WEIGHTS[f] for f in similarities)
+    if "number" not in similarities and "name" in similarities:
+        # Without a number to compare, the person is only as certain as the
+        # name: a shared surname and birth date is not a match.
+        value = min(value, similarities["name"])
+    return value
+
+
+def score(query: tuple[int, str, int, str], record: tuple[int, str, int, str],
+          min_score: float = 0.0) -> tuple[float, list[str]]:
+    """Similarity in [0, 1] of two (type code, number, date, name) rows, and the fields that matched."""
+    query_type, query_number, query_date, query_name = query
+    record_type, record_number, record_date, record_name = record
+    similarities = {}
+    if query_type == record_type and query_number and record_number:
+        similarities["number"] = _number_similarity(query_number, record_number)
+    if query_date and record_date:
+        similarities["date_of_birth"] = _date_similarity(query_date, record_date)
+    if query_name and record_name:
+        # Names are the costly comparison: skip it if even an exact name would not reach min_score.
+        if _combine({**similarities, "name": 1.0}) < min_score:
+            return 0.0, []
+        similarities["name"] = _name_similarity(query_name[:NAME_WIDTH], record_name)
+    if not similarities:
+        return 0.0, []
+    return _combine(similarities), [f for f in WEIGHTS if similarities.get(f, 0.0) >= FIELD_MATCH]
+
+
+class IdentityIndex:
+    def __init__(self, max_block: int, min_score: float, max_matches: int):
+        self.max_block = max_block
+        self.min_score = min_score
+        self.max_matches = max_matches
+        self.records = RecordStore()
+        self.postings = PostingIndex()
+        # The newest `inserted_at` loaded per type (see DedupIndex.warm_up).
+        self.loaded_until: dict[DocumentType, datetime] = {}
+        self.ready = False
+        self.counters = {"lookups": 0, "candidates": 0, "skipped_blocks": 0, "matches": 0}
+        # Loads add records from a worker thread while requests add and look
+        # up theirs, from worker threads too.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def row(doc_type: DocumentType, number: str | None, name: str | None,
+            date_of_birth: str | None) -> tuple[int, str, int, str]:
+        return (TYPE_CODES[doc_type], (number or "").upper()[:NUMBER_WIDTH],
+                parse_date(date_of_birth), normalize_name(name))
+
+    @classmethod
+    def row_of(cls, doc_type: DocumentType, data) -> tuple[int, str, int, str]:
+        """The row of a parsed document model or a stored record (dict)."""
+        get = data.get if isinstance(data, dict) else lambda name: getattr(data, name, None)
+        return cls.row(doc_type, get(NUMBER_FIELDS[doc_type]), get("name"), get("date_of_birth"))
+
+    def _contains(self, row: tuple[int, str, int, str]) -> bool:
+        type_code, number = row[0], row[1]
+        if not number:
+            return False
+        for record_id in self.postings.get(blocking_keys(type_code, number, 0, "")[0]):
+            if self.records.types[record_id] == type_code and self.records.numbers[record_id].decode() == number:
+                return True
+        return False
+
+    def add_rows(self, rows: list[tuple[int, str, int, str]], skip_known: bool = False):
+        """Indexes (type code, number, date, name) rows; records without a number are ignored."""
+        with self._lock:
+            rows = [row for row in rows if row[1] and not (skip_known and self._contains(row))]
+            if not rows:
+                return
+            first = self.records.extend(rows)
+            if len(rows) == 1:
+                self.postings.add(blocking_keys(*rows[0]), first)
+                return
+            keys, ids = [], []
+            for offset, row in enumerate(rows):
+                row_keys = blocking_keys(*row)
+                keys.extend(row_keys)
+                ids.extend([first + offset] * len(row_keys))
+            self.postings.add_bulk(np.array(keys, np.uint64), np.array(ids, np.uint32))
+
+    def add(self, doc_type: DocumentType, data):
+        if doc_type in TYPE_CODES:
+            self.add_rows([self.row_of(doc_type, data)], skip_known=True)
+
+    def merge(self):
+        with self._lock:
+            self.postings.merge()
+
+    def find(self, row: tuple[int, str, int, str]) -> list[Candidate]:
+        """Scores the records sharing a blocking key with `row`, best first."""
+        with self._lock:
+            blocks = []
+            for key in blocking_keys(*row):
+                block = self.postings.get(key)
+                if len(block) > self.max_block:
+                    self.counters["skipped_blocks"] += 1
+                    continue
+                blocks.append(block)
+            candidate_ids = np.unique(np.concatenate(blocks)) if blocks else []
+            self.counters["lookups"] += 1
+            self.counters["candidates"] += len(candidate_ids)
+
+            candidates = []
+            records = self.records
+            for record_id in candidate_ids:
+                record = (int(records.types[record_id]), records.numbers[record_id].decode(),
+                          int(records.dates[record_id]), records.names[record_id].decode())
+                value, matched_on = score(row, record, self.min_score)
+                if value >= self.min_score:
+                    candidates.append(Candidate(int(record_id), DOCUMENT_TYPES[record[0]], record[1],
+                                                round(value, 4), matched_on))
+        # A record stored while the index warmed up can be indexed twice.
+        best: dict[tuple[DocumentType, str], Candidate] = {}
+        for candidate in sorted(candidates, key=lambda c: c.score, reverse=True):
+            best.setdefault((candidate.document_type, candidate.number), candidate)
+        matches = list(best.values())[:self.max_matches]
+        with self._lock:
+            self.counters["matches"] += len(matches)
+        return matches
+
+    def match(self, doc_type: DocumentType, data) -> list[Candidate]:
+        if not self.ready or doc_type not in TYPE_CODES:
+            return []
+        return self.find(self.row_of(doc_type, data))
+
+    async def load(self, collections: dict[DocumentType, tuple], skip_known: bool = False,
+                   chunk_size: int = 20_000) -> int:
+        """Adds every record stored since the last load. Indexing runs off the event loop."""
+        loaded = 0
+        for doc_type, (collection, number_field) in collections.items():
+            query = {number_field: {"$type": "string"}}
+            since = self.loaded_until.get(doc_type)
+            if since is not None:
+                query["inserted_at"] = {"$gte": since - timedelta(seconds=config.INDEX_CATCH_UP_SECONDS)}
+            projection = {number_field: 1, "name": 1, "date_of_birth": 1, "inserted_at": 1}
+            rows = []
+            async for record in collection.find(query, projection):
+                rows.append(self.row_of(doc_type, record))
+                if record.get("inserted_at") is not None and (since is None or record["inserted_at"] > since):
+                    since = self.loaded_until[doc_type] = record["inserted_at"]
+                if len(rows) >= chunk_size:
+                    await asyncio.to_thread(self.add_rows, rows, skip_known)
+                    loaded += len(rows)
+                    rows = []
+            if rows:
+                await asyncio.to_thread(self.add_rows, rows, skip_known)
+                loaded += len(rows)
+        await asyncio.to_thread(self.merge)
+        return loaded
+
+    async def warm_up(self, collections: dict[DocumentType, tuple]):
+        loaded = await self.load(collections)
+        self.ready = True
+        logger.info("Identity index: loaded %d records, %d postings", loaded, len(self.postings))
+
+    async def refresh(self, collections: dict[DocumentType, tuple]):
+        """Picks up records other processes stored; numbers already indexed are skipped."""
+        await self.load(collections, skip_known=True)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "records": self.records.size,
+            "postings": len(self.postings),
+            "memory_bytes": self.records.nbytes + self.postings.nbytes,
+            **self.counters,
+        }
+
+
+identity_index = IdentityIndex(config.IDENTITY_MAX_BLOCK, config.IDENTITY_MIN_SCORE, config.IDENTITY_MAX_MATCHES)
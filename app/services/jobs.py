@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from app import config
+from app.services.ocr_pool import OCRPoolBusy
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle: queued -> running -> succeeded | failed
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class JobFailed(Exception):
+    """Raised by a job handler for errors that should be reported to the client."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Job stores ---
+# A store persists job records. Records are plain dicts with an "_id" (the job
+# id), "status", "filename", "image" (the upload, dropped once the job has
+# finished), "result", "error" and timestamps.
+#
+# Several processes can share a store (prefork workers, replicas). An
+# unfinished job carries a lease: the runner that holds it ("lease_owner")
+# renews "lease_expires_at" while the job is queued or running there. A runner
+# only runs a job it claims atomically, and only takes over jobs whose lease
+# has expired, i.e. whose runner died.
+
+
+def _claimable(job: dict, owner: str, now: datetime) -> bool:
+    return (job["status"] not in FINISHED_STATES
+            and (job.get("lease_owner") in (None, owner) or job["lease_expires_at"] < now))
+
+class InMemoryJobStore:
+    """Keeps jobs in a dict. Used for tests and single-process development."""
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+
+    async def setup(self):
+        pass
+
+    async def create(self, job: dict):
+        self._jobs[job["_id"]] = dict(job)
+
+    async def get(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def update(self, job_id: str, fields: dict, unset: tuple = ()):
+        job = self._jobs[job_id]
+        job.update(fields)
+        for name in unset:
+            job.pop(name, None)
+
+    async def claim(self, job_id: str, owner: str, now: datetime, expires_at: datetime) -> dict | None:
+        job = self._jobs.get(job_id)
+        if job is None or not _claimable(job, owner, now):
+            return None
+        job.update(status=RUNNING, lease_owner=owner, lease_expires_at=expires_at, updated_at=now)
+        return dict(job)
+
+    async def renew(self, job_ids: list[str], owner: str, expires_at: datetime):
+        for job_id in job_ids:
+            job = self._jobs.get(job_id)
+            if job is not None and job.get("lease_owner") == owner:
+                job["lease_expires_at"] = expires_at
+
+    async def list_recoverable(self, now: datetime) -> list[str]:
+        return [job_id for job_id, job in self._jobs.items()
+                if job["status"] not in FINISHED_STATES
+                and (job.get("lease_owner") is None or job["lease_expires_at"] < now)]
+
+
+class MongoJobStore:
+    """Keeps jobs in a Mongo collection so that queued work survives restarts."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def setup(self):
+        await self.collection.create_index("status")
+
+    async def create(self, job: dict):
+        await self.collection.insert_one(dict(job))
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def update(self, job_id: str, fields: dict, unset: tuple = ()):
+        update = {"$set": fields}
+        if unset:
+            update["$unset"] = {name: "" for name in unset}
+        await self.collection.update_one({"_id": job_id}, update)
+
+    async def claim(self, job_id: str, owner: str, now: datetime, expires_at: datetime) -> dict | None:
+        """Marks the job running under `owner`, unless it is finished or leased by a live runner."""
+        return await self.collection.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$nin": list(FINISHED_STATES)},
+                "$or": [
+                    {"lease_owner": {"$in": [None, owner]}},
+                    {"lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {"$set": {"status": RUNNING, "lease_owner": owner, "lease_expires_at": expires_at, "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def renew(self, job_ids: list[str], owner: str, expires_at: datetime):
+        await self.collection.update_many(
+            {"_id": {"$in": job_ids}, "lease_owner": owner},
+            {"$set": {"lease_expires_at": expires_at}},
+        )
+
+    async def list_recoverable(self, now: datetime) -> list[str]:
+        """Unfinished jobs nobody holds: never leased, or their runner stopped renewing."""
+        cursor = self.collection.find(
+            {
+                "status": {"$nin": list(FINISHED_STATES)},
+                "$or": [{"lease_owner": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            {"_id": 1},
+        ).sort("created_at", 1)
+        return [job["_id"] async for job in cursor]
+
+
+# --- Queue ---
+
+class InProcessQueue:
+    """
+    Hands job ids from the API to the workers within this process.
+
+    The job record itself lives in the store; the queue only carries ids, so a
+    different transport can be dropped in without touching the runner.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+
+    async def put(self, job_id: str):
+        await self._queue.put(job_id)
+
+    async def get(self) -> str:
+        return await self._queue.get()
+
+    def task_done(self):
+        self._queue.task_done()
+
+    async def join(self):
+        await self._queue.join()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+# --- Runner ---
+
+class JobRunner:
+    """
+    Consumes queued jobs and runs them through `handler`.
+
+    `handler(image_bytes)` is an async callable returning a pydantic model,
+    which is stored as the job result. Raising `JobFailed` marks the job as
+    failed with that message.
+
+    Jobs submitted here are leased to this runner until they finish; the
+    lease is renewed every third of `lease_seconds`, and jobs whose lease
+    has expired are queued here then.
+    """
+
+    def __init__(self, store, queue, handler, concurrency: int = 1,
+                 busy_retry_seconds: float = 1.0, poll_interval: float = 0.5,
+                 lease_seconds: float = 60.0):
+        self.store = store
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.busy_retry_seconds = busy_retry_seconds
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner: str | None = None
+        # Jobs leased to this runner, and jobs in its queue.
+        self._held: set[str] = set()
+        self._queued: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        # Completion events of the jobs someone waits for, with their waiter
+        # counts; the last waiter to leave removes the event.
+        self._finished: dict[str, asyncio.Event] = {}
+        self._waiters: dict[str, int] = {}
+
+    def _lease_expiry(self) -> datetime:
+        return _now() + timedelta(seconds=self.lease_seconds)
+
+    async def start(self):
+        # Set here rather than in __init__: prefork workers fork after import.
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        await self.store.setup()
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain_leases()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, image_bytes: bytes, filename: str | None = None) -> dict:
+        now = _now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "filename": filename,
+            "image": image_bytes,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "lease_owner": self.owner,
+            "lease_expires_at": self._lease_expiry(),
+        }
+        self._held.add(job["_id"])
+        await self.store.create(job)
+        await self._enqueue(job["_id"])
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> dict | None:
+        """
+        Returns the job once it has finished, or its current state after `timeout`.
+
+        Completion within this process is signalled directly; the store is also
+        polled so that jobs finished by another process are noticed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                job = await self.store.get(job_id)
+                remaining = deadline - loop.time()
+                if job is None or job["status"] in FINISHED_STATES or remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                del self._finished[job_id]
+
+    async def events(self, job_id: str, heartbeat_seconds: float):
+        """
+        Yields the job each time its status changes, ending with its final
+        state, and None after `heartbeat_seconds` without a change.
+        """
+        loop = asyncio.get_running_loop()
+        job = await self.store.get(job_id)
+        last_status = None
+        last_sent = loop.time()
+        while job is not None:
+            if job["status"] != last_status:
+                last_status = job["status"]
+                last_sent = loop.time()
+                yield job
+            if last_status in FINISHED_STATES:
+                return
+            if loop.time() - last_sent >= heartbeat_seconds:
+                last_sent = loop.time()
+                yield None
+            job = await self.wait(job_id, min(heartbeat_seconds, 1.0))
+
+    async def _enqueue(self, job_id: str):
+        self._queued.add(job_id)
+        await self.queue.put(job_id)
+
+    async def _recover(self):
+        """Queues the jobs whose runner died; those of live runners are left alone."""
+        for job_id in await self.store.list_recoverable(_now()):
+            if job_id not in self._queued:
+                await self._enqueue(job_id)
+
+    async def _maintain_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if self._held:
+                    await self.store.renew(list(self._held), self.owner, self._lease_expiry())
+                await self._recover()
+            except Exception:
+                logger.exception("Maintaining job leases failed")
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job %s crashed", job_id)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await self.store.claim(job_id, self.owner, _now(), self._lease_expiry())
+        if job is None:
+            # Finished, or claimed by another runner.
+            self._held.discard(job_id)
+            return
+        self._held.add(job_id)
+
+        while True:
+            try:
+                result = await self.handler(job["image"])
+                fields = {"status": SUCCEEDED, "result": result.model_dump(mode="json")}
+                break
+            except OCRPoolBusy:
+                # Synchronous traffic has filled the pool; wait for a slot
+                # rather than failing the job.
+                await asyncio.sleep(self.busy_retry_seconds)
+            except JobFailed as e:
+                fields = {"status": FAILED, "error": str(e)}
+                break
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                fields = {"status": FAILED, "error": f"Processing failed: {e}"}
+                break
+
+        fields["updated_at"] = _now()
+        await self.store.update(job_id, fields, unset=("image", "lease_owner", "lease_expires_at"))
+        self._held.discard(job_id)
+        event = self._finished.get(job_id)
+        if event is not None:
+            event.set()
+
+
+def build_job_store():
+    if config.JOB_STORE == "mongo":
+        from app.database import db
+        return MongoJobStore(db.jobs)
+    if config.JOB_STORE == "memory":
+        return InMemoryJobStore()
+    raise ValueError(f"Unknown job store: {config.JOB_STORE}")
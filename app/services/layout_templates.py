@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app import config
+from app.services.document_classifier import DocumentType
+from app.services.ocr_service import OCRResult, load_reader
+from app.services.preprocessing import limit_size
+
+# Layout templates for card types we know. Once a card's type is known, text
+# detection runs once and recognition only on the boxes that fall in one of
+# the template's regions: headers, slogans and labels are never read. Each
+# region can restrict the characters recognition may produce.
+#
+# Regions are fractions of the area the detected text covers, not of the
+# image, so margins and background around the card do not move them. A card
+# that does not fit its template loses its key number, which the adaptive OCR
+# escalation then reads from the full image. Templated text is not classified
+# again: its headers were dropped, so it keeps the pre-pass's document type.
+
+DIGITS = "0123456789"
+UPPERCASE_ALPHANUMERIC = "ABCDEFGHIJKLMNOPQRSTUVWXYZ" + DIGITS
+
+
+@dataclass(frozen=True)
+class FieldRegion:
+    name: str
+    # (left, top, right, bottom), as fractions of the text area.
+    bounds: tuple[float, float, float, float]
+    # Characters recognition may produce here; None allows every character.
+    allowlist: str | None = None
+
+    def contains(self, x: float, y: float) -> bool:
+        left, top, right, bottom = self.bounds
+        return left <= x <= right and top <= y < bottom
+
+
+@dataclass(frozen=True)
+class LayoutTemplate:
+    document_type: DocumentType
+    # In reading order; a box belongs to the first region containing its centre.
+    regions: tuple[FieldRegion, ...]
+
+    def region_of(self, x: float, y: float) -> FieldRegion | None:
+        for region in self.regions:
+            if region.contains(x, y):
+                return region
+        return None
+
+
+LAYOUT_TEMPLATES = {
+    DocumentType.PAN_CARD: LayoutTemplate(DocumentType.PAN_CARD, (
+        # Above: "INCOME TAX DEPARTMENT". The number sits below its label.
+        FieldRegion("pan_number", (0.0, 0.12, 1.0, 0.45), UPPERCASE_ALPHANUMERIC),
+        # Name, father's name and date of birth, with their labels.
+        FieldRegion("details", (0.0, 0.45, 1.0, 1.0)),
+    )),
+    DocumentType.AADHAAR_CARD: LayoutTemplate(DocumentType.AADHAAR_CARD, (
+        # Above: "भारत सरकार / GOVERNMENT OF INDIA".
+        FieldRegion("details", (0.0, 0.22, 1.0, 0.68)),
+        FieldRegion("aadhaar_number", (0.0, 0.68, 1.0, 0.90), DIGITS + " "),
+        # Below: "आधार - आम आदमी का अधिकार".
+    )),
+}
+
+
+def _box_bounds(box) -> tuple[float, float, float, float]:
+    """(left, top, right, bottom) of a detected box, horizontal or free-form."""
+    if len(box) == 4 and not isinstance(box[0], (list, tuple, np.ndarray)):
+        x_min, x_max, y_min, y_max = box
+        return x_min, y_min, x_max, y_max
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def read_template(image: np.ndarray, template: LayoutTemplate, languages: tuple[str, ...],
+                  max_side: int = 0) -> OCRResult:
+    """
+    OCRs only the text in the template's regions: one detection pass, then
+    recognition per region with that region's allowlist. The result is
+    marked as read as the template's document type.
+    """
+    resized = limit_size(image, max_side) if max_side else image
+    reader = load_reader(languages)
+    horizontal, free = reader.detect(resized)
+    boxes = [(box, True) for box in horizontal[0]] + [(box, False) for box in free[0]]
+    if not boxes:
+        return OCRResult(read_as=template.document_type.value)
+
+    bounds = [_box_bounds(box) for box, _ in boxes]
+    left, top = min(b[0] for b in bounds), min(b[1] for b in bounds)
+    width = max(max(b[2] for b in bounds) - left, 1)
+    height = max(max(b[3] for b in bounds) - top, 1)
+
+    selected: dict[FieldRegion, tuple[list, list]] = {region: ([], []) for region in template.regions}
+    for (box, is_horizontal), (x0, y0, x1, y1) in zip(boxes, bounds):
+        region = template.region_of(((x0 + x1) / 2 - left) / width, ((y0 + y1) / 2 - top) / height)
+        if region is not None:
+            selected[region][0 if is_horizontal else 1].append(box)
+
+    results = []
+    for region, (horizontal_boxes, free_boxes) in selected.items():
+        if horizontal_boxes or free_boxes:
+            results.extend(reader.recognize(
+                resized, horizontal_list=horizontal_boxes, free_list=free_boxes,
+                allowlist=region.allowlist, batch_size=config.OCR_BATCH_SIZE,
+            ))
+    ocr = OCRResult.from_easyocr(results, max(resized.shape[:2]) / max(image.shape[:2]))
+    ocr.read_as = template.document_type.value
+    return ocr
@@ -0,0 +1,138 @@
+import math
+import threading
+
+# Process-local metrics in the Prometheus text format, kept dependency-free.
+# Counters and histograms are updated as events happen; values that other
+# components already track (cache, pool, job queue, ...) are read when
+# /metrics is scraped, through collector callbacks. With several API
+# processes every process reports its own series.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets) + (math.inf,)
+        # Per label set: bucket counts (non-cumulative), sum, count.
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        `collector()` returns (name, type, help, samples) tuples, where samples
+        is a list of (labels dict, value). Called on every scrape.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    label_names = tuple(labels)
+                    label_values = tuple(labels[n] for n in label_names)
+                    lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "bfsi_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "bfsi_http_request_duration_seconds", "HTTP request latency by route.", ("route",)))
+STAGE_LATENCY = registry.register(Histogram(
+    "bfsi_stage_duration_seconds", "Time spent per pipeline stage within a request.", ("stage",)))
+DOCUMENTS = registry.register(Counter(
+    "bfsi_documents_total", "Processed documents by detected type and outcome (parsed, unknown, error).",
+    ("document_type", "outcome")))
+DUPLICATES = registry.register(Counter(
+    "bfsi_duplicates_total", "Documents whose identity number was already on record.", ("document_type",)))
+OCR_RESULTS = registry.register(Counter(
+    "bfsi_ocr_results_total", "Documents by the adaptive OCR pass their result came from (cheap, heavy).",
+    ("tier",)))
+OCR_ESCALATIONS = registry.register(Counter(
+    "bfsi_ocr_escalations_total", "Documents re-read by the heavy OCR pass, by document type and reason.",
+    ("document_type", "reason")))
+CARD_CROPS = registry.register(Counter(
+    "bfsi_card_crops_total", "Images by whether OCR read a detected card (cropped) or the whole image (whole).",
+    ("outcome",)))
+CARD_PIXEL_RATIO = registry.register(Histogram(
+    "bfsi_card_pixel_ratio", "Pixels of the card crop OCR read, as a fraction of the photo's.",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5)))
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Heavy models are created here, lazily, and shared by everything in the
+# process: one OCR reader per language set and one spaCy pipeline, no
+# matter how many modules use them. Nothing is loaded at import time.
+
+PROCESS_STARTED_AT = time.monotonic()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._instances: dict[str, object] = {}
+        self._load_seconds: dict[str, float] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def get(self, name: str, loader):
+        """Returns the instance registered under `name`, creating it with `loader()` on first use."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._registry_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        # One lock per model, so that loading spaCy does not wait for EasyOCR.
+        with lock:
+            if name not in self._instances:
+                logger.info("Loading model %s", name)
+                started = time.perf_counter()
+                self._instances[name] = loader()
+                self._load_seconds[name] = time.perf_counter() - started
+                logger.info("Loaded model %s in %.2fs", name, self._load_seconds[name])
+        return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "models": {name: round(seconds, 3) for name, seconds in self._load_seconds.items()},
+            "rss_bytes": rss_bytes(),
+            "uss_bytes": memory_usage()["uss_bytes"],
+            "uptime_seconds": round(time.monotonic() - PROCESS_STARTED_AT, 3),
+        }
+
+
+registry = ModelRegistry()
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak RSS, which is what getrusage offers.
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_usage(pid: int | str = "self") -> dict:
+    """
+    RSS, PSS and USS of a process, in bytes. USS (its private pages) is what
+    the process costs on its own: pages shared copy-on-write with forked
+    siblings count fully towards each one's RSS, and are split between them
+    in PSS. PSS and USS need Linux 4.14+ and are None elsewhere.
+    """
+    try:
+        values = {}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+        return {
+            "rss_bytes": values["Rss"],
+            "pss_bytes": values["Pss"],
+            "uss_bytes": values["Private_Clean"] + values["Private_Dirty"],
+        }
+    except (OSError, KeyError, ValueError):
+        return {"rss_bytes": rss_bytes() if pid == "self" else None, "pss_bytes": None, "uss_bytes": None}
+
+
+def limit_threads(threads: int):
+    """
+    Caps the intra-op threads of torch and OpenCV in this process, so that
+    several processes on one node do not each start a thread per core.
+    """
+    import cv2
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+
+# --- Model accessors ---
+
+def _loaded_reader(engine: str):
+    for name, instance in list(registry._instances.items()):
+        if name.startswith(f"ocr:{engine}:"):
+            return instance
+    return None
+
+
+def get_ocr_reader(languages: tuple[str, ...] = ("en", "hi"), engine: str | None = None):
+    """The OCR reader for `languages`, built by the given engine (default: OCR_ENGINE)."""
+    from app.services.ocr_engines import get_engine
+    engine = get_engine(engine)
+
+    def _load():
+        if config.OCR_INTRA_OP_THREADS:
+            limit_threads(config.OCR_INTRA_OP_THREADS)
+        # All readers use the same CRAFT text detector; only the recogniser
+        # depends on the language set. Later readers reuse the first one's
+        # detector instead of loading another copy.
+        return engine.load_reader(languages, donor=_loaded_reader(engine.name))
+    return registry.get(f"ocr:{engine.name}:{','.join(languages)}", _load)
+
+
+def get_nlp(mode: str | None = None):
+    """The shared spaCy pipeline for the given NER mode (see app.services.ner)."""
+    from app.services.ner import load_nlp
+    mode = mode or config.NER_MODE
+
+    def _load():
+        try:
+            return load_nlp(config.SPACY_MODEL, mode)
+        except OSError:
+            if not config.SPACY_AUTO_DOWNLOAD:
+                raise
+            from spacy.cli import download
+            download(config.SPACY_MODEL)
+            return load_nlp(config.SPACY_MODEL, mode)
+    return registry.get(f"spacy:{config.SPACY_MODEL}:{mode}", _load)
+
+
+def warm_up() -> dict:
+    """Loads every model the pipeline needs, so the first request does not pay for it."""
+    get_ocr_reader(("en", "hi"))
+    if config.OCR_LANGUAGE_ROUTING:
+        get_ocr_reader(("en",))
+    if config.NER_MODE != "none":
+        get_nlp()
+    return registry.status()
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import cv2
+import numpy as np
+from pymongo.errors import DuplicateKeyError
+
+from app import config
+from app.database import fingerprint_collection
+from app.services.pipeline import PipelineOutput
+from app.services.preprocessing import decode_image
+from app.services.result_cache import PIPELINE_VERSION, from_entry, to_entry
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate uploads: the same card image recompressed, resized or
+# screenshotted. Their bytes differ, so the result cache misses them, but
+# their perceptual hashes are a few bits apart. An upload is fingerprinted
+# before OCR and, if an earlier upload's fingerprint is close enough, gets
+# that upload's stored result.
+#
+# A fingerprint is two pHashes of the decoded image, in grayscale and with
+# uniform bars (letterboxing, screenshot borders) trimmed off: the signs of
+# the lowest DCT frequencies relative to their median. KYC cards of one type
+# share their layout, which dominates coarse hashes: different PAN cards are
+# often within a few bits of each other in a 64-bit hash. So:
+#   - the 256-bit index hash finds candidates, through multi-index hashing;
+#   - the 1024-bit verification hash, which also captures the lines of text
+#     that differ between two people's cards, decides. It is stored in Mongo
+#     with the result and fetched only for candidates.
+
+INDEX_SIDE = 16
+VERIFY_SIDE = 32
+INDEX_WORDS = INDEX_SIDE * INDEX_SIDE // 64
+# Fingerprints are taken on a copy at most this large.
+FINGERPRINT_MAX_SIDE = 640
+# Border rows and columns spanning at most this many gray levels are bars.
+BAR_SPREAD = 6
+# Closest candidates whose verification hash is fetched, per lookup.
+MAX_VERIFIED = 20
+
+
+@dataclass
+class Fingerprint:
+    index_hash: bytes
+    verify_hash: bytes
+
+
+@dataclass
+class NearDuplicate:
+    digest: str
+    # Bits in which the verification hashes differ.
+    distance: int
+    output: PipelineOutput
+
+
+def _trim_bars(gray: np.ndarray) -> np.ndarray:
+    rows = np.flatnonzero(np.ptp(gray, axis=1) > BAR_SPREAD)
+    columns = np.flatnonzero(np.ptp(gray, axis=0) > BAR_SPREAD)
+    if len(rows) < 8 or len(columns) < 8:
+        return gray
+    return gray[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+
+
+def phash(gray: np.ndarray, side: int) -> bytes:
+    """The side x side lowest DCT frequencies of `gray`, thresholded at their median, packed."""
+    small = cv2.resize(gray, (4 * side, 4 * side), interpolation=cv2.INTER_AREA).astype(np.float32)
+    coefficients = cv2.dct(small)[:side, :side].ravel()
+    return np.packbits(coefficients > np.median(coefficients)).tobytes()
+
+
+def image_fingerprint(image: np.ndarray) -> Fingerprint:
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    gray = _trim_bars(gray)
+    return Fingerprint(phash(gray, INDEX_SIDE), phash(gray, VERIFY_SIDE))
+
+
+def compute_fingerprint(image_bytes: bytes) -> Fingerprint:
+    """Raises ImageDecodeError for bytes that are not an image."""
+    return image_fingerprint(decode_image(image_bytes, FINGERPRINT_MAX_SIDE))
+
+
+def hamming(a: bytes, b: bytes) -> int:
+    return int(np.bitwise_count(np.frombuffer(a, np.uint64) ^ np.frombuffer(b, np.uint64)).sum())
+
+
+@lru_cache(maxsize=None)
+def _probes(radius: int) -> np.ndarray:
+    """The 16-bit masks with at most `radius` bits set."""
+    masks = np.arange(2**16, dtype=np.uint16)
+    return masks[np.bitwise_count(masks) <= radius]
+
+
+class HashIndex:
+    """
+    Multi-index hashing of 256-bit hashes. Each hash is cut into 16 chunks
+    of 16 bits, with a table per chunk position. Two hashes at most r bits
+    apart differ in at most r // 16 bits in at least one chunk, so a lookup
+    probes every table with the query's chunk and its variants within that
+    radius, and computes the full distance only for the records found.
+
+    Tables are bucket offsets plus record ids sorted by chunk value. Recent
+    additions are scanned linearly until they are merged in. Buckets holding
+    more than `max_bucket` records (the chunks every card of a type shares)
+    are skipped. All access goes through a lock, as loads add records from a
+    worker thread while requests add and look up theirs.
+    """
+
+    CHUNKS = INDEX_WORDS * 4
+    # Recent additions are merged in once they exceed this, or 2% of the records.
+    MIN_MERGE = 10_000
+
+    def __init__(self, max_bucket: int, capacity: int = 1024):
+        self.max_bucket = max_bucket
+        self.size = 0
+        self.merged = 0
+        self.hashes = np.zeros((capacity, INDEX_WORDS), np.uint64)
+        # Raw SHA-256 digests, as bytes arrays would strip trailing zero bytes.
+        self.digests = np.zeros((capacity, 32), np.uint8)
+        self.offsets = np.zeros((self.CHUNKS, 2**16 + 1), np.int64)
+        self.tables = [np.empty(0, np.uint32) for _ in range(self.CHUNKS)]
+        self.skipped_buckets = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, count: int):
+        if self.size + count <= len(self.hashes):
+            return
+        capacity = max(self.size + count, 2 * len(self.hashes))
+        for attribute in ("hashes", "digests"):
+            old = getattr(self, attribute)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, attribute, new)
+
+    def add_many(self, hashes: list[bytes], digests: list[bytes], skip_known: bool = False) -> int:
+        """
+        Indexes hashes with their raw digests and returns how many were added.
+        With `skip_known`, records already indexed are skipped.
+        """
+        with self._lock:
+            if skip_known:
+                new = [i for i, (index_hash, digest) in enumerate(zip(hashes, digests))
+                       if not self._contains(index_hash, digest)]
+                hashes, digests = [hashes[i] for i in new], [digests[i] for i in new]
+            if not hashes:
+                return 0
+            self._reserve(len(hashes))
+            end = self.size + len(hashes)
+            self.hashes[self.size:end] = np.frombuffer(b"".join(hashes), np.uint64).reshape(-1, INDEX_WORDS)
+            self.digests[self.size:end] = np.frombuffer(b"".join(digests), np.uint8).reshape(-1, 32)
+            self.size = end
+            if self.size - self.merged > max(self.MIN_MERGE, self.size // 50):
+                self._merge()
+            return len(hashes)
+
+    def add(self, index_hash: bytes, digest: bytes):
+        self.add_many([index_hash], [digest])
+
+    def merge(self):
+        with self._lock:
+            self._merge()
+
+    def _merge(self):
+        chunks = self.hashes[:self.size].view(np.uint16)
+        for table in range(self.CHUNKS):
+            values = chunks[:, table]
+            # Stable sorts of 16-bit keys are radix sorts.
+            self.tables[table] = np.argsort(values, kind="stable").astype(np.uint32)
+            self.offsets[table, 1:] = np.cumsum(np.bincount(values, minlength=2**16))
+        self.merged = self.size
+
+    def find(self, index_hash: bytes, max_distance: int) -> list[tuple[bytes, int]]:
+        """(digest, distance) of the records within `max_distance` bits, closest first."""
+        with self._lock:
+            return self._find(index_hash, max_distance)
+
+    def _find(self, index_hash: bytes, max_distance: int) -> list[tuple[bytes, int]]:
+        query = np.frombuffer(index_hash, np.uint64)
+        probes = _probes(max_distance // self.CHUNKS)
+        found = [np.arange(self.merged, self.size, dtype=np.uint32)]
+        for table, chunk in enumerate(query.view(np.uint16)):
+            values = (probes ^ chunk).astype(np.int64)
+            starts, ends = self.offsets[table, values], self.offsets[table, values + 1]
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                if end - start > self.max_bucket:
+                    self.skipped_buckets += 1
+                elif end > start:
+                    found.append(self.tables[table][start:end])
+        ids = np.unique(np.concatenate(found))
+        distances = np.bitwise_count(self.hashes[ids] ^ query).sum(axis=1)
+        close = np.flatnonzero(distances <= max_distance)
+        close = close[np.argsort(distances[close], kind="stable")]
+        return [(self.digests[ids[i]].tobytes(), int(distances[i])) for i in close]
+
+    def _contains(self, index_hash: bytes, digest: bytes) -> bool:
+        return any(found == digest for found, _ in self._find(index_hash, 0))
+
+    @property
+    def nbytes(self) -> int:
+        return (self.hashes.nbytes + self.digests.nbytes + self.offsets.nbytes
+                + sum(table.nbytes for table in self.tables))
+
+
+class NearDuplicateIndex:
+    """
+    Fingerprints of processed uploads, with their results, in a Mongo
+    collection; their index hashes in memory. Only results of the current
+    PIPELINE_VERSION are loaded and returned.
+    """
+
+    def __init__(self, collection, max_distance: int, verify_distance: int, max_bucket: int):
+        self.collection = collection
+        self.max_distance = max_distance
+        self.verify_distance = verify_distance
+        self.index = HashIndex(max_bucket)
+        # The newest `created_at` loaded (see DedupIndex.warm_up).
+        self.loaded_until: datetime | None = None
+        self.ready = False
+        self.counters = {"lookups": 0, "candidates": 0, "rejected": 0, "hits": 0}
+
+    async def setup(self):
+        await self.collection.create_index("digest", unique=True)
+        await self.collection.create_index([("version", 1), ("created_at", 1)])
+
+    async def find(self, fingerprint: Fingerprint) -> NearDuplicate | None:
+        """The closest earlier upload that passes verification, if any."""
+        self.counters["lookups"] += 1
+        # Off the event loop: the lookup waits while a load holds the index.
+        candidates = await asyncio.to_thread(self.index.find, fingerprint.index_hash, self.max_distance)
+        candidates = candidates[:MAX_VERIFIED]
+        if not candidates:
+            return None
+        self.counters["candidates"] += len(candidates)
+        query = {"digest": {"$in": [digest.hex() for digest, _ in candidates]}, "version": PIPELINE_VERSION}
+        best = None
+        async for document in self.collection.find(query, {"digest": 1, "verify_hash": 1, "entry": 1}):
+            distance = hamming(document["verify_hash"], fingerprint.verify_hash)
+            if distance <= self.verify_distance and (best is None or distance < best.distance):
+                best = NearDuplicate(document["digest"], distance, from_entry(document["entry"]))
+        if best is None:
+            self.counters["rejected"] += 1
+            return None
+        self.counters["hits"] += 1
+        best.output.near_duplicate_of = best.digest
+        return best
+
+    async def add(self, digest: str, fingerprint: Fingerprint, output: PipelineOutput):
+        """Stores an upload's fingerprint and result. Failed results are not stored."""
+        if output.error is not None:
+            return
+        try:
+            await self.collection.insert_one({
+                "digest": digest,
+                "version": PIPELINE_VERSION,
+                "index_hash": fingerprint.index_hash,
+                "verify_hash": fingerprint.verify_hash,
+                "entry": to_entry(output),
+                "created_at": datetime.now(timezone.utc),
+            })
+        except DuplicateKeyError:
+            # Stored by another request or process already.
+            return
+        await asyncio.to_thread(self.index.add, fingerprint.index_hash, bytes.fromhex(digest))
+
+    async def load(self, skip_known: bool = False, chunk_size: int = 20_000) -> int:
+        """Adds the fingerprints stored since the last load. Indexing runs off the event loop."""
+        query = {"version": PIPELINE_VERSION}
+        if self.loaded_until is not None:
+            query["created_at"] = {"$gte": self.loaded_until - timedelta(seconds=config.INDEX_CATCH_UP_SECONDS)}
+        loaded = 0
+        hashes, digests = [], []
+        async for document in self.collection.find(query, {"digest": 1, "index_hash": 1, "created_at": 1}):
+            if self.loaded_until is None or document["created_at"] > self.loaded_until:
+                self.loaded_until = document["created_at"]
+            hashes.append(document["index_hash"])
+            digests.append(bytes.fromhex(document["digest"]))
+            if len(hashes) >= chunk_size:
+                loaded += await asyncio.to_thread(self.index.add_many, hashes, digests, skip_known)
+                hashes, digests = [], []
+        if hashes:
+            loaded += await asyncio.to_thread(self.index.add_many, hashes, digests, skip_known)
+        await asyncio.to_thread(self.index.merge)
+        return loaded
+
+    async def warm_up(self):
+        loaded = await self.load()
+        self.ready = True
+        logger.info("Near-duplicate index: loaded %d fingerprints", loaded)
+
+    async def refresh(self):
+        """Picks up fingerprints other processes stored."""
+        await self.load(skip_known=True)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "records": self.index.size,
+            "memory_bytes": self.index.nbytes,
+            "skipped_buckets": self.index.skipped_buckets,
+            **self.counters,
+        }
+
+
+near_duplicate_index = NearDuplicateIndex(
+    fingerprint_collection, config.NEAR_DUP_MAX_DISTANCE, config.NEAR_DUP_VERIFY_DISTANCE, config.NEAR_DUP_MAX_BUCKET,
+)
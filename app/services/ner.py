@@ -0,0 +1,51 @@
+from app import config
+from app.services import tracing
+
+# Person-name NER for the parsers. The parsers only ever look at PERSON
+# entities, so the spaCy pipeline is trimmed down to what the entity
+# recogniser needs. Modes:
+#   "full" - the complete pipeline (tagger, parser, lemmatizer, ...)
+#   "ner"  - only the entity recogniser and whatever it depends on
+#   "none" - no NER; parsers rely on their line heuristics alone
+NER_MODES = ("full", "ner", "none")
+
+# Components that the entity recogniser never reads from.
+_NON_NER_COMPONENTS = ["tagger", "morphologizer", "parser", "senter", "attribute_ruler", "lemmatizer"]
+
+
+def load_nlp(model: str, mode: str):
+    """Loads the spaCy pipeline for `mode`. Only used through the model registry."""
+    import spacy
+    if mode == "full":
+        return spacy.load(model)
+    nlp = spacy.load(model, exclude=_NON_NER_COMPONENTS)
+    # In the small English model NER embeds its own tok2vec; the shared one
+    # only fed the excluded tagger and parser.
+    if "tok2vec" in nlp.pipe_names and "ner" not in nlp.get_pipe("tok2vec").listening_components:
+        nlp.remove_pipe("tok2vec")
+    return nlp
+
+
+def _get_nlp(mode: str):
+    from app.services.model_registry import get_nlp
+    return get_nlp(mode)
+
+
+def _person_names(doc) -> list[str]:
+    return [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
+
+
+def find_person_names(text: str, mode: str = config.NER_MODE) -> list[str]:
+    if mode == "none":
+        return []
+    with tracing.stage("ner"):
+        return _person_names(_get_nlp(mode)(text))
+
+
+def find_person_names_batch(texts: list[str], mode: str = config.NER_MODE) -> list[list[str]]:
+    """Batched counterpart of `find_person_names`, using `nlp.pipe`."""
+    if mode == "none":
+        return [[] for _ in texts]
+    with tracing.stage("ner"):
+        nlp = _get_nlp(mode)
+        return [_person_names(doc) for doc in nlp.pipe(texts, batch_size=config.NER_BATCH_SIZE)]
@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+from importlib import metadata
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# OCR engines build the readers the OCR service runs. A reader has EasyOCR's
+# API (readtext, readtext_batched, detect, recognize): every engine keeps
+# EasyOCR's image handling, box merging and CTC decoding, and runs the same
+# CRAFT detector and recogniser weights. Engines differ in how those two
+# networks are executed:
+#
+#   easyocr        PyTorch. On CPU, EasyOCR quantizes the LSTM and linear
+#                  layers to int8 (dynamic quantization); the convolutions,
+#                  most of the detector's time, stay in float32.
+#   easyocr-fp32   PyTorch without that quantization, as a reference.
+#   onnx           The networks exported to ONNX from the loaded weights and
+#                  run with ONNX Runtime, which fuses and optimises the graph.
+#   onnx-int8      The exported graphs with their weights, convolutions
+#                  included, quantized to int8.
+#
+# Exported graphs are written to OCR_ONNX_DIR on first use and reused by
+# every later process. ONNX Runtime is only needed by the onnx engines.
+
+
+class OCREngine:
+    name = ""
+
+    def load_reader(self, languages: tuple[str, ...], donor=None):
+        """
+        A reader for `languages`. `donor` is a reader this engine loaded
+        before: all language sets use the same detector, which is shared
+        instead of loaded again.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _easyocr_reader(languages: tuple[str, ...], donor, quantize: bool):
+        import easyocr
+        reader = easyocr.Reader(list(languages), gpu=False, detector=donor is None, quantize=quantize)
+        if donor is not None:
+            # Set up by EasyOCR only when it loads a detector itself.
+            for attribute in ("detector", "detect_network", "get_textbox"):
+                setattr(reader, attribute, getattr(donor, attribute))
+        return reader
+
+
+class EasyOCREngine(OCREngine):
+    name = "easyocr"
+    quantize = True
+
+    def load_reader(self, languages: tuple[str, ...], donor=None):
+        return self._easyocr_reader(languages, donor, self.quantize)
+
+
+class FullPrecisionEngine(EasyOCREngine):
+    name = "easyocr-fp32"
+    quantize = False
+
+
+class _Session:
+    """Runs an exported network with ONNX Runtime, called like the torch module it came from."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        import onnxruntime
+        import torch
+        options = onnxruntime.SessionOptions()
+        # OCR_INTRA_OP_THREADS, or whatever torch was limited to in this process.
+        options.intra_op_num_threads = config.OCR_INTRA_OP_THREADS or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return onnxruntime.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+
+    def eval(self):
+        return self
+
+    def _run(self, image) -> list:
+        # Created on first use in each process: the session's thread pool
+        # does not survive a fork (python -m app.serve loads, then forks).
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._session, self._pid = self._load(), os.getpid()
+        inputs = {self._session.get_inputs()[0].name: image.detach().cpu().numpy()}
+        return self._session.run(None, inputs)
+
+
+class _Detector(_Session):
+    def __call__(self, image):
+        import torch
+        y, feature = self._run(image)
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+
+class _Recognizer(_Session):
+    def __call__(self, image, text=None):
+        import torch
+        return torch.from_numpy(self._run(image)[0])
+
+
+def _recognizer_graph(model):
+    """The recogniser with a single input; the CTC models ignore `text`."""
+    import torch
+
+    class Graph(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image):
+            return self.model(image, None)
+
+    return Graph().eval()
+
+
+class ONNXEngine(OCREngine):
+    name = "onnx"
+    quantize = False
+    OPSET = 17
+    # EasyOCR resizes every text box to this height for recognition.
+    RECOGNIZER_HEIGHT = 64
+
+    def _export(self, module, example, path: str, output_names: list[str], dynamic_axes: dict):
+        import torch
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Written under a temporary name, so that another process never loads half a file.
+        partial = f"{path}.{os.getpid()}.partial"
+        with torch.no_grad():
+            torch.onnx.export(module, example, partial, input_names=["image"], output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=self.OPSET)
+        if self.quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantized = f"{partial}.int8"
+            quantize_dynamic(partial, quantized, weight_type=QuantType.QInt8)
+            os.replace(quantized, partial)
+        os.replace(partial, path)
+
+    def _graph_path(self, network: str) -> str:
+        suffix = "-int8" if self.quantize else ""
+        return os.path.join(config.OCR_ONNX_DIR, f"{network}-easyocr{metadata.version('easyocr')}{suffix}.onnx")
+
+    def _detector(self, model):
+        import torch
+        path = self._graph_path("craft")
+        if not os.path.exists(path):
+            logger.info("Exporting the text detector to %s", path)
+            self._export(model, torch.zeros(1, 3, 640, 640), path, ["y", "feature"], {
+                "image": {0: "batch", 2: "height", 3: "width"},
+                "y": {0: "batch", 1: "y_height", 2: "y_width"},
+                "feature": {0: "batch", 2: "feature_height", 3: "feature_width"},
+            })
+        return _Detector(path)
+
+    def _recognizer(self, model, languages: tuple[str, ...]):
+        import torch
+        path = self._graph_path(f"recognizer-{'-'.join(languages)}")
+        if not os.path.exists(path):
+            logger.info("Exporting the %s recogniser to %s", "+".join(languages), path)
+            example = torch.zeros(1, 1, self.RECOGNIZER_HEIGHT, 256)
+            self._export(_recognizer_graph(model), example, path, ["preds"], {
+                "image": {0: "batch", 3: "width"},
+                "preds": {0: "batch", 1: "steps"},
+            })
+        return _Recognizer(path)
+
+    def load_reader(self, languages: tuple[str, ...], donor=None):
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            raise RuntimeError(f"OCR engine {self.name!r} needs ONNX Runtime: pip install onnxruntime")
+        # Exported from the float32 networks: quantized torch modules do not export.
+        reader = self._easyocr_reader(languages, donor, quantize=False)
+        if donor is None:
+            reader.detector = self._detector(reader.detector)
+        reader.recognizer = self._recognizer(reader.recognizer, languages)
+        return reader
+
+
+class QuantizedONNXEngine(ONNXEngine):
+    name = "onnx-int8"
+    quantize = True
+
+
+OCR_ENGINES = {engine.name: engine for engine in (
+    EasyOCREngine(), FullPrecisionEngine(), ONNXEngine(), QuantizedONNXEngine(),
+)}
+
+
+def get_engine(name: str | None = None) -> OCREngine:
+    name = name or config.OCR_ENGINE
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR engine {name!r}; expected one of {', '.join(OCR_ENGINES)}.")
+    return OCR_ENGINES[name]
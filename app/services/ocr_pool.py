@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app import config
+
+
+class OCRPoolBusy(Exception):
+    """Raised when the admission queue is full and the request is rejected."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("OCR workers are busy, please retry later.")
+        self.retry_after = retry_after
+
+
+class OCRPoolTimeout(Exception):
+    """Raised when a unit of work does not finish within its time budget."""
+
+
+class OCRPoolUnavailable(Exception):
+    """Raised when a worker process died while handling a request."""
+
+
+def _init_worker():
+    # Each worker process loads its own models once, up front,
+    # instead of paying the cost on its first request.
+    from app.services import model_registry
+    model_registry.warm_up()
+
+
+def _warm_worker() -> dict:
+    from app.services import model_registry
+    return model_registry.warm_up()
+
+
+class OCRWorkerPool:
+    """
+    Runs blocking OCR/parsing work off the event loop.
+
+    Admission is bounded: at most `workers + queue_size` units of work may be
+    running or waiting at once. Anything beyond that is rejected immediately
+    with `OCRPoolBusy`, so overload turns into fast 429s instead of an
+    ever-growing backlog.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float,
+                 retry_after: int, executor_kind: str = "process",
+                 start_method: str = "spawn"):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.executor_kind = executor_kind
+        self.start_method = start_method
+        self._executor: Executor | None = None
+        self._pending = 0
+        self.warmed = False
+        self.worker_status: list[dict] = []
+
+    @classmethod
+    def from_config(cls) -> "OCRWorkerPool":
+        return cls(
+            workers=config.OCR_WORKERS,
+            queue_size=config.OCR_QUEUE_SIZE,
+            timeout=config.OCR_TIMEOUT_SECONDS,
+            retry_after=config.OCR_RETRY_AFTER_SECONDS,
+            executor_kind=config.OCR_EXECUTOR,
+            start_method=config.OCR_START_METHOD,
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.executor_kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+            )
+        elif self.executor_kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="ocr"
+            )
+        else:
+            raise ValueError(f"Unknown OCR executor kind: {self.executor_kind}")
+
+    async def warm_up(self) -> list[dict]:
+        """
+        Makes every worker load its models and returns their status reports.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        # Submitting one task per worker at once makes the executor start all of them.
+        statuses = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _warm_worker) for _ in range(self.workers)
+        ])
+        # In thread mode every task reports the same process; keep one entry per pid.
+        self.worker_status = list({status["pid"]: status for status in statuses}.values())
+        self.warmed = True
+        return self.worker_status
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def _release(self, _future):
+        self._pending -= 1
+
+    async def run(self, fn, *args, timeout: float | None = None):
+        """
+        Submits `fn(*args)` to the pool and waits for its result.
+        """
+        if self._pending >= self.max_pending:
+            raise OCRPoolBusy(self.retry_after)
+        self.start()
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        future = loop.run_in_executor(self._executor, fn, *args)
+        # The slot is only freed once the worker is actually done. A request
+        # that timed out still occupies its worker, and admission must see that.
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise OCRPoolTimeout(f"OCR did not finish within {timeout or self.timeout}s.")
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed). Replace the pool so later
+            # requests are not affected.
+            self.shutdown(wait=False)
+            raise OCRPoolUnavailable("An OCR worker crashed while processing the request.")
+
+
+ocr_pool = OCRWorkerPool.from_config()
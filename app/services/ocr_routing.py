@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app import config
+from app.services import tracing
+from app.services.document_classifier import classify_document, DocumentType
+from app.services.ocr_service import (
+    OCRResult, read_ocr, read_ocr_batch, FULL_LANGUAGES, ENGLISH_ONLY,
+)
+from app.services.layout_templates import LAYOUT_TEMPLATES, read_template
+
+# Two-stage OCR. A cheap English-only pass on a downscaled copy of the image
+# is enough for `classify_document` to tell the card type. The full pass then
+# runs with only the languages and resolution that type needs: PAN cards are
+# English-only, while Aadhaar and Voter ID cards carry Devanagari text.
+# Types with a layout template only have their field regions recognised.
+
+
+@dataclass(frozen=True)
+class OCRProfile:
+    languages: tuple[str, ...]
+    # Longest image side for recognition; 0 keeps the preprocessed resolution.
+    max_side: int = 0
+
+
+OCR_PROFILES = {
+    DocumentType.PAN_CARD: OCRProfile(ENGLISH_ONLY, config.OCR_PAN_MAX_SIDE),
+    DocumentType.AADHAAR_CARD: OCRProfile(FULL_LANGUAGES, config.OCR_AADHAAR_MAX_SIDE),
+    DocumentType.VOTER_ID_CARD: OCRProfile(FULL_LANGUAGES, config.OCR_VOTER_ID_MAX_SIDE),
+    # When the pre-pass cannot tell, fall back to the original full-cost OCR.
+    DocumentType.UNKNOWN: OCRProfile(FULL_LANGUAGES, 0),
+}
+
+
+def _prepass_covers(image: np.ndarray, profile: OCRProfile) -> bool:
+    """True when the pre-pass already read the image the way the full pass would."""
+    return (
+        profile.languages == ENGLISH_ONLY
+        and max(image.shape[:2]) <= config.OCR_PREPASS_MAX_SIDE
+    )
+
+
+def _template_for(doc_type: DocumentType):
+    return LAYOUT_TEMPLATES.get(doc_type) if config.OCR_LAYOUT_TEMPLATES else None
+
+
+def read_routed_ocr(image: np.ndarray) -> OCRResult:
+    """
+    OCRs a preprocessed image using the profile of its (pre-classified) document type.
+    """
+    if not config.OCR_LANGUAGE_ROUTING:
+        with tracing.stage("ocr"):
+            return read_ocr(image)
+
+    with tracing.stage("ocr_prepass"):
+        preview = read_ocr(image, ENGLISH_ONLY, config.OCR_PREPASS_MAX_SIDE)
+        doc_type = classify_document(preview.text)
+        profile = OCR_PROFILES[doc_type]
+    if _prepass_covers(image, profile):
+        return preview
+    with tracing.stage("ocr"):
+        template = _template_for(doc_type)
+        if template is not None:
+            return read_template(image, template, profile.languages, profile.max_side)
+        return read_ocr(image, profile.languages, profile.max_side)
+
+
+def read_routed_ocr_batch(images: list[np.ndarray]) -> list[OCRResult]:
+    """
+    Batched counterpart of `read_routed_ocr`: one batched pre-pass for all
+    images, then one batched full pass per profile. Templated types are read
+    one image at a time, since detection and recognition run separately.
+    """
+    if not config.OCR_LANGUAGE_ROUTING:
+        with tracing.stage("ocr"):
+            return read_ocr_batch(images)
+
+    with tracing.stage("ocr_prepass"):
+        previews = read_ocr_batch(images, ENGLISH_ONLY, config.OCR_PREPASS_MAX_SIDE)
+        texts = list(previews)
+        by_profile: dict[OCRProfile, list[int]] = {}
+        templated: list[tuple[int, DocumentType]] = []
+        for index, (image, preview) in enumerate(zip(images, previews)):
+            doc_type = classify_document(preview.text)
+            profile = OCR_PROFILES[doc_type]
+            if _prepass_covers(image, profile):
+                continue
+            if _template_for(doc_type) is not None:
+                templated.append((index, doc_type))
+            else:
+                by_profile.setdefault(profile, []).append(index)
+
+    with tracing.stage("ocr"):
+        for index, doc_type in templated:
+            profile = OCR_PROFILES[doc_type]
+            texts[index] = read_template(images[index], _template_for(doc_type), profile.languages, profile.max_side)
+        for profile, indices in by_profile.items():
+            full_texts = read_ocr_batch([images[i] for i in indices], profile.languages, profile.max_side)
+            for index, text in zip(indices, full_texts):
+                texts[index] = text
+    return texts
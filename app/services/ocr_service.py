@@ -1,58 +1,144 @@
-import easyocr
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
+from app import config
+from app.services.model_registry import get_ocr_reader
+from app.services.ocr_types import OCRLine, OCRResult
+from app.services.preprocessing import (
+    DEFAULT_CONFIG, PreprocessConfig, estimate_skew, limit_size, preprocess_image, rotate_image,
+)
 
-# --- Load the EasyOCR reader into memory ---
+# --- The OCR readers ---
 # We specify English ('en') and Hindi ('hi')
 # This will download the models the first time it's run.
-print("Loading EasyOCR models into memory...")
-reader = easyocr.Reader(['en', 'hi'], gpu=False) # Set gpu=True if you have a compatible GPU
-print("EasyOCR models loaded successfully.")
+# Readers are owned by the model registry and created on first use, so that
+# the API process does not hold a copy when OCR runs in worker processes.
+# The OCR engine (OCR_ENGINE, see ocr_engines) decides how their networks
+# run; every reader offers EasyOCR's API.
+FULL_LANGUAGES = ("en", "hi")
+ENGLISH_ONLY = ("en",)
 
+def load_reader(languages: tuple[str, ...] = FULL_LANGUAGES, engine: str | None = None):
+    return get_ocr_reader(languages, engine)
 
-# We can keep our advanced preprocessing as it helps all OCR engines
-from skimage.transform import rotate
-from skimage.color import rgb2gray
-from skimage.feature import canny
-from scipy.ndimage import sobel
 
+# EasyOCR settings for the escalation pass: more contrast adjustment and
+# lower detection thresholds find faint or small print the defaults miss,
+# and magnifying the image helps recognition, at several times the cost.
+HEAVY_READ_PARAMS = {
+    "contrast_ths": 0.2,
+    "adjust_contrast": 0.7,
+    "text_threshold": 0.6,
+    "low_text": 0.3,
+    "mag_ratio": 1.5,
+}
+
+
+def _scale(original: np.ndarray, resized: np.ndarray) -> float:
+    return max(resized.shape[:2]) / max(original.shape[:2])
+
+
+# We can keep our advanced preprocessing as it helps all OCR engines.
+# The stages themselves live in the preprocessing module.
 def deskew_image(image: np.ndarray) -> np.ndarray:
-    # This function remains unchanged.
-    grayscale = rgb2gray(image)
-    edges = canny(grayscale, sigma=3.0)
-    sobel_filtered = sobel(edges)
-    coords = np.column_stack(np.where(sobel_filtered > 0))
-    if coords.shape[0] <= 1:
+    angle = estimate_skew(image, DEFAULT_CONFIG.skew_max_side)
+    if abs(angle) < DEFAULT_CONFIG.min_skew_angle:
         return image
-    mean = np.mean(coords, axis=0)
-    coords_centered = coords - mean
-    cov = np.cov(coords_centered, rowvar=False)
-    eigenvalues, eigenvectors = np.linalg.eigh(cov)
-    vec = eigenvectors[:, -1]
-    angle = np.degrees(np.arctan2(vec[1], vec[0]))
-    if abs(angle) > 45:
-        angle = (90 - abs(angle)) * np.sign(angle)
-    return rotate(image, angle, resize=True, mode='constant', cval=1, preserve_range=True).astype(np.uint8)
+    return rotate_image(image, angle)
 
 def preprocess_for_easyocr(image_bytes: bytes):
     # Preprocessing for EasyOCR is simpler; it handles a lot internally.
-    # We'll just do deskewing and read the image.
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    deskewed_img = deskew_image(img)
-    return deskewed_img
+    # We'll just decode (at a capped resolution) and deskew the image.
+    return preprocess_image(image_bytes).image
 
-def extract_text(image_bytes: bytes) -> str:
+def read_ocr(image: np.ndarray, languages: tuple[str, ...] = FULL_LANGUAGES, max_side: int = 0,
+             **params) -> OCRResult:
     """
-    Takes image bytes, preprocesses, and extracts text using EasyOCR.
+    Runs EasyOCR with the given languages on an already preprocessed image.
+    `max_side` caps the resolution recognition runs at (0 keeps it as is);
+    `params` are passed on to `readtext`.
     """
-    processed_image = preprocess_for_easyocr(image_bytes)
-    
+    resized = limit_size(image, max_side) if max_side else image
+
     # EasyOCR returns a list of (bounding_box, text, confidence)
-    results = reader.readtext(processed_image)
-    
+    results = load_reader(languages).readtext(resized, batch_size=config.OCR_BATCH_SIZE, **params)
+    return OCRResult.from_easyocr(results, _scale(image, resized))
+
+def read_text(image: np.ndarray, languages: tuple[str, ...] = FULL_LANGUAGES, max_side: int = 0) -> str:
     # We'll combine the extracted text into a single string
-    raw_text = "\n".join([res[1] for res in results])
-    
-    return raw_text
+    return read_ocr(image, languages, max_side).text
+
+def extract_text(image_bytes: bytes) -> str:
+    """
+    Takes image bytes, preprocesses, and extracts text with the configured OCR engine.
+    """
+    processed_image = preprocess_for_easyocr(image_bytes)
+    return read_text(processed_image)
 
+
+def _fit_to_canvas(image: np.ndarray, canvas_height: int, canvas_width: int) -> np.ndarray:
+    """Pads an image with white borders so it fills the canvas exactly."""
+    height, width = image.shape[:2]
+    return cv2.copyMakeBorder(
+        image, 0, canvas_height - height, 0, canvas_width - width,
+        cv2.BORDER_CONSTANT, value=(255, 255, 255)
+    )
+
+def _safe_preprocess(image_bytes: bytes, settings: PreprocessConfig = DEFAULT_CONFIG) -> np.ndarray | None:
+    try:
+        return preprocess_image(image_bytes, settings).image
+    except Exception:
+        # Undecodable or corrupt uploads fail on their own, not the whole batch.
+        return None
+
+def preprocess_many(images: list[bytes], settings: PreprocessConfig = DEFAULT_CONFIG) -> list[np.ndarray | None]:
+    """Decodes and deskews images in parallel. Failed images come back as None."""
+    with ThreadPoolExecutor(max_workers=config.OCR_BATCH_PREPROCESS_THREADS) as executor:
+        return list(executor.map(lambda image_bytes: _safe_preprocess(image_bytes, settings), images))
+
+def read_ocr_batch(images: list[np.ndarray], languages: tuple[str, ...] = FULL_LANGUAGES,
+                   max_side: int = 0, batch_size: int = config.OCR_BATCH_SIZE) -> list[OCRResult]:
+    """
+    Batched counterpart of `read_ocr`: the images are recognised together with
+    `readtext_batched`, so the detector and recogniser run on batches instead of
+    one image at a time.
+    """
+    max_side = min(max_side or config.OCR_BATCH_CANVAS_SIDE, config.OCR_BATCH_CANVAS_SIDE)
+    originals = images
+    images = [limit_size(image, max_side) for image in images]
+
+    texts = [OCRResult() for _ in images]
+    # readtext_batched needs equally sized inputs. Landscape and portrait images
+    # are grouped separately and letterboxed onto a shared canvas, which keeps
+    # the aspect ratio intact and the padding small.
+    groups: dict[bool, list[int]] = {}
+    for index, image in enumerate(images):
+        groups.setdefault(image.shape[0] > image.shape[1], []).append(index)
+
+    for indices in groups.values():
+        canvas_height = max(images[i].shape[0] for i in indices)
+        canvas_width = max(images[i].shape[1] for i in indices)
+        canvas = [_fit_to_canvas(images[i], canvas_height, canvas_width) for i in indices]
+        batch_results = load_reader(languages).readtext_batched(canvas, batch_size=batch_size)
+        for index, results in zip(indices, batch_results):
+            # Padding is added right and below only, so boxes just need rescaling.
+            texts[index] = OCRResult.from_easyocr(results, _scale(originals[index], images[index]))
+
+    return texts
+
+def read_text_batch(images: list[np.ndarray], languages: tuple[str, ...] = FULL_LANGUAGES,
+                    max_side: int = 0, batch_size: int = config.OCR_BATCH_SIZE) -> list[str]:
+    return [result.text for result in read_ocr_batch(images, languages, max_side, batch_size)]
+
+def extract_text_batch(images: list[bytes], batch_size: int = config.OCR_BATCH_SIZE) -> list[str | None]:
+    """
+    Batched counterpart of `extract_text`. Returns one text per input, or None
+    where the image could not be decoded.
+    """
+    processed = preprocess_many(images)
+    decoded = [i for i, image in enumerate(processed) if image is not None]
+    texts: list[str | None] = [None] * len(images)
+    batch_texts = read_text_batch([processed[i] for i in decoded], batch_size=batch_size)
+    for index, text in zip(decoded, batch_texts):
+        texts[index] = text
+    return texts
@@ -0,0 +1,45 @@
+from dataclasses import dataclass, field
+
+# What OCR produced, kept free of OpenCV and EasyOCR imports so that the
+# field engine and the parsers can be used without them.
+
+
+@dataclass
+class OCRLine:
+    text: str
+    confidence: float
+    # Corner points (x, y), in the coordinates of the image that was passed in.
+    box: tuple[tuple[float, float], ...] = ()
+
+
+@dataclass
+class OCRResult:
+    """What EasyOCR read: every text box with its position and confidence."""
+    lines: list[OCRLine] = field(default_factory=list)
+    # The document type (its value) whose layout template restricted
+    # recognition. Such text lacks the headers classification relies on.
+    read_as: str | None = None
+
+    @property
+    def text(self) -> str:
+        return "\n".join(line.text for line in self.lines)
+
+    @property
+    def mean_confidence(self) -> float:
+        # Weighted by length, so a confident name outweighs a shaky one-letter box.
+        characters = sum(len(line.text) for line in self.lines)
+        if not characters:
+            return 0.0
+        return sum(line.confidence * len(line.text) for line in self.lines) / characters
+
+    @classmethod
+    def from_easyocr(cls, results, scale: float = 1.0) -> "OCRResult":
+        """`scale` is the factor the image was resized by before OCR; boxes are mapped back."""
+        return cls([
+            OCRLine(
+                text=text,
+                confidence=float(confidence),
+                box=tuple((float(x) / scale, float(y) / scale) for x, y in box),
+            )
+            for box, text, confidence in results
+        ])
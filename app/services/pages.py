@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+
+from app import config
+from app.services.preprocessing import limit_size
+
+# Multi-page documents (PDF, multi-frame TIFF) read from a file on disk, one
+# page at a time. Pages are only rasterized when asked for, inside the worker
+# that processes them, so neither the upload nor all of its pages ever sit in
+# memory at once. PDF support needs PyMuPDF (`pip install pymupdf`); TIFF
+# and single images are read with PIL and OpenCV.
+
+PDF = "pdf"
+TIFF = "tiff"
+IMAGE = "image"
+
+
+class PageError(ValueError):
+    """Raised when a document or one of its pages cannot be read."""
+
+
+def detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(b"%PDF"):
+        return PDF
+    if head[:4] in (b"II*\x00", b"MM\x00*", b"II+\x00", b"MM\x00+"):
+        return TIFF
+    return IMAGE
+
+
+def _open_pdf(path: str):
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            # Module name of PyMuPDF releases before 1.24
+            import fitz as pymupdf
+        except ImportError:
+            raise PageError("PDF support is not installed on the server (PyMuPDF).")
+    try:
+        return pymupdf.open(path)
+    except Exception as e:
+        raise PageError(f"Could not open PDF: {e}")
+
+
+def _open_tiff(path: str):
+    from PIL import Image
+    try:
+        return Image.open(path)
+    except Exception as e:
+        raise PageError(f"Could not open TIFF: {e}")
+
+
+def count_pages(path: str) -> int:
+    kind = detect_format(path)
+    if kind == PDF:
+        with _open_pdf(path) as document:
+            return document.page_count
+    if kind == TIFF:
+        with _open_tiff(path) as image:
+            return getattr(image, "n_frames", 1)
+    return 1
+
+
+def _render_pdf_page(path: str, index: int, dpi: int, max_side: int) -> np.ndarray:
+    with _open_pdf(path) as document:
+        page = document.load_page(index)
+        # PDF coordinates are in points (1/72 inch). Lower the DPI rather than
+        # render pixels that would be scaled away again.
+        longest_points = max(page.rect.width, page.rect.height)
+        if max_side and longest_points * dpi / 72 > max_side:
+            dpi = max(1, int(max_side * 72 / longest_points))
+        pixmap = page.get_pixmap(dpi=dpi, alpha=False)
+        pixels = np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+        if pixmap.n == 1:
+            return cv2.cvtColor(pixels, cv2.COLOR_GRAY2BGR)
+        return cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+
+
+def _render_tiff_page(path: str, index: int, max_side: int) -> np.ndarray:
+    with _open_tiff(path) as image:
+        try:
+            image.seek(index)
+        except EOFError:
+            raise PageError(f"TIFF has no page {index + 1}.")
+        if max_side:
+            # Downscale in PIL before converting, so the full-size RGB copy is never made.
+            image.thumbnail((max_side, max_side))
+        pixels = np.asarray(image.convert("RGB"))
+    return cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+
+
+def render_page(path: str, index: int, dpi: int = config.PAGES_DPI,
+                max_side: int = config.PREPROCESS_MAX_SIDE) -> np.ndarray:
+    """Rasterizes page `index` (0-based) as a uint8 BGR image no larger than `max_side`."""
+    kind = detect_format(path)
+    if kind == PDF:
+        return _render_pdf_page(path, index, dpi, max_side)
+    if kind == TIFF:
+        return _render_tiff_page(path, index, max_side)
+    if index != 0:
+        raise PageError(f"Image has no page {index + 1}.")
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise PageError("Could not decode image.")
+    return limit_size(image, max_side)
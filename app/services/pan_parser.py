@@ -1,14 +1,7 @@
 import re
-import spacy
 from app.models import PANCardDetails
-
-# Load the spaCy model
-try:
-    NLP = spacy.load("en_core_web_sm")
-except OSError:
-    from spacy.cli import download
-    download("en_core_web_sm")
-    NLP = spacy.load("en_core_web_sm")
+from app.services.ner import find_person_names
+from app.services.field_engine import Analysis, analyze
 
 ## REFINE 1: Define a clear list of header keywords to exclude from name candidates.
 EXCLUDE_KEYWORDS = {
@@ -16,31 +9,13 @@ EXCLUDE_KEYWORDS = {
     'PERMANENT', 'ACCOUNT', 'NUMBER', 'NAME', 'FATHER'
 }
 
+_WHITESPACE = re.compile(r'\s+')
+
 def _clean_text(text: str) -> str:
     """Removes unwanted characters and extra whitespace."""
-    return re.sub(r'\s+', ' ', text).strip()
-
-def _extract_pan_number(text: str) -> str | None:
-    """Finds the PAN number using a more forgiving regex."""
-    ## REFINE 2: Use a less strict regex that finds 10-character alphanumeric strings,
-    # as PAN numbers are often the only string of this format on the card.
-    pan_regex = r'\b[A-Z0-9]{10}\b'
-    matches = re.findall(pan_regex, text)
-    for match in matches:
-        # Validate the structure: 5 letters, 4 numbers, 1 letter.
-        if re.match(r'[A-Z]{5}[0-9]{4}[A-Z]', match):
-            return match
-    return None
+    return _WHITESPACE.sub(' ', text).strip()
 
-def _extract_dob(text: str) -> str | None:
-    """Finds the Date of Birth using a standard regex."""
-    dob_regex = r'\d{2}/\d{2}/\d{4}'
-    match = re.search(dob_regex, text)
-    if match:
-        return match.group(0)
-    return None
-
-def _extract_name(doc: spacy.tokens.doc.Doc, raw_text: str) -> str | None:
+def _extract_name(person_names: list[str], lines: list[str]) -> str | None:
     """
     Extracts the most likely name by collecting all possible candidates from NER and
     heuristics, filtering them, and choosing the best one.
@@ -48,12 +23,9 @@ def _extract_name(doc: spacy.tokens.doc.Doc, raw_text: str) -> str | None:
     candidate_names = []
     
     # --- Stage 1: Collect candidates from NER ---
-    for ent in doc.ents:
-        if ent.label_ == "PERSON":
-            candidate_names.append(ent.text)
+    candidate_names.extend(person_names)
 
     # --- Stage 2: Collect candidates from heuristics ---
-    lines = raw_text.split('\n')
     for line in lines:
         cleaned_line = _clean_text(line)
         # Heuristic: A name is often all uppercase, has 2-5 words, and no digits.
@@ -76,21 +48,23 @@ def _extract_name(doc: spacy.tokens.doc.Doc, raw_text: str) -> str | None:
 
 
 # --- Main Parsing Function ---
-def parse_pan_details(raw_text: str) -> PANCardDetails:
+def parse_pan_details(raw_text: str, person_names: list[str] | None = None,
+                      analysis: Analysis | None = None) -> PANCardDetails:
     """
     The main orchestrator function to parse PAN card details using a robust strategy.
+    `person_names` can carry PERSON entities found by a batched NER run, and
+    `analysis` the field-engine result if the text was already analysed.
     """
-    text_upper = raw_text.upper()
-    doc = NLP(raw_text)
-
-    pan_number = _extract_pan_number(text_upper)
-    dob = _extract_dob(text_upper)
-    name = _extract_name(doc, raw_text)
+    analysis = analysis or analyze(raw_text)
+    if person_names is None:
+        person_names = find_person_names(raw_text)
 
+    ## REFINE 2: The PAN number is any 10-character token shaped like a PAN,
+    # as PAN numbers are often the only string of this format on the card.
     return PANCardDetails(
-        pan_number=pan_number,
-        date_of_birth=dob,
-        name=name
+        pan_number=analysis.fields["pan_number"],
+        date_of_birth=analysis.fields["pan_date_of_birth"],
+        name=_extract_name(person_names, analysis.text.lines)
     )
 
 
@@ -0,0 +1,348 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+from pydantic import BaseModel
+
+from app.models import PANCardDetails, AadhaarCardDetails, VoterIDCardDetails
+from app import config
+from app.services.ocr_service import (
+    HEAVY_READ_PARAMS, OCRResult, preprocess_for_easyocr, preprocess_many, read_ocr, read_text,
+)
+from app.services.preprocessing import (
+    DEFAULT_CONFIG, ImageDecodeError, PreprocessConfig, preprocess_decoded, preprocess_image,
+)
+from app.services.pages import PageError, render_page
+from app.services.card_detection import CardLocation, card_width, find_cards, locate, warp_card
+from app.services.ocr_routing import read_routed_ocr, read_routed_ocr_batch, OCR_PROFILES
+from app.services.document_classifier import DocumentType
+from app.services.field_engine import Analysis, analyze
+from app.services.pan_parser import parse_pan_details
+from app.services.aadhaar_parser import parse_aadhaar_details
+from app.services.voter_id_parser import parse_voter_id_details
+from app.services.ner import find_person_names_batch
+from app.services import tracing
+from app.services.profiler import profile_if_slow
+
+# The data model produced for each document type.
+DATA_MODELS = {
+    DocumentType.PAN_CARD: PANCardDetails,
+    DocumentType.AADHAAR_CARD: AadhaarCardDetails,
+    DocumentType.VOTER_ID_CARD: VoterIDCardDetails,
+}
+
+NER_DOCUMENT_TYPES = (DocumentType.PAN_CARD, DocumentType.AADHAAR_CARD)
+
+# The field without which a result of each type is not worth much.
+KEY_FIELDS = {
+    DocumentType.PAN_CARD: "pan_number",
+    DocumentType.AADHAAR_CARD: "aadhaar_number",
+    DocumentType.VOTER_ID_CARD: "voter_id",
+}
+
+# Adaptive OCR: the cheap pass reads a downscaled copy without deskewing;
+# only unsure results are read again at full resolution (see `_escalation_reason`).
+CHEAP_PREPROCESS = PreprocessConfig(max_side=config.OCR_CHEAP_MAX_SIDE, deskew=False)
+# With card detection, photos are decoded at full size for the crops; a photo
+# without a card is downscaled (and deskewed) from there as before.
+CARD_DECODE = PreprocessConfig(deskew=False)
+
+# These functions are the units of work submitted to the OCR worker pool.
+# They must stay at module level (and return picklable values) so that
+# they can be shipped to worker processes.
+
+
+@dataclass
+class PipelineOutput:
+    raw_text: str
+    document_type: DocumentType
+    data: Optional[BaseModel] = None
+    error: Optional[str] = None
+    # Seconds per pipeline stage, measured in the process that ran it. For a
+    # batch, every output carries the timings of the whole batch.
+    timings: dict[str, float] = field(default_factory=dict)
+    ocr: Optional[OCRResult] = None
+    # Which adaptive OCR pass produced the result ("cheap" or "heavy"), and
+    # why the cheap one was not good enough. None with adaptive OCR off.
+    ocr_tier: Optional[str] = None
+    escalation: Optional[str] = None
+    # Where the card that was read lies in the photo; None if the whole image was read.
+    card: Optional[CardLocation] = None
+    # Digest of the earlier upload whose result this is, if it was reused for a near-duplicate image.
+    near_duplicate_of: Optional[str] = None
+
+
+def _parse(analysis: Analysis, person_names: list[str] | None = None) -> PipelineOutput:
+    raw_text = analysis.text.raw
+    doc_type = analysis.document_type if raw_text.strip() else DocumentType.UNKNOWN
+    with tracing.stage("parse"):
+        if doc_type == DocumentType.PAN_CARD:
+            data = parse_pan_details(raw_text, person_names, analysis)
+        elif doc_type == DocumentType.AADHAAR_CARD:
+            data = parse_aadhaar_details(raw_text, person_names, analysis)
+        elif doc_type == DocumentType.VOTER_ID_CARD:
+            data = parse_voter_id_details(raw_text, analysis)
+        else:
+            data = None
+    return PipelineOutput(raw_text=raw_text, document_type=doc_type, data=data, ocr=analysis.ocr)
+
+
+def _has_key_field(output: PipelineOutput) -> bool:
+    key = KEY_FIELDS.get(output.document_type)
+    return key is not None and output.data is not None and getattr(output.data, key) is not None
+
+
+def _escalation_reason(output: PipelineOutput) -> str | None:
+    """Why a cheap-pass result should be read again, or None if it is good enough."""
+    if output.document_type == DocumentType.UNKNOWN:
+        return "unclassified"
+    if not _has_key_field(output):
+        return "missing_key_field"
+    if output.ocr is not None and output.ocr.mean_confidence < config.OCR_ESCALATE_CONFIDENCE:
+        return "low_confidence"
+    return None
+
+
+def _read_heavy(image, doc_type: DocumentType) -> PipelineOutput:
+    """The escalation pass: full resolution, every language the type needs, tuned EasyOCR."""
+    profile = OCR_PROFILES[doc_type if config.OCR_LANGUAGE_ROUTING else DocumentType.UNKNOWN]
+    with tracing.stage("ocr_heavy"):
+        ocr = read_ocr(image, profile.languages, **HEAVY_READ_PARAMS)
+    with tracing.stage("classify"):
+        analysis = analyze(ocr.text, ocr)
+    return _parse(analysis)
+
+
+def _escalate(cheap: PipelineOutput, load_full_image) -> PipelineOutput:
+    """
+    Re-reads an unsure cheap-pass result with the heavy pass if needed.
+    `load_full_image()` returns the deskewed full-resolution image.
+    """
+    reason = _escalation_reason(cheap)
+    if reason is None:
+        cheap.ocr_tier = "cheap"
+        return cheap
+    with tracing.stage("preprocess"):
+        image = load_full_image()
+    heavy = _read_heavy(image, cheap.document_type)
+    # Keep the cheap result if only it found the key number.
+    output = cheap if _has_key_field(cheap) and not _has_key_field(heavy) else heavy
+    output.ocr_tier = "heavy" if output is heavy else "cheap"
+    output.escalation = reason
+    return output
+
+
+def process_document(image_bytes: bytes) -> PipelineOutput:
+    """
+    Runs the full OCR -> classification -> parsing chain for one image.
+    """
+    with tracing.collect() as timings, profile_if_slow("process_document"):
+        output = _read_upload(image_bytes, max_cards=1)[0]
+    output.timings = timings
+    return output
+
+
+def process_cards(image_bytes: bytes) -> list[PipelineOutput]:
+    """
+    Runs the pipeline on every card found in a photo, largest first, with
+    one output per card. A photo without a detectable card gives a single
+    output for the whole image.
+    """
+    with tracing.collect() as timings, profile_if_slow("process_cards"):
+        outputs = _read_upload(image_bytes, config.CARD_MAX_CARDS)
+    for output in outputs:
+        output.timings = timings
+    return outputs
+
+
+def process_page(path: str, page_index: int) -> PipelineOutput:
+    """
+    Runs the pipeline on one page of a PDF, TIFF or image file on disk. The
+    page is rasterized here, in the worker, so only the path crosses processes.
+    """
+    with tracing.collect() as timings, profile_if_slow("process_page"):
+        try:
+            with tracing.stage("rasterize"):
+                page = render_page(path, page_index)
+        except PageError as e:
+            output = PipelineOutput(raw_text="", document_type=DocumentType.UNKNOWN, error=str(e))
+        else:
+            cards = _read_cards(page, max_cards=1) if config.CARD_DETECTION else []
+            output = cards[0] if cards else _read_whole(page)
+    output.timings = timings
+    return output
+
+
+def _read_upload(image_bytes: bytes, max_cards: int) -> list[PipelineOutput]:
+    if not config.CARD_DETECTION:
+        settings = CHEAP_PREPROCESS if config.OCR_ADAPTIVE else DEFAULT_CONFIG
+        try:
+            image = preprocess_image(image_bytes, settings).image
+        except ImageDecodeError as e:
+            return [PipelineOutput(raw_text="", document_type=DocumentType.UNKNOWN, error=str(e))]
+        output = _process_image(image)
+        if config.OCR_ADAPTIVE:
+            output = _escalate(output, lambda: preprocess_for_easyocr(image_bytes))
+        return [output]
+
+    try:
+        photo = preprocess_image(image_bytes, CARD_DECODE).image
+    except ImageDecodeError as e:
+        return [PipelineOutput(raw_text="", document_type=DocumentType.UNKNOWN, error=str(e))]
+    return _read_cards(photo, max_cards) or [_read_whole(photo)]
+
+
+def _read_whole(image: np.ndarray) -> PipelineOutput:
+    """Reads a decoded photo or page as a whole, with adaptive OCR if enabled."""
+    if config.OCR_ADAPTIVE:
+        output = _process_image(preprocess_decoded(image, CHEAP_PREPROCESS).image)
+        return _escalate(output, lambda: preprocess_decoded(image).image)
+    return _process_image(preprocess_decoded(image).image)
+
+
+def _read_cards(photo: np.ndarray, max_cards: int) -> list[PipelineOutput]:
+    """
+    Reads each card found in `photo` from its perspective-corrected crop.
+    Empty if no card was found. Several cards share one batched OCR pass.
+    """
+    with tracing.stage("detect_cards"):
+        found = find_cards(photo, max_cards)
+    if not found:
+        return []
+    with tracing.stage("warp"):
+        crops = [warp_card(photo, corners) for corners in found]
+    if len(crops) == 1:
+        outputs = [_process_image(crops[0])]
+        if config.OCR_ADAPTIVE:
+            outputs[0] = _escalate(outputs[0], lambda: _full_crop(lambda: photo, found[0], crops[0]))
+    else:
+        outputs = _read_images(crops, lambda position: _full_crop(lambda: photo, found[position], crops[position]))
+    for output, corners, crop in zip(outputs, found, crops):
+        output.card = locate(photo, corners, crop)
+    return outputs
+
+
+def _full_crop(load_photo: Callable[[], np.ndarray], corners: np.ndarray, crop: np.ndarray) -> np.ndarray:
+    """
+    The card for the heavy pass: warped again from the photo at the
+    resolution the photo holds it, up to PREPROCESS_MAX_SIDE, rather than
+    re-reading the CARD_CROP_WIDTH crop. The crop itself if that is no larger.
+    """
+    width = card_width(corners)
+    if config.PREPROCESS_MAX_SIDE:
+        width = min(width, config.PREPROCESS_MAX_SIDE)
+    if width <= max(crop.shape[:2]):
+        return crop
+    return warp_card(load_photo(), corners, width)
+
+
+def _process_image(image) -> PipelineOutput:
+    ocr = read_routed_ocr(image)
+    with tracing.stage("classify"):
+        analysis = analyze(ocr.text, ocr)
+    return _parse(analysis)
+
+
+def process_batch(images: list[bytes]) -> list[PipelineOutput]:
+    """
+    Runs the pipeline for many images, sharing one batched OCR pass.
+    """
+    with tracing.collect() as timings, profile_if_slow("process_batch"):
+        outputs = _process_batch(images)
+    for output in outputs:
+        output.timings = timings
+    return outputs
+
+
+def _batch_input(image_bytes: bytes) -> tuple[np.ndarray, CardLocation | None, np.ndarray | None] | None:
+    """
+    The OCR input for one upload of a batch: its largest card, warped, with
+    its location and corners, or else the whole image. None if the upload
+    cannot be decoded.
+    """
+    try:
+        photo = preprocess_image(image_bytes, CARD_DECODE).image
+    except ImageDecodeError:
+        return None
+    found = find_cards(photo, 1)
+    if found:
+        crop = warp_card(photo, found[0])
+        return crop, locate(photo, found[0], crop), found[0]
+    return preprocess_decoded(photo, CHEAP_PREPROCESS if config.OCR_ADAPTIVE else DEFAULT_CONFIG).image, None, None
+
+
+def _process_batch(images: list[bytes]) -> list[PipelineOutput]:
+    with tracing.stage("preprocess"):
+        if config.CARD_DETECTION:
+            with ThreadPoolExecutor(max_workers=config.OCR_BATCH_PREPROCESS_THREADS) as executor:
+                prepared = list(executor.map(_batch_input, images))
+        else:
+            settings = CHEAP_PREPROCESS if config.OCR_ADAPTIVE else DEFAULT_CONFIG
+            prepared = [None if image is None else (image, None, None) for image in preprocess_many(images, settings)]
+    decoded = [i for i, item in enumerate(prepared) if item is not None]
+
+    def load_full(position: int) -> np.ndarray:
+        image, card, corners = prepared[decoded[position]]
+        if card is None:
+            return preprocess_for_easyocr(images[decoded[position]])
+        # The photos are not kept for the whole batch; escalations are rare.
+        return _full_crop(lambda: preprocess_image(images[decoded[position]], CARD_DECODE).image, corners, image)
+
+    outputs = [
+        PipelineOutput(raw_text="", document_type=DocumentType.UNKNOWN, error="Could not decode image.")
+        for _ in images
+    ]
+    for index, output in zip(decoded, _read_images([prepared[i][0] for i in decoded], load_full)):
+        output.card = prepared[index][1]
+        outputs[index] = output
+    return outputs
+
+
+def _read_images(images: list[np.ndarray], load_full: Callable[[int], np.ndarray]) -> list[PipelineOutput]:
+    """
+    OCR, classification and parsing of several images in one batched pass.
+    `load_full(i)` returns the image the heavy pass re-reads for image i.
+    """
+    results = read_routed_ocr_batch(images)
+    texts = [result.text for result in results]
+    with tracing.stage("classify"):
+        analyses = [analyze(result.text, result) for result in results]
+
+    # Only PAN and Aadhaar parsers use NER; run it once over all of them.
+    needs_ner = [i for i, analysis in enumerate(analyses) if analysis.document_type in NER_DOCUMENT_TYPES]
+    person_names: list[list[str] | None] = [None] * len(texts)
+    for i, names in zip(needs_ner, find_person_names_batch([texts[i] for i in needs_ner])):
+        person_names[i] = names
+
+    outputs = []
+    for position, (analysis, names) in enumerate(zip(analyses, person_names)):
+        output = _parse(analysis, names)
+        if config.OCR_ADAPTIVE:
+            # Escalations are rare enough to run one at a time.
+            output = _escalate(output, lambda: load_full(position))
+        outputs.append(output)
+    return outputs
+
+
+def _read_as(image_bytes: bytes, doc_type: DocumentType) -> str:
+    """OCR for an upload whose document type is already known."""
+    if config.CARD_DETECTION:
+        photo = preprocess_image(image_bytes, CARD_DECODE).image
+        found = find_cards(photo, 1)
+        image = warp_card(photo, found[0]) if found else preprocess_decoded(photo).image
+    else:
+        image = preprocess_for_easyocr(image_bytes)
+    if not config.OCR_LANGUAGE_ROUTING:
+        return read_text(image)
+    profile = OCR_PROFILES[doc_type]
+    return read_text(image, profile.languages, profile.max_side)
+
+
+def process_pan_card(image_bytes: bytes) -> PANCardDetails:
+    return parse_pan_details(_read_as(image_bytes, DocumentType.PAN_CARD))
+
+
+def process_aadhaar_card(image_bytes: bytes) -> AadhaarCardDetails:
+    return parse_aadhaar_details(_read_as(image_bytes, DocumentType.AADHAAR_CARD))
@@ -0,0 +1,206 @@
+import io
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from app import config
+from app.services import tracing
+
+logger = logging.getLogger(__name__)
+
+# Image preprocessing ahead of OCR: decode -> (deskew) -> OCR-ready uint8 BGR.
+#
+# Phone photos are often 12+ MP while EasyOCR's detector works on at most a
+# few megapixels, so oversized images are decoded at reduced size straight
+# from the JPEG/PNG data. Skew is estimated on a small grayscale copy and the
+# correction is a single uint8 affine warp, so no float copies of the
+# full-size image are ever made.
+
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    # Longest side of the image handed to OCR; 0 keeps the full resolution.
+    max_side: int = config.PREPROCESS_MAX_SIDE
+    # Let the decoder downscale by 2/4/8 while decoding oversized images.
+    reduced_decode: bool = config.PREPROCESS_REDUCED_DECODE
+    deskew: bool = config.PREPROCESS_DESKEW
+    # Longest side of the grayscale copy used to estimate skew.
+    skew_max_side: int = config.PREPROCESS_SKEW_MAX_SIDE
+    # Corrections smaller than this (in degrees) are not worth a warp.
+    min_skew_angle: float = config.PREPROCESS_MIN_SKEW_ANGLE
+    # Record per-stage latency and peak memory (tracemalloc adds overhead).
+    profile: bool = config.PREPROCESS_PROFILE
+
+
+@dataclass
+class StageReport:
+    name: str
+    seconds: float
+    peak_bytes: int | None = None
+
+
+@dataclass
+class PreprocessResult:
+    image: np.ndarray
+    skew_angle: float = 0.0
+    stages: list[StageReport] = field(default_factory=list)
+
+
+DEFAULT_CONFIG = PreprocessConfig()
+
+
+class ImageDecodeError(ValueError):
+    """Raised when the uploaded bytes are not a decodable image."""
+
+
+@contextmanager
+def _stage(name: str, stages: list[StageReport], profile: bool):
+    if profile:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] - base if profile else None
+        stages.append(StageReport(name, seconds, peak))
+        tracing.record(name, seconds)
+
+
+def _header_size(image_bytes: bytes) -> tuple[int, int] | None:
+    """Reads the image dimensions from the file header without decoding pixels."""
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def limit_size(image: np.ndarray, max_side: int) -> np.ndarray:
+    """Downscales (never upscales) so that the longest side is at most `max_side`."""
+    height, width = image.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return image
+    scale = max_side / max(height, width)
+    return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def decode_image(image_bytes: bytes, max_side: int = 0, reduced_decode: bool = True) -> np.ndarray:
+    """
+    Decodes image bytes into a uint8 BGR array no larger than `max_side`.
+    """
+    flag = cv2.IMREAD_COLOR
+    size = _header_size(image_bytes) if (max_side and reduced_decode) else None
+    if size is not None:
+        longest = max(size)
+        # The largest power-of-two reduction that still leaves >= max_side pixels.
+        for factor in (8, 4, 2):
+            if longest // factor >= max_side:
+                flag = _REDUCED_DECODE_FLAGS[factor]
+                break
+
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if image is None:
+        raise ImageDecodeError("Could not decode image.")
+    return limit_size(image, max_side)
+
+
+def estimate_skew(image: np.ndarray, max_side: int = 800) -> float:
+    """
+    Estimates the skew angle in degrees from the principal axis of the edge
+    pixels, measured on a downsampled grayscale copy.
+    """
+    small = limit_size(image, max_side)
+    scale = max(small.shape[:2]) / max(image.shape[:2])
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    # Same smoothing as a sigma=3 Canny at full resolution, scaled to the copy.
+    gray = cv2.GaussianBlur(gray, (0, 0), max(0.8, 3.0 * scale))
+    edges = cv2.Canny(gray, 25, 51)
+
+    points = cv2.findNonZero(edges)
+    if points is None or len(points) <= 1:
+        return 0.0
+    # (x, y) -> (row, col), matching the orientation convention used for rotation.
+    coords = points.reshape(-1, 2)[:, ::-1].astype(np.float32)
+    cov = np.cov(coords - coords.mean(axis=0), rowvar=False)
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    vec = eigenvectors[:, -1]
+    angle = float(np.degrees(np.arctan2(vec[1], vec[0])))
+    if abs(angle) > 45:
+        angle = (90 - abs(angle)) * np.sign(angle)
+    return float(angle)
+
+
+def rotate_image(image: np.ndarray, angle: float) -> np.ndarray:
+    """
+    Rotates counter-clockwise by `angle` degrees, growing the canvas so that no
+    content is cut off. The new area is filled with white.
+    """
+    height, width = image.shape[:2]
+    center = (width / 2, height / 2)
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width = int(round(height * sin + width * cos))
+    new_height = int(round(height * cos + width * sin))
+    matrix[0, 2] += new_width / 2 - center[0]
+    matrix[1, 2] += new_height / 2 - center[1]
+    return cv2.warpAffine(
+        image, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255),
+    )
+
+
+def preprocess_image(image_bytes: bytes, settings: PreprocessConfig = DEFAULT_CONFIG) -> PreprocessResult:
+    """
+    Runs the configured preprocessing stages on raw image bytes.
+    """
+    stages: list[StageReport] = []
+    if settings.profile and not tracemalloc.is_tracing():
+        # Left running once started: other threads may be mid-measurement.
+        # Peaks are process-wide, so concurrent preprocessing inflates them.
+        tracemalloc.start()
+
+    with _stage("decode", stages, settings.profile):
+        image = decode_image(image_bytes, settings.max_side, settings.reduced_decode)
+    return _prepare(image, stages, settings)
+
+
+def preprocess_decoded(image: np.ndarray, settings: PreprocessConfig = DEFAULT_CONFIG) -> PreprocessResult:
+    """
+    Runs the stages after decoding on an image that is already a BGR array,
+    such as a rasterized document page.
+    """
+    stages: list[StageReport] = []
+    if settings.profile and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _prepare(limit_size(image, settings.max_side), stages, settings)
+
+
+def _prepare(image: np.ndarray, stages: list[StageReport], settings: PreprocessConfig) -> PreprocessResult:
+    angle = 0.0
+    if settings.deskew:
+        with _stage("estimate_skew", stages, settings.profile):
+            angle = estimate_skew(image, settings.skew_max_side)
+        if abs(angle) >= settings.min_skew_angle:
+            with _stage("rotate", stages, settings.profile):
+                image = rotate_image(image, angle)
+
+    if settings.profile:
+        logger.info("Preprocessed %dx%d image: %s", image.shape[1], image.shape[0], ", ".join(
+            f"{s.name}={s.seconds * 1000:.1f}ms/{s.peak_bytes / 2**20:.1f}MB" for s in stages
+        ))
+    return PreprocessResult(image=image, skew_angle=angle, stages=stages)
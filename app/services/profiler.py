@@ -0,0 +1,81 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Opt-in sampling profiler for slow units of work. While the work runs, a
+# background thread records the stack of the working thread every
+# PROFILE_SAMPLE_INTERVAL_MS. If the work took longer than
+# PROFILE_SLOW_SECONDS, the samples are written as collapsed stacks
+# ("frame;frame;frame count" per line), which flamegraph.pl, speedscope and
+# similar tools render as a flame graph. Fast work is discarded.
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+@contextmanager
+def profile_if_slow(label: str):
+    """Samples the enclosed work and keeps a flame profile if it was slow."""
+    if config.PROFILE_SAMPLE_INTERVAL_MS <= 0:
+        yield
+        return
+    sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+        if elapsed >= config.PROFILE_SLOW_SECONDS and sampler.samples:
+            _write_profile(label, elapsed, sampler)
+
+
+def _write_profile(label: str, elapsed: float, sampler: StackSampler):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(
+        config.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{os.getpid()}-{int(elapsed * 1000)}ms.folded"
+    )
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+    except OSError as e:
+        logger.warning("Could not write profile %s: %s", path, e)
+        return
+    logger.info("%s took %.2fs; flame profile written to %s", label, elapsed, path)
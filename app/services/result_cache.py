@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from importlib import metadata
+
+from app import config
+from app.services.document_classifier import DocumentType
+from app.services.pipeline import PipelineOutput, DATA_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Results are keyed by the SHA-256 of the uploaded bytes *and* by a version
+# string covering the pipeline code and the OCR/NLP models. Bumping any of
+# those makes old entries unreachable instead of serving stale parses.
+
+
+def _package_version(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "missing"
+
+
+PIPELINE_VERSION = ";".join([
+    f"pipeline={config.PIPELINE_VERSION}",
+    f"ner={config.NER_MODE}",
+    f"routing={int(config.OCR_LANGUAGE_ROUTING)}",
+    f"adaptive={int(config.OCR_ADAPTIVE)}",
+    f"templates={int(config.OCR_LAYOUT_TEMPLATES)}",
+    f"ocr_engine={config.OCR_ENGINE}",
+    f"cards={int(config.CARD_DETECTION)}",
+    f"easyocr={_package_version('easyocr')}",
+    f"spacy={_package_version('spacy')}",
+    f"en_core_web_sm={_package_version('en_core_web_sm')}",
+])
+_VERSION_TAG = hashlib.sha256(PIPELINE_VERSION.encode()).hexdigest()[:12]
+
+
+def content_digest(image_bytes: bytes) -> str:
+    """The public identifier of an upload: the hex SHA-256 of its bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def cache_key(digest: str) -> str:
+    return f"{_VERSION_TAG}:{digest}"
+
+
+def to_entry(output: PipelineOutput) -> dict:
+    return {
+        "raw_text": output.raw_text,
+        "document_type": output.document_type.value,
+        "data": output.data.model_dump() if output.data is not None else None,
+        "near_duplicate_of": output.near_duplicate_of,
+    }
+
+
+def from_entry(entry: dict) -> PipelineOutput:
+    doc_type = DocumentType(entry["document_type"])
+    data = entry.get("data")
+    if data is not None:
+        data = DATA_MODELS[doc_type](**data)
+    return PipelineOutput(
+        raw_text=entry["raw_text"], document_type=doc_type, data=data,
+        near_duplicate_of=entry.get("near_duplicate_of"),
+    )
+
+
+class MemoryTier:
+    """A size- and TTL-bounded LRU map held in process memory."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> dict | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class DiskTier:
+    """One JSON file per entry in a local directory."""
+
+    def __init__(self, directory: str, ttl_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace(":", "_") + ".json")
+
+    async def setup(self):
+        pass
+
+    async def get(self, key: str) -> dict | None:
+        # File I/O runs in a thread so the event loop is not held up.
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, entry: dict):
+        await asyncio.to_thread(self._write, key, entry)
+
+    def _read(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, key: str, entry: dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        # Atomic rename so concurrent readers never see a half-written file.
+        os.replace(tmp_path, path)
+
+
+class MongoTier:
+    """Entries stored in a Mongo collection, expired by a TTL index."""
+
+    def __init__(self, collection, ttl_seconds: float):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    async def setup(self):
+        await self.collection.create_index("created_at", expireAfterSeconds=int(self.ttl_seconds))
+
+    async def get(self, key: str) -> dict | None:
+        document = await self.collection.find_one({"_id": key})
+        return document["entry"] if document else None
+
+    async def set(self, key: str, entry: dict):
+        await self.collection.replace_one(
+            {"_id": key},
+            {"_id": key, "entry": entry, "created_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+
+
+class ResultCache:
+    """
+    Two-tier cache of pipeline outputs with single-flight computation.
+
+    The memory tier is always on. The optional backing tier (disk or Mongo) is
+    shared between worker processes and survives restarts.
+    """
+
+    def __init__(self, memory: MemoryTier, backing=None):
+        self.memory = memory
+        self.backing = backing
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.backing_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def setup(self):
+        if self.backing is not None:
+            await self.backing.setup()
+
+    async def _lookup(self, key: str) -> dict | None:
+        entry = self.memory.get(key)
+        if entry is None and self.backing is not None:
+            entry = await self._lookup_backing(key)
+        return entry
+
+    async def _lookup_backing(self, key: str) -> dict | None:
+        entry = await self.backing.get(key)
+        if entry is not None:
+            self.backing_hits += 1
+            self.memory.set(key, entry)
+        return entry
+
+    async def _store(self, key: str, entry: dict):
+        self.memory.set(key, entry)
+        if self.backing is not None:
+            await self.backing.set(key, entry)
+
+    async def get(self, digest: str) -> PipelineOutput | None:
+        entry = await self._lookup(cache_key(digest))
+        return from_entry(entry) if entry is not None else None
+
+    async def put(self, digest: str, output: PipelineOutput):
+        if output.error is None:
+            await self._store(cache_key(digest), to_entry(output))
+
+    async def get_or_compute(self, digest: str, compute) -> tuple[PipelineOutput, bool]:
+        """
+        Returns the cached output for `digest`, or awaits `compute()` to produce it.
+
+        Concurrent callers with the same digest share a single computation.
+        It runs in a task of its own, so a caller that goes away (a client
+        disconnect) does not cancel it for the others.
+        The second element of the returned tuple tells whether it was a cache hit.
+        """
+        key = cache_key(digest)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.hits += 1
+            return from_entry(entry), True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            output, _ = await asyncio.shield(inflight)
+            return output, True
+
+        # Registered as in flight before the first await, so that callers
+        # arriving during the backing-tier lookup join this computation too.
+        task = asyncio.create_task(self._compute(key, digest, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._computed(key, done))
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, digest: str, compute) -> tuple[PipelineOutput, bool]:
+        entry = None
+        if self.backing is not None:
+            try:
+                entry = await self._lookup_backing(key)
+            except Exception:
+                logger.exception("Result cache lookup failed; computing %s", digest)
+        if entry is not None:
+            self.hits += 1
+            return from_entry(entry), True
+        self.misses += 1
+        output = await compute()
+        try:
+            await self.put(digest, output)
+        except Exception:
+            # The result is still good; it just is not cached.
+            logger.exception("Storing the result of %s in the cache failed", digest)
+        return output, False
+
+    def _computed(self, key: str, task: asyncio.Task):
+        del self._inflight[key]
+        # Retrieve the exception even if every caller has gone away.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "version": PIPELINE_VERSION,
+            "hits": self.hits,
+            "backing_hits": self.backing_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.memory.evictions,
+            "memory_entries": len(self.memory),
+            "inflight": len(self._inflight),
+        }
+
+
+def _build_backing_tier():
+    if config.RESULT_CACHE_BACKEND == "disk":
+        return DiskTier(config.RESULT_CACHE_DIR, config.RESULT_CACHE_TTL_SECONDS)
+    if config.RESULT_CACHE_BACKEND == "mongo":
+        from app.database import db
+        return MongoTier(db.result_cache, config.RESULT_CACHE_TTL_SECONDS)
+    if config.RESULT_CACHE_BACKEND == "none":
+        return None
+    raise ValueError(f"Unknown result cache backend: {config.RESULT_CACHE_BACKEND}")
+
+
+result_cache = ResultCache(
+    MemoryTier(config.RESULT_CACHE_MAX_ENTRIES, config.RESULT_CACHE_TTL_SECONDS),
+    _build_backing_tier(),
+)
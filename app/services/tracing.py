@@ -0,0 +1,84 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Per-request stage timings. A trace is opened with `collect()` (by the HTTP
+# middleware in the API process, and around each unit of work in the OCR
+# workers) and filled by `stage()` blocks anywhere below it. Stages record
+# their own (exclusive) time: a nested stage is subtracted from its parent,
+# so the timings of a trace add up to its total instead of double counting.
+# Outside of a trace, `stage()` costs a context-variable lookup.
+
+
+class Trace:
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+# Time spent in the children of the innermost open stage. A context variable
+# rather than a stack on the trace, so concurrent tasks do not interleave.
+_children: ContextVar[list[float] | None] = ContextVar("trace_children", default=None)
+
+
+def _add(trace: Trace, name: str, seconds: float):
+    trace.add(name, seconds)
+    parent = _children.get()
+    if parent is not None:
+        parent[0] += seconds
+
+
+@contextmanager
+def collect():
+    """Opens a trace for the enclosed work and yields its timings dict."""
+    trace = Trace()
+    token = _current.set(trace)
+    children_token = _children.set(None)
+    try:
+        yield trace.timings
+    finally:
+        _children.reset(children_token)
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    children = [0.0]
+    token = _children.set(children)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _children.reset(token)
+        # Children running concurrently can add up to more than the elapsed time.
+        _add(trace, name, max(0.0, elapsed - children[0]))
+
+
+def record(name: str, seconds: float):
+    """Adds a duration measured elsewhere (e.g. in a worker) to the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        _add(trace, name, seconds)
+
+
+def merge(timings: dict[str, float]):
+    for name, seconds in timings.items():
+        record(name, seconds)
+
+
+def current_timings() -> dict[str, float] | None:
+    trace = _current.get()
+    return trace.timings if trace is not None else None
+
+
+def server_timing_header(timings: dict[str, float]) -> str:
+    """Formats timings for the `Server-Timing` response header (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
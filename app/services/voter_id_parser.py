@@ -1,37 +1,29 @@
 import re
 from app.models import VoterIDCardDetails
+from app.services.field_engine import Analysis, analyze
 # We don't need spaCy here as a label-based approach is more reliable for Voter IDs.
 
 ## REFINE 1: Create helper functions for clean, maintainable logic.
 
+_WHITESPACE = re.compile(r'\s+')
+_DEVANAGARI = re.compile(r'[\u0900-\u097F]')
+
 def _clean_text(text: str) -> str:
     """Removes unwanted characters, colons, and extra whitespace."""
     text = text.replace(':', '').strip()
-    return re.sub(r'\s+', ' ', text)
+    return _WHITESPACE.sub(' ', text)
 
 def _is_hindi(text: str) -> bool:
     """
     Checks if a string contains characters in the Devanagari (Hindi) Unicode range.
     This is a highly reliable way to distinguish the languages.
     """
-    return bool(re.search(r'[\u0900-\u097F]', text))
-
-def _extract_voter_id(text: str) -> str | None:
-    """Finds the Voter ID (Epic No.) using a forgiving two-step process."""
-    # Step 1: Find all 10-character alphanumeric strings.
-    potential_ids = re.findall(r'\b[A-Z0-9]{10}\b', text.upper())
-    
-    # Step 2: Validate against the specific LLLNNNNNNN pattern.
-    for pid in potential_ids:
-        if re.match(r'[A-Z]{3}\d{7}', pid):
-            return pid
-    return None
+    return bool(_DEVANAGARI.search(text))
 
-def _extract_names(raw_text: str) -> tuple[str | None, str | None]:
+def _extract_names(lines: list[str]) -> tuple[str | None, str | None]:
     """
     Extracts English and Hindi names by finding labels and then classifying the text.
     """
-    lines = raw_text.split('\n')
     candidate_names = []
 
     ## REFINE 2: Improve label-based extraction to be more flexible.
@@ -63,12 +55,15 @@ def _extract_names(raw_text: str) -> tuple[str | None, str | None]:
     return english_name, hindi_name
 
 # --- Main Parsing Function ---
-def parse_voter_id_details(raw_text: str) -> VoterIDCardDetails:
+def parse_voter_id_details(raw_text: str, analysis: Analysis | None = None) -> VoterIDCardDetails:
     """
     The main orchestrator function to parse Voter ID card details.
+    `analysis` is the field-engine result if the text was already analysed.
     """
-    voter_id = _extract_voter_id(raw_text)
-    name_eng, name_hin = _extract_names(raw_text)
+    analysis = analysis or analyze(raw_text)
+    # The Voter ID (Epic No.) is a 10-character token shaped LLLNNNNNNN.
+    voter_id = analysis.fields["voter_id"]
+    name_eng, name_hin = _extract_names(analysis.text.lines)
 
     return VoterIDCardDetails(
         voter_id=voter_id,
@@ -0,0 +1,75 @@
+"""
+Compares a benchmark result file with a saved baseline.
+
+Usage:
+
+    python -m benchmarks.compare results.json baseline.json [--tolerance 0.10]
+
+Throughput, accuracy and capacity metrics regress when they drop, latency and memory
+metrics when they grow, by more than the relative tolerance. Exits with
+status 1 if any metric regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+# Metrics where a larger value is better; everything else is a cost.
+HIGHER_IS_BETTER = ("docs_per_second", "accuracy", "workers_per_node")
+
+
+def higher_is_better(name: str) -> bool:
+    return any(part in name for part in HIGHER_IS_BETTER)
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[dict]:
+    rows = []
+    for name, base in sorted(baseline["metrics"].items()):
+        value = current["metrics"].get(name)
+        if value is None or not isinstance(base, (int, float)) or name.endswith(".count"):
+            continue
+        if base:
+            change = (value - base) / base
+        else:
+            # e.g. an error rate that was zero: any increase is a regression.
+            change = 0.0 if value == base else float("inf") if value > base else float("-inf")
+        worse = -change if higher_is_better(name) else change
+        rows.append({"metric": name, "baseline": base, "current": value,
+                     "change": change, "regressed": worse > tolerance})
+    return rows
+
+
+def report(rows: list[dict]) -> str:
+    lines = []
+    for row in rows:
+        flag = "REGRESSED" if row["regressed"] else ""
+        lines.append(f"{row['metric']:<55} {row['baseline']:>12.4g} {row['current']:>12.4g} "
+                     f"{row['change']:>+8.1%} {flag}")
+    return "\n".join(lines)
+
+
+def exit_on_regression(results: dict, baseline_path: str | None, tolerance: float):
+    """Used by the benchmarks' --baseline option."""
+    if not baseline_path:
+        return
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, tolerance)
+    print("\nCompared with " + baseline_path + ":\n" + report(rows))
+    if any(row["regressed"] for row in rows):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results")
+    parser.add_argument("baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.results, encoding="utf-8") as f:
+        current = json.load(f)
+    exit_on_regression(current, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Identity resolution index: build time, memory and lookup latency at scale.
+
+Usage:
+
+    python -m benchmarks.identity [--records 10000000] [--queries 2000] [--output results.json]
+
+Indexes `--records` synthetic PAN, Aadhaar and Voter ID records. Names are
+drawn from generated first-name and surname vocabularies with a skewed
+(Zipf-like) frequency, so common names produce the large blocks real data
+has. The benchmark then looks up queries of four kinds:
+
+- exact: a stored record submitted again;
+- number_typo: a stored record with one character of its number misread;
+- cross_document: the person behind a stored PAN or Aadhaar record, on the
+  other document type with a different number;
+- new: a person not on record, who should not match anything.
+
+Reports build time, index memory, lookup latency percentiles, candidates
+scored per lookup, and accuracy per query kind: the share of queries whose
+true record is among the matches (for `new`, the share that matched nothing).
+10M records need about 5 GB of memory (mostly the generated rows) and a few
+minutes to build.
+"""
+import argparse
+import bisect
+import random
+import string
+import time
+
+import numpy as np
+
+from app.services.identity_index import IdentityIndex, normalize_name
+from benchmarks import compare
+from benchmarks.stats import flatten, peak_rss_bytes, summarize, write_results
+
+SYLLABLES = ("ra", "ma", "sha", "vi", "ka", "an", "pri", "ya", "su", "de", "ni", "la", "ro", "han", "ti",
+             "ja", "ga", "ru", "mi", "dev", "pa", "na", "ku", "bh", "sa", "vin", "ar", "jun", "ee", "sh")
+PAN, AADHAAR, VOTER = 0, 1, 2
+
+
+class Population:
+    def __init__(self, seed: int, vocabulary: int):
+        self.rng = random.Random(seed)
+        self.first_names = self._vocabulary(vocabulary)
+        self.surnames = self._vocabulary(vocabulary)
+        # Zipf-like frequencies: a few very common names, a long tail.
+        weights = 1 / np.arange(1, vocabulary + 1) ** 0.9
+        self.cumulative = np.cumsum(weights / weights.sum()).tolist()
+
+    def _vocabulary(self, size: int) -> list[str]:
+        names = set()
+        while len(names) < size:
+            names.add("".join(self.rng.choices(SYLLABLES, k=self.rng.randint(2, 4))).upper())
+        return sorted(names)
+
+    def _pick(self, names: list[str]) -> str:
+        index = min(bisect.bisect(self.cumulative, self.rng.random()), len(names) - 1)
+        return names[index]
+
+    def name(self) -> str:
+        return f"{self._pick(self.first_names)} {self._pick(self.surnames)}"
+
+    def date(self) -> int:
+        return self.rng.randint(1950, 2005) * 10000 + self.rng.randint(1, 12) * 100 + self.rng.randint(1, 28)
+
+    def number(self, type_code: int) -> str:
+        rng = self.rng
+        if type_code == PAN:
+            return "".join(rng.choices(string.ascii_uppercase, k=5)) + f"{rng.randrange(10**4):04d}" \
+                + rng.choice(string.ascii_uppercase)
+        if type_code == AADHAAR:
+            return f"{rng.randrange(2 * 10**11, 10**12)}"
+        return "".join(rng.choices(string.ascii_uppercase, k=3)) + f"{rng.randrange(10**7):07d}"
+
+    def row(self, type_code: int | None = None) -> tuple[int, str, int, str]:
+        type_code = self.rng.randrange(3) if type_code is None else type_code
+        # Voter ID records carry no date of birth.
+        date = 0 if type_code == VOTER else self.date()
+        return type_code, self.number(type_code), date, normalize_name(self.name())
+
+    def misread(self, number: str) -> str:
+        position = self.rng.randrange(len(number))
+        alphabet = string.digits if number[position].isdigit() else string.ascii_uppercase
+        replacement = self.rng.choice(alphabet.replace(number[position], ""))
+        return number[:position] + replacement + number[position + 1:]
+
+
+def build(index: IdentityIndex, population: Population, records: int, chunk_size: int = 200_000) -> list:
+    """Indexes `records` rows and returns them (the record id is the position)."""
+    rows = []
+    for start in range(0, records, chunk_size):
+        chunk = [population.row() for _ in range(min(chunk_size, records - start))]
+        index.add_rows(chunk)
+        rows.extend(chunk)
+    index.merge()
+    index.ready = True
+    return rows
+
+
+def queries(population: Population, rows: list, count: int) -> list[tuple[str, tuple, int | None]]:
+    """(kind, query row, true record id or None) tuples."""
+    rng = population.rng
+    result = []
+    for i in range(count):
+        kind = ("exact", "number_typo", "cross_document", "new")[i % 4]
+        if kind == "new":
+            result.append((kind, population.row(), None))
+            continue
+        record_id = rng.randrange(len(rows))
+        type_code, number, date, name = rows[record_id]
+        if kind == "exact":
+            query = rows[record_id]
+        elif kind == "number_typo":
+            query = (type_code, population.misread(number), date, name)
+        else:
+            while type_code == VOTER:
+                record_id = rng.randrange(len(rows))
+                type_code, number, date, name = rows[record_id]
+            other = AADHAAR if type_code == PAN else PAN
+            query = (other, population.number(other), date, name)
+        result.append((kind, query, record_id))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=5000, help="First names and surnames each")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-block", type=int, default=1000)
+    parser.add_argument("--min-score", type=float, default=0.75)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    population = Population(args.seed, args.vocabulary)
+    index = IdentityIndex(args.max_block, args.min_score, max_matches=5)
+    started = time.perf_counter()
+    rows = build(index, population, args.records)
+    build_seconds = time.perf_counter() - started
+
+    latencies, found, totals = [], {}, {}
+    candidates_before = index.counters["candidates"]
+    for kind, query, record_id in queries(population, rows, args.queries):
+        started = time.perf_counter()
+        matches = index.find(query)
+        latencies.append(time.perf_counter() - started)
+        totals[kind] = totals.get(kind, 0) + 1
+        hit = not matches if record_id is None else any(m.record_id == record_id for m in matches)
+        found[kind] = found.get(kind, 0) + hit
+
+    stats = index.stats()
+    metrics = flatten("lookup", summarize(latencies))
+    metrics["lookup.candidates_mean"] = (stats["candidates"] - candidates_before) / len(latencies)
+    metrics["build.seconds"] = build_seconds
+    metrics["memory.index_bytes"] = stats["memory_bytes"]
+    metrics["memory.peak_rss_bytes"] = peak_rss_bytes()
+    for kind, total in totals.items():
+        metrics[f"accuracy.{kind}"] = found[kind] / total
+
+    results = write_results(args.output, "identity", metrics, {
+        "records": args.records, "queries": args.queries, "vocabulary": args.vocabulary,
+        "max_block": args.max_block, "min_score": args.min_score, "postings": stats["postings"],
+    })
+    for name, value in metrics.items():
+        print(f"{name:<55} {value:.4g}")
+    compare.exit_on_regression(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Load test of a running API with synthetic cards.
+
+Usage:
+
+    python -m benchmarks.load http://127.0.0.1:8000 [--concurrency 8] [--requests 200] \\
+        [--endpoint process_document|process_batch] [--batch-size 8] [--output results.json]
+
+Requests are sent from `--concurrency` threads until `--requests` documents
+have been submitted. Every upload gets a few unique trailing bytes (ignored
+by image decoders), so the result cache does not turn the run into a cache
+benchmark; pass `--allow-cache-hits` to send the cards unchanged.
+
+Reports documents per second, latency percentiles per request, the share of
+429/5xx responses, field-level accuracy of the answers and the API process's
+RSS as reported by /health/ready.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import compare, synthetic
+from benchmarks.stats import FieldAccuracy, flatten, summarize, write_results
+
+
+class LoadRun:
+    def __init__(self, base_url: str, cards: list[synthetic.SyntheticCard], endpoint: str,
+                 batch_size: int, unique_uploads: bool, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.cards = cards
+        self.endpoint = endpoint
+        self.batch_size = batch_size if endpoint == "process_batch" else 1
+        self.unique_uploads = unique_uploads
+        self.timeout = timeout
+        self.latencies: list[float] = []
+        self.statuses: dict[int, int] = {}
+        self.accuracy = FieldAccuracy()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _upload(self, index: int) -> tuple[str, bytes, synthetic.SyntheticCard]:
+        card = self.cards[index % len(self.cards)]
+        image_bytes = card.image_bytes + f"#{index}".encode() if self.unique_uploads else card.image_bytes
+        return f"{card.key}.jpg", image_bytes, card
+
+    def send(self, first_index: int):
+        uploads = [self._upload(first_index + i) for i in range(self.batch_size)]
+        if self.endpoint == "process_batch":
+            files = [("files", (name, data, "image/jpeg")) for name, data, _ in uploads]
+        else:
+            name, data, _ = uploads[0]
+            files = {"file": (name, data, "image/jpeg")}
+
+        started = time.perf_counter()
+        try:
+            response = self._session().post(f"{self.base_url}/v1/{self.endpoint}", files=files, timeout=self.timeout)
+            status, body = response.status_code, response.json() if response.ok else None
+        except requests.RequestException:
+            status, body = 0, None
+        seconds = time.perf_counter() - started
+
+        if body is None:
+            results = [None] * len(uploads)
+        elif self.endpoint == "process_batch":
+            results = [item.get("result") for item in body["results"]]
+        else:
+            results = [body]
+        with self._lock:
+            self.latencies.append(seconds)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            for (_, _, card), result in zip(uploads, results):
+                self.accuracy.add(card.document_type, card.fields, (result or {}).get("data"))
+
+    def run(self, total_documents: int, concurrency: int) -> float:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(self.send, range(0, total_documents, self.batch_size)))
+        return time.perf_counter() - started
+
+
+def _api_rss(base_url: str) -> int | None:
+    try:
+        status = requests.get(f"{base_url.rstrip('/')}/health/ready", timeout=10).json()
+        return status["api_process"]["rss_bytes"]
+    except (requests.RequestException, ValueError, KeyError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_url")
+    synthetic.add_dataset_arguments(parser)
+    parser.add_argument("--endpoint", choices=("process_document", "process_batch"), default="process_document")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Documents to submit in total")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--allow-cache-hits", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    cards = synthetic.cards_from_arguments(args)
+    load = LoadRun(args.base_url, cards, args.endpoint, args.batch_size, not args.allow_cache_hits, args.timeout)
+    wall_seconds = load.run(args.requests, args.concurrency)
+
+    request_count = sum(load.statuses.values())
+    metrics = flatten("request", summarize(load.latencies, wall_seconds))
+    # Throughput in documents, which differs from requests for batches.
+    metrics["run.docs_per_second"] = request_count * load.batch_size / wall_seconds
+    metrics["run.wall_seconds"] = wall_seconds
+    metrics["errors.rejected_rate"] = load.statuses.get(429, 0) / request_count
+    metrics["errors.failed_rate"] = sum(n for code, n in load.statuses.items()
+                                        if code == 0 or code >= 500) / request_count
+    rss = _api_rss(args.base_url)
+    if rss is not None:
+        metrics["memory.api_rss_bytes"] = rss
+    metrics.update(load.accuracy.metrics())
+
+    results = write_results(args.output, "load", metrics, {
+        "endpoint": args.endpoint, "batch_size": load.batch_size, "concurrency": args.concurrency,
+        "documents": args.requests, "cards": len(cards), "cache_hits": args.allow_cache_hits,
+        "statuses": {str(code): n for code, n in sorted(load.statuses.items())},
+    })
+    for name, value in metrics.items():
+        print(f"{name:<55} {value:.4g}")
+    compare.exit_on_regression(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Near-duplicate upload detection: fingerprint cost, accuracy and index lookup
+latency at scale.
+
+Usage:
+
+    python -m benchmarks.near_duplicates [--count 60] [--dataset DIR] [--records 1000000] \\
+        [--queries 2000] [--output results.json] [--baseline baseline.json]
+
+Fingerprints each synthetic card and four copies of it, as users re-upload
+them:
+
+- jpeg: re-encoded at JPEG quality 40;
+- half: downscaled to half size;
+- screenshot: padded with black bars, as a phone screenshot of the image;
+- upscale: enlarged by 1.5x.
+
+`accuracy.copies.<variant>` is the share of copies matched to their card,
+with the configured index and verification thresholds, and
+`accuracy.false_matches` the share of pairs of different cards that would
+match. Then `--records` fingerprints are indexed (the cards' index hashes
+with 20 to 60 random bits flipped, so records cluster as same-template cards
+do) and looked up. Reports build time, index memory, lookup latency
+percentiles and candidates per lookup. The verification step runs in Mongo
+and is not timed here.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from app import config
+from app.services.near_duplicates import HashIndex, compute_fingerprint, hamming
+from benchmarks import compare, synthetic
+from benchmarks.stats import flatten, peak_rss_bytes, summarize, write_results
+
+
+def _encode(image: np.ndarray, quality: int = 95) -> bytes:
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def _resize(image: np.ndarray, scale: float) -> np.ndarray:
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def copies(image_bytes: bytes) -> dict[str, bytes]:
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    bar = image.shape[0] // 3
+    return {
+        "jpeg": _encode(image, 40),
+        "half": _encode(_resize(image, 0.5)),
+        "screenshot": _encode(cv2.copyMakeBorder(image, bar, bar, 0, 0, cv2.BORDER_CONSTANT, value=0)),
+        "upscale": _encode(_resize(image, 1.5)),
+    }
+
+
+def matches(a, b) -> bool:
+    return (hamming(a.index_hash, b.index_hash) <= config.NEAR_DUP_MAX_DISTANCE
+            and hamming(a.verify_hash, b.verify_hash) <= config.NEAR_DUP_VERIFY_DISTANCE)
+
+
+def population(hashes: list[bytes], records: int, rng: np.random.Generator) -> np.ndarray:
+    """`records` index hashes: the given ones with 20 to 60 random bits flipped."""
+    bits = np.unpackbits(np.frombuffer(b"".join(hashes), np.uint8).reshape(len(hashes), -1), axis=1)
+    result = np.empty((records, bits.shape[1] // 8), np.uint8)
+    for start in range(0, records, 50_000):
+        end = min(start + 50_000, records)
+        flips = rng.integers(20, 61, size=end - start)
+        noise = rng.random((end - start, bits.shape[1])).argsort(axis=1) < flips[:, None]
+        result[start:end] = np.packbits(bits[rng.integers(len(hashes), size=end - start)] ^ noise, axis=1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic.add_dataset_arguments(parser)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    cards = synthetic.cards_from_arguments(args)
+    fingerprints, fingerprint_seconds = [], []
+    found, totals = {}, {}
+    for card in cards:
+        started = time.perf_counter()
+        original = compute_fingerprint(card.image_bytes)
+        fingerprint_seconds.append(time.perf_counter() - started)
+        fingerprints.append(original)
+        for variant, image_bytes in copies(card.image_bytes).items():
+            totals[variant] = totals.get(variant, 0) + 1
+            found[variant] = found.get(variant, 0) + matches(original, compute_fingerprint(image_bytes))
+    pairs = [(a, b) for i, a in enumerate(fingerprints) for b in fingerprints[i + 1:]]
+    false_matches = sum(matches(a, b) for a, b in pairs)
+
+    rng = np.random.default_rng(args.seed)
+    hashes = population([f.index_hash for f in fingerprints], args.records, rng)
+    digests = rng.integers(256, size=(args.records, 32), dtype=np.uint8)
+    index = HashIndex(config.NEAR_DUP_MAX_BUCKET)
+    started = time.perf_counter()
+    chunk_size = 200_000
+    for start in range(0, args.records, chunk_size):
+        end = min(start + chunk_size, args.records)
+        index.add_many([h.tobytes() for h in hashes[start:end]], [d.tobytes() for d in digests[start:end]])
+    index.merge()
+    build_seconds = time.perf_counter() - started
+
+    # Half the queries are stored records, half are fresh variants of the cards.
+    queries = np.concatenate([
+        hashes[rng.integers(args.records, size=args.queries // 2)],
+        population([f.index_hash for f in fingerprints], args.queries - args.queries // 2, rng),
+    ])
+    latencies, candidates = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        candidates += len(index.find(query.tobytes(), config.NEAR_DUP_MAX_DISTANCE))
+        latencies.append(time.perf_counter() - started)
+
+    metrics = flatten("fingerprint", summarize(fingerprint_seconds))
+    for variant, total in totals.items():
+        metrics[f"accuracy.copies.{variant}"] = found[variant] / total
+    if pairs:
+        metrics["accuracy.false_matches"] = false_matches / len(pairs)
+    metrics.update(flatten("lookup", summarize(latencies)))
+    metrics["lookup.candidates_mean"] = candidates / len(latencies)
+    metrics["build.seconds"] = build_seconds
+    metrics["memory.index_bytes"] = index.nbytes
+    metrics["memory.peak_rss_bytes"] = peak_rss_bytes()
+
+    results = write_results(args.output, "near_duplicates", metrics, {
+        "cards": len(cards), "dataset": args.dataset, "seed": args.seed, "records": args.records,
+        "queries": args.queries, "max_distance": config.NEAR_DUP_MAX_DISTANCE,
+        "verify_distance": config.NEAR_DUP_VERIFY_DISTANCE, "max_bucket": config.NEAR_DUP_MAX_BUCKET,
+    })
+    for name, value in metrics.items():
+        print(f"{name:<55} {value:.4g}")
+    compare.exit_on_regression(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the NER modes used for name extraction on labelled OCR text.
+
+Input is a JSONL file with one sample per line:
+
+    {"text": "<OCR text>", "document_type": "PAN_CARD", "name": "RAHUL KUMAR SHARMA"}
+
+Usage:
+
+    python -m benchmarks.ner_modes samples.jsonl [--modes full ner none] [--output results.json]
+
+For each mode it reports name accuracy (exact match after whitespace and
+case normalisation), per-document latency of the single-document path, and
+throughput of the batched `nlp.pipe` path.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app.services.document_classifier import DocumentType
+from app.services.ner import NER_MODES, find_person_names, find_person_names_batch
+from app.services.pan_parser import parse_pan_details
+from app.services.aadhaar_parser import parse_aadhaar_details
+from benchmarks.stats import percentile
+
+PARSERS = {
+    DocumentType.PAN_CARD.value: parse_pan_details,
+    DocumentType.AADHAAR_CARD.value: parse_aadhaar_details,
+}
+
+
+def _normalise(name: str | None) -> str:
+    return " ".join((name or "").upper().split())
+
+
+def run_mode(samples: list[dict], mode: str) -> dict:
+    # Load the model outside of the timed section.
+    find_person_names("warm up", mode)
+
+    latencies, correct = [], 0
+    for sample in samples:
+        started = time.perf_counter()
+        names = find_person_names(sample["text"], mode)
+        data = PARSERS[sample["document_type"]](sample["text"], names)
+        latencies.append(time.perf_counter() - started)
+        correct += _normalise(data.name) == _normalise(sample["name"])
+
+    started = time.perf_counter()
+    find_person_names_batch([sample["text"] for sample in samples], mode)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "samples": len(samples),
+        "name_accuracy": correct / len(samples),
+        "latency_ms_mean": statistics.mean(latencies) * 1000,
+        "latency_ms_p50": percentile(latencies, 0.50) * 1000,
+        "latency_ms_p95": percentile(latencies, 0.95) * 1000,
+        "batched_docs_per_second": len(samples) / batch_seconds if batch_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", help="JSONL file of labelled OCR texts")
+    parser.add_argument("--modes", nargs="+", choices=NER_MODES, default=list(NER_MODES))
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with open(args.samples, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    samples = [s for s in samples if s["document_type"] in PARSERS]
+    if not samples:
+        parser.error("No PAN or Aadhaar samples found.")
+
+    results = [run_mode(samples, mode) for mode in args.modes]
+    for result in results:
+        print(
+            f"{result['mode']:>5}: accuracy {result['name_accuracy']:.1%}, "
+            f"p50 {result['latency_ms_p50']:.1f} ms, p95 {result['latency_ms_p95']:.1f} ms, "
+            f"batched {result['batched_docs_per_second']:.0f} docs/s"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
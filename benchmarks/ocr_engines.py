@@ -0,0 +1,106 @@
+"""
+Accuracy and latency of the OCR engines (OCR_ENGINE) on synthetic cards.
+
+Usage:
+
+    python -m benchmarks.ocr_engines [--engines easyocr,easyocr-fp32,onnx,onnx-int8] \\
+        [--threads 1,4] [--count 60] [--dataset DIR] [--output results.json]
+
+Every engine runs in a fresh process once per intra-op thread count, so that
+memory and thread settings do not carry over between runs. Reported per run,
+as `<engine>.t<threads>.<metric>`:
+
+    load.seconds       loading the readers (the first onnx run also exports the graphs)
+    memory.rss_bytes   resident memory once the readers are loaded
+    stage.readtext     OCR alone, English + Hindi, on the preprocessed image
+    stage.end_to_end   pipeline.process_document
+    accuracy.*         document type and field accuracy against the ground truth, and
+                       text_agreement: similarity of the OCR text to the first engine's
+
+Run on the hardware and thread count a deployment will use; the ranking of
+the engines depends on both.
+"""
+import argparse
+import difflib
+import multiprocessing
+import time
+
+from benchmarks import compare, synthetic
+from benchmarks.stats import FieldAccuracy, flatten, summarize, write_results
+
+ENGINES = ("easyocr", "easyocr-fp32", "onnx", "onnx-int8")
+
+
+def run_engine(engine: str, threads: int, cards: list[synthetic.SyntheticCard]) -> tuple[dict, list[str]]:
+    """Runs in its own process. Returns the metrics and the OCR text of every card."""
+    from app import config
+    config.OCR_ENGINE = engine
+    config.OCR_INTRA_OP_THREADS = threads
+    from app.services import model_registry, pipeline
+    from app.services.ocr_service import FULL_LANGUAGES, preprocess_for_easyocr, read_ocr
+
+    started = time.perf_counter()
+    model_registry.warm_up()
+    load_seconds = time.perf_counter() - started
+    rss = model_registry.rss_bytes()
+
+    readtext, end_to_end, texts = [], [], []
+    accuracy = FieldAccuracy()
+    classified = 0
+    for card in cards:
+        image = preprocess_for_easyocr(card.image_bytes)
+        started = time.perf_counter()
+        texts.append(read_ocr(image, FULL_LANGUAGES).text)
+        readtext.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        output = pipeline.process_document(card.image_bytes)
+        end_to_end.append(time.perf_counter() - started)
+        classified += output.document_type.value == card.document_type
+        accuracy.add(card.document_type, card.fields, output.data.model_dump() if output.data is not None else None)
+
+    metrics = {"load.seconds": load_seconds, "memory.rss_bytes": rss}
+    metrics.update(flatten("stage.readtext", summarize(readtext)))
+    metrics.update(flatten("stage.end_to_end", summarize(end_to_end)))
+    metrics["accuracy.document_type"] = classified / len(cards)
+    metrics.update(accuracy.metrics())
+    return metrics, texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic.add_dataset_arguments(parser)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--threads", default="1", help="Comma-separated intra-op thread counts")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    cards = synthetic.cards_from_arguments(args)
+    engines = args.engines.split(",")
+    thread_counts = [int(threads) for threads in args.threads.split(",")]
+    spawn = multiprocessing.get_context("spawn")
+
+    metrics, reference = {}, None
+    for engine in engines:
+        for threads in thread_counts:
+            with spawn.Pool(1) as pool:
+                result, texts = pool.apply(run_engine, (engine, threads, cards))
+            reference = reference or texts
+            result["accuracy.text_agreement"] = sum(
+                difflib.SequenceMatcher(None, text, expected).ratio() for text, expected in zip(texts, reference)
+            ) / len(texts)
+            metrics.update({f"{engine}.t{threads}.{name}": value for name, value in result.items()})
+
+    results = write_results(args.output, "ocr_engines", metrics, {
+        "cards": len(cards), "dataset": args.dataset, "seed": args.seed,
+        "engines": engines, "threads": thread_counts, "reference_engine": engines[0],
+    })
+    for name, value in metrics.items():
+        print(f"{name:<60} {value:.4g}")
+    compare.exit_on_regression(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Memory per API worker: workers that each load their own models versus
+workers forked from a master that loaded them once (`python -m app.serve`).
+
+Usage:
+
+    python -m benchmarks.prefork [--workers 4] [--count 6] [--node-memory-gb 16] \\
+        [--modes independent,prefork] [--output results.json]
+
+In each mode `--workers` processes load every model and OCR the synthetic
+cards, so that the pages a real worker dirties while serving are counted.
+All processes are then measured together from /proc (Linux only):
+
+- independent: every worker is started fresh and loads its own models, as
+  with `uvicorn --workers N` or the spawn-based OCR pool;
+- prefork: a master loads the models, freezes the heap and forks the workers.
+
+The cost of a worker is its USS (private memory). What all processes share
+is paid once per node. Workers per node = (node memory - shared) / USS.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from benchmarks import compare, synthetic
+from benchmarks.stats import write_results
+
+MODES = ("independent", "prefork")
+
+
+def _serve_cards(images: list[bytes], torch_threads: int, ready, stop):
+    """Body of one worker: models, a few documents, then idle until measured."""
+    from app.services import model_registry, pipeline
+    model_registry.limit_threads(torch_threads)
+    model_registry.warm_up()
+    for image_bytes in images:
+        pipeline.process_document(image_bytes)
+    ready.put(("worker", os.getpid()))
+    stop.wait()
+
+
+def _prefork_master(workers: int, images: list[bytes], torch_threads: int, ready, stop):
+    from app.serve import load_shared_state
+    load_shared_state(torch_threads)
+    fork = multiprocessing.get_context("fork")
+    children = [fork.Process(target=_serve_cards, args=(images, torch_threads, ready, stop)) for _ in range(workers)]
+    for child in children:
+        child.start()
+    ready.put(("master", os.getpid()))
+    for child in children:
+        child.join()
+
+
+def measure(mode: str, workers: int, images: list[bytes], torch_threads: int) -> dict:
+    from app.services.model_registry import memory_usage
+    spawn = multiprocessing.get_context("spawn")
+    ready, stop = spawn.SimpleQueue(), spawn.Event()
+    if mode == "prefork":
+        processes = [spawn.Process(target=_prefork_master, args=(workers, images, torch_threads, ready, stop))]
+        expected = workers + 1
+    else:
+        processes = [spawn.Process(target=_serve_cards, args=(images, torch_threads, ready, stop))
+                     for _ in range(workers)]
+        expected = workers
+
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    reports = [ready.get() for _ in range(expected)]
+    startup_seconds = time.perf_counter() - started
+    try:
+        usage = {pid: memory_usage(pid) for _, pid in reports}
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+
+    worker_usage = [usage[pid] for role, pid in reports if role == "worker"]
+    if any(u["uss_bytes"] is None for u in usage.values()):
+        raise SystemExit("Measuring USS needs /proc/<pid>/smaps_rollup (Linux 4.14+).")
+    total_pss = sum(u["pss_bytes"] for u in usage.values())
+    mean_uss = sum(u["uss_bytes"] for u in worker_usage) / len(worker_usage)
+    return {
+        "startup_seconds": startup_seconds,
+        "total_pss_bytes": total_pss,
+        "worker_rss_bytes": sum(u["rss_bytes"] for u in worker_usage) / len(worker_usage),
+        "worker_pss_bytes": sum(u["pss_bytes"] for u in worker_usage) / len(worker_usage),
+        "worker_uss_bytes": mean_uss,
+        # Everything that is not some worker's private memory, paid once per node.
+        "shared_bytes": total_pss - mean_uss * len(worker_usage),
+    }
+
+
+def _node_memory_bytes() -> int | None:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic.add_dataset_arguments(parser)
+    parser.set_defaults(count=6)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--torch-threads", type=int, default=0, help="Per worker (0: cores / workers)")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--node-memory-gb", type=float, help="Default: this machine's memory")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    images = [card.image_bytes for card in synthetic.cards_from_arguments(args)]
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    node_memory = args.node_memory_gb * 2**30 if args.node_memory_gb else _node_memory_bytes()
+
+    metrics = {}
+    for mode in args.modes.split(","):
+        result = measure(mode, args.workers, images, torch_threads)
+        if node_memory:
+            result["workers_per_node"] = int((node_memory - result["shared_bytes"]) // result["worker_uss_bytes"])
+        metrics.update({f"{mode}.{name}": value for name, value in result.items()})
+
+    results = write_results(args.output, "prefork", metrics, {
+        "workers": args.workers, "torch_threads": torch_threads, "documents_per_worker": len(images),
+        "node_memory_bytes": node_memory,
+    })
+    for name, value in metrics.items():
+        print(f"{name:<55} {value:.4g}")
+    compare.exit_on_regression(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Per-stage and end-to-end benchmark of the document pipeline on synthetic cards.
+
+Usage:
+
+    python -m benchmarks.stages [--count 60] [--dataset DIR] [--scene] [--output results.json] \\
+        [--baseline baseline.json]
+
+Every stage is timed on its own, on each card:
+
+    preprocess     preprocess_for_easyocr (decode + deskew)
+    deskew         deskew_image on the decoded image
+    readtext       reader.readtext with English + Hindi on the preprocessed image
+    detect_cards   find_cards on the decoded photo
+    warp           warp_card of the largest card found
+    readtext_card  reader.readtext on that card's crop (cards found only)
+    classify       classify_document on that text
+    parse          the parse_*_details function of the card's true type
+    end_to_end     pipeline.process_document, as run by the API workers
+
+Field-level accuracy is measured on the end-to-end output against the card's
+ground truth. Models are loaded before timing starts.
+
+`cards.found` is the fraction of images a card was found in, and
+`pixels.card_ratio` the mean size of its crop relative to the preprocessed
+image readtext runs on. With `--scene` (cards photographed on a table),
+compare readtext with readtext_card for what cropping saves.
+"""
+import argparse
+import time
+
+from benchmarks import compare, synthetic
+from benchmarks.stats import FieldAccuracy, flatten, peak_rss_bytes, summarize, write_results
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def run(cards: list[synthetic.SyntheticCard]) -> dict:
+    from app.services import pipeline
+    from app.services.document_classifier import classify_document
+    from app.services.model_registry import warm_up
+    from app.services.card_detection import find_cards, warp_card
+    from app.services.ocr_service import FULL_LANGUAGES, deskew_image, load_reader, preprocess_for_easyocr
+    from app.services.preprocessing import DEFAULT_CONFIG, decode_image, preprocess_image
+    from app.services.pan_parser import parse_pan_details
+    from app.services.aadhaar_parser import parse_aadhaar_details
+    from app.services.voter_id_parser import parse_voter_id_details
+
+    parsers = {
+        "PAN_CARD": parse_pan_details,
+        "AADHAAR_CARD": parse_aadhaar_details,
+        "VOTER_ID_CARD": parse_voter_id_details,
+    }
+    warm_up()
+    reader = load_reader(FULL_LANGUAGES)
+
+    timings: dict[str, list[float]] = {name: [] for name in (
+        "preprocess", "deskew", "readtext", "detect_cards", "warp", "readtext_card", "classify", "parse", "end_to_end",
+    )}
+    accuracy = FieldAccuracy()
+    classified = 0
+    card_ratios = []
+    started = time.perf_counter()
+    for card in cards:
+        image, seconds = _timed(preprocess_for_easyocr, card.image_bytes)
+        timings["preprocess"].append(seconds)
+
+        decoded = decode_image(card.image_bytes, DEFAULT_CONFIG.max_side, DEFAULT_CONFIG.reduced_decode)
+        _, seconds = _timed(deskew_image, decoded)
+        timings["deskew"].append(seconds)
+
+        results, seconds = _timed(reader.readtext, image)
+        timings["readtext"].append(seconds)
+        text = "\n".join(result[1] for result in results)
+
+        photo = preprocess_image(card.image_bytes, pipeline.CARD_DECODE).image
+        found, seconds = _timed(find_cards, photo, 1)
+        timings["detect_cards"].append(seconds)
+        if found:
+            crop, seconds = _timed(warp_card, photo, found[0])
+            timings["warp"].append(seconds)
+            _, seconds = _timed(reader.readtext, crop)
+            timings["readtext_card"].append(seconds)
+            card_ratios.append(crop.shape[0] * crop.shape[1] / (image.shape[0] * image.shape[1]))
+
+        _, seconds = _timed(classify_document, text)
+        timings["classify"].append(seconds)
+
+        _, seconds = _timed(parsers[card.document_type], text)
+        timings["parse"].append(seconds)
+
+        output, seconds = _timed(pipeline.process_document, card.image_bytes)
+        timings["end_to_end"].append(seconds)
+        classified += output.document_type.value == card.document_type
+        actual = output.data.model_dump() if output.data is not None else None
+        accuracy.add(card.document_type, card.fields, actual)
+    wall_seconds = time.perf_counter() - started
+
+    metrics = {}
+    for stage, latencies in timings.items():
+        metrics.update(flatten(f"stage.{stage}", summarize(latencies)))
+    metrics["cards.found"] = len(card_ratios) / len(cards)
+    if card_ratios:
+        metrics["pixels.card_ratio"] = sum(card_ratios) / len(card_ratios)
+    metrics["run.wall_seconds"] = wall_seconds
+    metrics["memory.peak_rss_bytes"] = peak_rss_bytes()
+    metrics["accuracy.document_type"] = classified / len(cards)
+    metrics.update(accuracy.metrics())
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic.add_dataset_arguments(parser)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    cards = synthetic.cards_from_arguments(args)
+    metrics = run(cards)
+    results = write_results(args.output, "stages", metrics, {
+        "cards": len(cards), "dataset": args.dataset, "seed": args.seed,
+        "max_skew": args.max_skew, "noise": args.noise, "widths": [args.min_width, args.max_width],
+        "scene": args.scene,
+    })
+    for name, value in metrics.items():
+        print(f"{name:<55} {value:.4g}")
+    compare.exit_on_regression(results, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
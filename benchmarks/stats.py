@@ -0,0 +1,104 @@
+"""
+Shared helpers for the benchmarks: latency summaries, memory, accuracy and
+the machine-readable result files.
+
+Result files are JSON with a flat `metrics` mapping, so that two runs can be
+compared metric by metric (see `benchmarks.compare`).
+"""
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies: list[float], wall_seconds: float | None = None) -> dict:
+    """
+    Latency percentiles in milliseconds. Throughput is derived from the wall
+    time if given (concurrent runs), otherwise from the summed latencies.
+    """
+    if not latencies:
+        return {"count": 0}
+    total = wall_seconds if wall_seconds is not None else sum(latencies)
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "docs_per_second": len(latencies) / total if total else None,
+    }
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def normalise(value) -> str:
+    return " ".join(str(value or "").upper().split())
+
+
+class FieldAccuracy:
+    """Counts exact matches (after normalisation) per document type and field."""
+
+    def __init__(self):
+        self._counts: dict[tuple[str, str], list[int]] = {}
+
+    def add(self, document_type: str, expected: dict, actual: dict | None):
+        actual = actual or {}
+        for field, value in expected.items():
+            counts = self._counts.setdefault((document_type, field), [0, 0])
+            counts[0] += normalise(actual.get(field)) == normalise(value)
+            counts[1] += 1
+
+    def metrics(self, prefix: str = "accuracy") -> dict[str, float]:
+        result = {}
+        for (document_type, field), (correct, total) in sorted(self._counts.items()):
+            result[f"{prefix}.{document_type}.{field}"] = correct / total
+        if self._counts:
+            result[f"{prefix}.overall"] = (
+                sum(c for c, _ in self._counts.values()) / sum(t for _, t in self._counts.values())
+            )
+        return result
+
+
+def flatten(prefix: str, summary: dict) -> dict[str, float]:
+    return {f"{prefix}.{key}": value for key, value in summary.items() if value is not None}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str | None, benchmark: str, metrics: dict, parameters: dict) -> dict:
+    results = {
+        "benchmark": benchmark,
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "parameters": parameters,
+        "metrics": metrics,
+    }
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return results
@@ -0,0 +1,304 @@
+"""
+Synthetic PAN, Aadhaar and Voter ID card images with known ground truth.
+
+Cards are drawn with PIL from random (seeded) identities, then scaled,
+rotated and degraded with noise and JPEG compression, so the same seed
+always produces the same dataset. With `--scene`, each card is instead
+photographed lying on a table: in perspective, covering a fifth to a third
+of the frame, next to printed text that is not part of the card.
+
+Usage:
+
+    python -m benchmarks.synthetic out_dir [--count 300] [--seed 7] [--scene] \\
+        [--font DejaVuSans.ttf] [--devanagari-font NotoSansDevanagari-Regular.ttf]
+
+writes `out_dir/<key>.jpg` for every card and `out_dir/truth.jsonl` with
+one line per card: {"key", "document_type", "fields"}.
+
+Hindi text needs a Devanagari font. PIL only shapes conjuncts correctly if
+it was built with libraqm; otherwise the Hindi lines are still drawn, just
+less faithfully.
+"""
+import argparse
+import io
+import json
+import os
+import random
+from dataclasses import dataclass, field
+
+FIRST_NAMES = ["RAHUL", "PRIYA", "AMIT", "SNEHA", "VIKRAM", "ANJALI", "ARJUN", "KAVITA", "SURESH", "MEERA"]
+LAST_NAMES = ["SHARMA", "VERMA", "PATEL", "IYER", "REDDY", "GUPTA", "SINGH", "NAIR", "JOSHI", "MEHTA"]
+HINDI_NAMES = ["राहुल शर्मा", "प्रिया वर्मा", "अमित पटेल", "स्नेहा अय्यर", "विक्रम रेड्डी"]
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+DEVANAGARI_FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/truetype/lohit-devanagari/Lohit-Devanagari.ttf",
+    "C:\\Windows\\Fonts\\Nirmala.ttf",
+]
+
+CARD_SIZE = (1000, 630)
+# Frame of a scene photo (see `Degradation.scene`), and the printed matter around the card.
+SCENE_SIZE = (1600, 1200)
+DISTRACTOR_WORDS = ["RECEIPT", "TOTAL", "AMOUNT", "DATE", "INVOICE", "NEWS", "MARKET", "CITY", "PAGE", "RS."]
+
+
+@dataclass
+class SyntheticCard:
+    key: str
+    document_type: str
+    fields: dict
+    image_bytes: bytes = field(repr=False)
+
+
+@dataclass
+class Degradation:
+    # Output width range in pixels; the card keeps its aspect ratio.
+    widths: tuple[int, int] = (640, 2000)
+    max_skew_degrees: float = 8.0
+    noise_sigma: float = 8.0
+    jpeg_quality: tuple[int, int] = (60, 95)
+    # Photograph the card on a table instead of filling the image with it.
+    # The frame is SCENE_SIZE; `max_skew_degrees` applies to the card within it.
+    scene: bool = False
+
+
+def _find_font(explicit: str | None, candidates: list[str]) -> str | None:
+    if explicit:
+        return explicit
+    return next((path for path in candidates if os.path.exists(path)), None)
+
+
+class Fonts:
+    def __init__(self, latin: str | None = None, devanagari: str | None = None):
+        self._latin = _find_font(latin, FONT_CANDIDATES)
+        self._devanagari = _find_font(devanagari, DEVANAGARI_FONT_CANDIDATES)
+        self._cache = {}
+
+    def get(self, size: int, hindi: bool = False):
+        from PIL import ImageFont
+        path = self._devanagari if hindi else self._latin
+        if (path, size) not in self._cache:
+            self._cache[(path, size)] = (
+                ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+            )
+        return self._cache[(path, size)]
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _date(rng: random.Random) -> str:
+    return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2005)}"
+
+
+def _pan_card(rng: random.Random) -> tuple[list[tuple[str, int, bool]], dict]:
+    pan = "".join(rng.choices(LETTERS, k=5)) + f"{rng.randint(0, 9999):04d}" + rng.choice(LETTERS)
+    name, dob = _name(rng), _date(rng)
+    lines = [
+        ("INCOME TAX DEPARTMENT", 34, False),
+        ("GOVT. OF INDIA", 30, False),
+        ("Permanent Account Number", 24, False),
+        (pan, 40, False),
+        ("Name", 20, False),
+        (name, 32, False),
+        ("Father's Name", 20, False),
+        (_name(rng).split()[0] + " " + name.split()[1], 28, False),
+        ("Date of Birth", 20, False),
+        (dob, 30, False),
+    ]
+    return lines, {"pan_number": pan, "name": name, "date_of_birth": dob}
+
+
+def _aadhaar_card(rng: random.Random) -> tuple[list[tuple[str, int, bool]], dict]:
+    number = f"{rng.randint(2000, 9999)} {rng.randint(0, 9999):04d} {rng.randint(0, 9999):04d}"
+    name, dob = _name(rng), _date(rng)
+    gender = rng.choice(["Male", "Female"])
+    lines = [
+        ("भारत सरकार", 32, True),
+        ("GOVERNMENT OF INDIA", 32, False),
+        (name, 32, False),
+        (f"DOB: {dob}", 28, False),
+        (gender.upper(), 28, False),
+        (number, 44, False),
+        ("आधार - आम आदमी का अधिकार", 26, True),
+    ]
+    truth = {"aadhaar_number": number.replace(" ", ""), "name": name, "date_of_birth": dob, "gender": gender}
+    return lines, truth
+
+
+def _voter_id_card(rng: random.Random) -> tuple[list[tuple[str, int, bool]], dict]:
+    voter_id = "".join(rng.choices(LETTERS, k=3)) + f"{rng.randint(0, 9999999):07d}"
+    name, name_hindi = _name(rng), rng.choice(HINDI_NAMES)
+    lines = [
+        ("ELECTION COMMISSION OF INDIA", 32, False),
+        ("भारत निर्वाचन आयोग", 30, True),
+        (voter_id, 40, False),
+        (f"नाम: {name_hindi}", 28, True),
+        (f"Name: {name}", 28, False),
+        (f"Date of Birth: {_date(rng)}", 24, False),
+    ]
+    return lines, {"voter_id": voter_id, "name": name, "name_hindi": name_hindi}
+
+
+GENERATORS = {
+    "PAN_CARD": _pan_card,
+    "AADHAAR_CARD": _aadhaar_card,
+    "VOTER_ID_CARD": _voter_id_card,
+}
+
+
+def _scene(card, fonts: Fonts, rng: random.Random, degradation: Degradation):
+    """The card lying on a table, in perspective, among unrelated printed text."""
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    frame_width, frame_height = SCENE_SIZE
+    shade = rng.randint(40, 150)
+    table = Image.new("RGB", SCENE_SIZE, (shade, int(shade * rng.uniform(0.7, 1.0)), int(shade * rng.uniform(0.5, 0.9))))
+    draw = ImageDraw.Draw(table)
+    for _ in range(rng.randint(2, 6)):
+        x, y = rng.randint(0, frame_width - 300), rng.randint(0, frame_height - 60)
+        text = " ".join(rng.choices(DISTRACTOR_WORDS, k=3)) + f" {rng.randint(10, 99999)}"
+        draw.text((x, y), text, fill=(230, 230, 220), font=fonts.get(rng.randint(22, 36)))
+
+    # Between a fifth and a third of the frame, at the given skew, with the
+    # far edge foreshortened as when shot at an angle.
+    width = frame_width * rng.uniform(0.48, 0.62)
+    height = width * CARD_SIZE[1] / CARD_SIZE[0]
+    tilt = rng.uniform(0.0, 0.08) * width
+    corners = np.array([[-width / 2 + tilt, -height / 2], [width / 2 - tilt, -height / 2],
+                        [width / 2, height / 2], [-width / 2, height / 2]])
+    angle = np.radians(rng.uniform(-degradation.max_skew_degrees, degradation.max_skew_degrees))
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    margin_x, margin_y = frame_width / 2 - width * 0.6, frame_height / 2 - width * 0.45
+    centre = np.array([frame_width / 2 + rng.uniform(-margin_x, margin_x),
+                       frame_height / 2 + rng.uniform(-margin_y, margin_y)])
+    corners = (corners @ rotation.T + centre).astype(np.float32)
+
+    source = np.array([[0, 0], [card.width, 0], [card.width, card.height], [0, card.height]], np.float32)
+    matrix = cv2.getPerspectiveTransform(source, corners)
+    warped = cv2.warpPerspective(np.asarray(card), matrix, SCENE_SIZE, flags=cv2.INTER_AREA)
+    mask = cv2.warpPerspective(np.full((card.height, card.width), 255, np.uint8), matrix, SCENE_SIZE)
+    pixels = np.asarray(table).copy()
+    pixels[mask > 0] = warped[mask > 0]
+    return Image.fromarray(pixels)
+
+
+def render_card(lines: list[tuple[str, int, bool]], fonts: Fonts, rng: random.Random,
+                degradation: Degradation) -> bytes:
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    card = Image.new("RGB", CARD_SIZE, (rng.randint(225, 255), rng.randint(225, 255), rng.randint(215, 250)))
+    draw = ImageDraw.Draw(card)
+    y = 40
+    for text, size, hindi in lines:
+        draw.text((60, y), text, fill=(20, 20, 30), font=fonts.get(size, hindi))
+        y += int(size * 1.6)
+
+    if degradation.scene:
+        card = _scene(card, fonts, rng, degradation)
+    else:
+        width = rng.randint(*degradation.widths)
+        card = card.resize((width, round(width * CARD_SIZE[1] / CARD_SIZE[0])), Image.LANCZOS)
+        if degradation.max_skew_degrees:
+            angle = rng.uniform(-degradation.max_skew_degrees, degradation.max_skew_degrees)
+            card = card.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=(255, 255, 255))
+    if degradation.noise_sigma:
+        pixels = np.asarray(card, dtype=np.float32)
+        noise = np.random.default_rng(rng.getrandbits(32)).normal(0, degradation.noise_sigma, pixels.shape)
+        card = Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    card.save(buffer, format="JPEG", quality=rng.randint(*degradation.jpeg_quality))
+    return buffer.getvalue()
+
+
+def generate_cards(count: int, seed: int = 7, fonts: Fonts | None = None,
+                   degradation: Degradation | None = None,
+                   document_types: tuple[str, ...] = tuple(GENERATORS)) -> list[SyntheticCard]:
+    """Generates `count` cards, cycling through `document_types`."""
+    rng = random.Random(seed)
+    fonts = fonts or Fonts()
+    degradation = degradation or Degradation()
+    cards = []
+    for i in range(count):
+        document_type = document_types[i % len(document_types)]
+        lines, truth = GENERATORS[document_type](rng)
+        cards.append(SyntheticCard(
+            key=f"{i:06d}_{document_type.lower()}",
+            document_type=document_type,
+            fields=truth,
+            image_bytes=render_card(lines, fonts, rng, degradation),
+        ))
+    return cards
+
+
+def load_dataset(directory: str) -> list[SyntheticCard]:
+    """Reads a dataset written by `save_dataset` (or by this module's CLI)."""
+    cards = []
+    with open(os.path.join(directory, "truth.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            with open(os.path.join(directory, f"{entry['key']}.jpg"), "rb") as image:
+                cards.append(SyntheticCard(entry["key"], entry["document_type"], entry["fields"], image.read()))
+    return cards
+
+
+def save_dataset(cards: list[SyntheticCard], directory: str):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "truth.jsonl"), "w", encoding="utf-8") as truth:
+        for card in cards:
+            with open(os.path.join(directory, f"{card.key}.jpg"), "wb") as image:
+                image.write(card.image_bytes)
+            truth.write(json.dumps(
+                {"key": card.key, "document_type": card.document_type, "fields": card.fields},
+                ensure_ascii=False,
+            ) + "\n")
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser, saved: bool = True):
+    """Options shared by every benchmark that generates its own cards."""
+    if saved:
+        parser.add_argument("--dataset", help="Directory written by benchmarks.synthetic (instead of generating)")
+    parser.add_argument("--count", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--font", help="TrueType font for Latin text")
+    parser.add_argument("--devanagari-font", help="TrueType font for Hindi text")
+    parser.add_argument("--max-skew", type=float, default=Degradation.max_skew_degrees)
+    parser.add_argument("--noise", type=float, default=Degradation.noise_sigma)
+    parser.add_argument("--min-width", type=int, default=Degradation.widths[0])
+    parser.add_argument("--max-width", type=int, default=Degradation.widths[1])
+    parser.add_argument("--scene", action="store_true",
+                        help="Photograph each card on a table with other printed text around it")
+
+
+def cards_from_arguments(args) -> list[SyntheticCard]:
+    if getattr(args, "dataset", None):
+        return load_dataset(args.dataset)
+    degradation = Degradation(
+        widths=(args.min_width, args.max_width), max_skew_degrees=args.max_skew, noise_sigma=args.noise,
+        scene=args.scene,
+    )
+    return generate_cards(args.count, args.seed, Fonts(args.font, args.devanagari_font), degradation)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Directory to write the dataset to")
+    add_dataset_arguments(parser, saved=False)
+    args = parser.parse_args()
+    save_dataset(cards_from_arguments(args), args.output)
+
+
+if __name__ == "__main__":
+    main()
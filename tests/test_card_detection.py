@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from app import config
+from app.services import pipeline
+from app.services.card_detection import CARD_ASPECT, card_width, find_cards, order_corners, warp_card
+
+
+def _rectangle(centre: tuple[float, float], width: float, height: float, degrees: float) -> np.ndarray:
+    """Corners of a rotated rectangle: top-left, top-right, bottom-right, bottom-left before the turn."""
+    corners = np.array([[-width / 2, -height / 2], [width / 2, -height / 2],
+                        [width / 2, height / 2], [-width / 2, height / 2]])
+    angle = np.radians(degrees)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    return (corners @ rotation.T + centre).astype(np.float32)
+
+
+def _photo(corners: np.ndarray, size: tuple[int, int] = (1600, 1200)) -> np.ndarray:
+    photo = np.full((size[1], size[0], 3), 60, np.uint8)
+    cv2.fillConvexPoly(photo, corners.astype(np.int32), (235, 240, 245))
+    return photo
+
+
+@pytest.mark.parametrize("degrees", [0, 10, 44, 45, 46, 80, 135, -45])
+def test_corners_are_ordered_clockwise_from_the_top_left(degrees):
+    corners = _rectangle((500, 400), 300, 190, degrees)
+    shuffled = corners[[2, 0, 3, 1]]
+    ordered = order_corners(shuffled)
+    assert len({tuple(point) for point in ordered.tolist()}) == 4
+    assert np.argmin(ordered.sum(axis=1)) == 0
+    # Clockwise on screen (y down): every turn has a positive cross product.
+    edges = np.roll(ordered, -1, axis=0) - ordered
+    turns = edges[:, 0] * np.roll(edges, -1, axis=0)[:, 1] - edges[:, 1] * np.roll(edges, -1, axis=0)[:, 0]
+    assert (turns > 0).all()
+
+
+def test_card_turned_45_degrees_is_warped_whole():
+    corners = _rectangle((800, 600), 700, 700 / CARD_ASPECT, 45)
+    found = find_cards(_photo(corners))
+    assert len(found) == 1
+    crop = warp_card(_photo(corners), found[0])
+    assert max(crop.shape[:2]) == config.CARD_CROP_WIDTH
+    # Only card inside the crop, no table: the quadrilateral did not fold over itself.
+    assert crop.mean() > 200
+
+
+def test_heavy_pass_warps_the_card_again_at_full_resolution():
+    large = _rectangle((1200, 900), 2000, 2000 / CARD_ASPECT, 5)
+    photo = _photo(large, (2400, 1800))
+    crop = warp_card(photo, large)
+    full = pipeline._full_crop(lambda: photo, large, crop)
+    assert card_width(large) == 2000
+    assert max(full.shape[:2]) == min(2000, config.PREPROCESS_MAX_SIDE)
+
+    small = _rectangle((400, 300), 600, 600 / CARD_ASPECT, 5)
+
+    def photo_not_needed():
+        raise AssertionError("the photo is only loaded for a larger warp")
+
+    small_crop = warp_card(_photo(small), small)
+    assert pipeline._full_crop(photo_not_needed, small, small_crop) is small_crop
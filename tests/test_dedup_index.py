@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import config
+from app.services.dedup_index import BloomFilter, DedupIndex, ScalableBloomFilter
+from app.services.document_classifier import DocumentType
+
+PAN = DocumentType.PAN_CARD
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeCollection:
+    """Serves `find` on `inserted_at` the way the KYC collections are queried."""
+
+    def __init__(self, records: list[dict]):
+        self.records = records
+
+    def find(self, query, projection=None):
+        bound = query.get("inserted_at", {}).get("$gte")
+        matching = [record for record in self.records
+                    if bound is None or (record.get("inserted_at") is not None and record["inserted_at"] >= bound)]
+        return _Cursor(matching)
+
+
+class _Cursor:
+    def __init__(self, records):
+        self.records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.records)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+def _numbers(prefix: str, count: int) -> list[str]:
+    return [f"{prefix}{i:08d}" for i in range(count)]
+
+
+def test_false_positive_rate_at_capacity():
+    bloom = BloomFilter(10_000, 0.01)
+    for number in _numbers("A", 10_000):
+        bloom.add(number)
+    assert bloom.is_full
+    assert all(number in bloom for number in _numbers("A", 10_000))
+    false_positives = sum(number in bloom for number in _numbers("B", 20_000))
+    assert false_positives / 20_000 < 0.015
+
+
+def test_filter_grows_stages_and_keeps_the_overall_rate():
+    scalable = ScalableBloomFilter(1_000, 0.01)
+    for number in _numbers("A", 7_000):
+        scalable.add(number)
+    # 1000 + 2000 + 4000: three full stages, each larger and stricter than the last.
+    assert [bloom.capacity for bloom in scalable.filters] == [1_000, 2_000, 4_000]
+    assert [bloom.fp_rate for bloom in scalable.filters] == pytest.approx([0.005, 0.0025, 0.00125])
+    assert len(scalable) == 7_000
+    assert all(number in scalable for number in _numbers("A", 7_000))
+    false_positives = sum(number in scalable for number in _numbers("B", 20_000))
+    assert false_positives / 20_000 < 0.01
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = DedupIndex(100, 0.01)
+    for number in _numbers("A", 250):
+        index.add(PAN, number)
+    index.loaded_until[PAN] = T0
+    path = str(tmp_path / "dedup.bin")
+    index.snapshot(path)
+
+    restored = DedupIndex(100, 0.01)
+    restored.restore(path)
+    assert restored.loaded_until == {PAN: T0}
+    assert len(restored.filters[PAN]) == 250
+    assert [bloom.bits for bloom in restored.filters[PAN].filters] == [bloom.bits for bloom in index.filters[PAN].filters]
+    with pytest.raises(ValueError):
+        DedupIndex(100, 0.02).restore(path)
+
+
+def test_catch_up_after_snapshot_finds_records_by_insertion_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "INDEX_CATCH_UP_SECONDS", 60)
+    path = str(tmp_path / "dedup.bin")
+    snapshotted = DedupIndex(100, 0.01)
+    asyncio.run(snapshotted.warm_up({PAN: (FakeCollection([
+        {"pan_number": "AAAAA0001A", "inserted_at": T0},
+    ]), "pan_number")}))
+    snapshotted.snapshot(path)
+
+    # Stored by other processes: one became visible late, with an earlier
+    # stamp than the newest record the snapshot holds.
+    collection = FakeCollection([
+        {"pan_number": "AAAAA0001A", "inserted_at": T0},
+        {"pan_number": "BBBBB0002B", "inserted_at": T0 - timedelta(seconds=5)},
+        {"pan_number": "CCCCC0003C", "inserted_at": T0 + timedelta(seconds=30)},
+        {"pan_number": "DDDDD0004D", "inserted_at": T0 - timedelta(hours=1)},
+    ])
+    index = DedupIndex(100, 0.01)
+    asyncio.run(index.warm_up({PAN: (collection, "pan_number")}, path))
+    assert index.ready
+    assert not index.is_definitely_new(PAN, "BBBBB0002B")
+    assert not index.is_definitely_new(PAN, "CCCCC0003C")
+    # Older than the catch-up window: the snapshot is trusted to hold it.
+    assert index.is_definitely_new(PAN, "DDDDD0004D")
+    # The record already in the snapshot is not counted twice.
+    assert len(index.filters[PAN]) == 3
+    assert index.loaded_until[PAN] == T0 + timedelta(seconds=30)
@@ -0,0 +1,35 @@
+from app.services.field_engine import DocumentType, analyze
+from app.services.ocr_types import OCRLine, OCRResult
+
+# What the PAN layout template reads: the header band ("INCOME TAX
+# DEPARTMENT / GOVT. OF INDIA") is dropped, and the label above the number
+# was recognised with the number region's allowlist, which has no space.
+PAN_TEMPLATE_TEXT = "PERMANENTACCOUNTNUMBERCARD\nABCDE1234F\nName\nRAHUL SHARMA\nDate of Birth\n01/02/1990"
+AADHAAR_TEMPLATE_TEXT = "Rahul Sharma\nDOB: 01/02/1990\nMale\n1234 5678 9012"
+
+
+def _ocr(text: str, read_as: DocumentType | None = None) -> OCRResult:
+    lines = [OCRLine(text=line, confidence=0.9) for line in text.split("\n")]
+    return OCRResult(lines, read_as=read_as.value if read_as else None)
+
+
+def test_template_text_alone_does_not_classify():
+    # Why templated reads must carry their type.
+    assert analyze(PAN_TEMPLATE_TEXT).document_type == DocumentType.UNKNOWN
+
+
+def test_template_text_keeps_the_type_it_was_read_as():
+    analysis = analyze(PAN_TEMPLATE_TEXT, _ocr(PAN_TEMPLATE_TEXT, DocumentType.PAN_CARD))
+    assert analysis.document_type == DocumentType.PAN_CARD
+    assert analysis.fields["pan_number"] == "ABCDE1234F"
+    assert analysis.fields["pan_date_of_birth"] == "01/02/1990"
+
+
+def test_aadhaar_template_text_keeps_its_type():
+    analysis = analyze(AADHAAR_TEMPLATE_TEXT, _ocr(AADHAAR_TEMPLATE_TEXT, DocumentType.AADHAAR_CARD))
+    assert analysis.document_type == DocumentType.AADHAAR_CARD
+
+
+def test_untemplated_text_is_classified():
+    text = "INCOME TAX DEPARTMENT\nGOVT. OF INDIA\n" + PAN_TEMPLATE_TEXT
+    assert analyze(text, _ocr(text)).document_type == DocumentType.PAN_CARD
@@ -0,0 +1,61 @@
+from app.services.document_classifier import DocumentType
+from app.services.identity_index import IdentityIndex, phonetic_key
+
+PAN = DocumentType.PAN_CARD
+AADHAAR = DocumentType.AADHAAR_CARD
+
+
+def _index(max_block: int = 1000, min_score: float = 0.75) -> IdentityIndex:
+    index = IdentityIndex(max_block, min_score, max_matches=5)
+    index.ready = True
+    return index
+
+
+def test_phonetic_key_folds_spelling_variants():
+    assert phonetic_key("SHARMA") == phonetic_key("SHARMAA") == "S650"
+    assert phonetic_key("PHANI") == phonetic_key("FANI")
+    assert phonetic_key("VIJAY") == phonetic_key("WIJAY")
+
+
+def test_number_with_an_ocr_error_matches():
+    index = _index()
+    index.add(PAN, {"pan_number": "ABCDE1234F", "name": "RAHUL SHARMA", "date_of_birth": "01/02/1990"})
+    index.add(PAN, {"pan_number": "PQRST6789U", "name": "ANITA DESAI", "date_of_birth": "11/12/1985"})
+
+    matches = index.match(PAN, {"pan_number": "ABCDE1284F", "name": "RAHUL SHARMA", "date_of_birth": "01/02/1990"})
+    assert [match.number for match in matches] == ["ABCDE1234F"]
+    assert matches[0].matched_on == ["number", "name", "date_of_birth"]
+
+
+def test_name_and_date_of_birth_match_across_document_types():
+    index = _index()
+    index.add(AADHAAR, {"aadhaar_number": "123412341234", "name": "Rahul Sharma", "date_of_birth": "01/02/1990"})
+
+    matches = index.match(PAN, {"pan_number": "ZZZZZ9999Z", "name": "SHARMA RAHUL", "date_of_birth": "01/02/1990"})
+    assert len(matches) == 1
+    assert (matches[0].document_type, matches[0].number) == (AADHAAR, "123412341234")
+    assert matches[0].score >= 0.75
+
+
+def test_name_alone_scores_below_the_threshold():
+    query = {"pan_number": "ZZZZZ9999Z", "name": "RAHUL SHARMA"}
+    index = _index()
+    index.add(AADHAAR, {"aadhaar_number": "123412341234", "name": "RAHUL SHARMA"})
+    assert index.match(PAN, query) == []
+
+    # The record is found by its name key; only its score keeps it out.
+    lenient = _index(min_score=0.5)
+    lenient.add(AADHAAR, {"aadhaar_number": "123412341234", "name": "RAHUL SHARMA"})
+    matches = lenient.match(PAN, query)
+    assert len(matches) == 1 and matches[0].score < 0.75
+
+
+def test_oversized_blocks_are_skipped():
+    index = _index(max_block=3)
+    for i in range(5):
+        index.add(PAN, {"pan_number": f"ABCDE{i:04d}F", "name": "RAHUL SHARMA", "date_of_birth": "01/02/1990"})
+
+    assert index.match(AADHAAR, {"aadhaar_number": "123412341234", "name": "RAHUL SHARMA",
+                                 "date_of_birth": "01/02/1990"}) == []
+    assert index.counters["skipped_blocks"] > 0
+    assert index.counters["candidates"] == 0
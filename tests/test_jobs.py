@@ -0,0 +1,188 @@
+import asyncio
+from datetime import timedelta
+
+from pydantic import BaseModel
+
+from app.services import jobs
+
+
+class Result(BaseModel):
+    value: int
+
+
+async def _succeed(image_bytes: bytes) -> Result:
+    await asyncio.sleep(0.01)
+    return Result(value=len(image_bytes))
+
+
+async def _fail(image_bytes: bytes) -> Result:
+    raise jobs.JobFailed("Could not extract text.")
+
+
+def _runner(store=None, handler=_succeed, **kwargs) -> jobs.JobRunner:
+    return jobs.JobRunner(store or jobs.InMemoryJobStore(), jobs.InProcessQueue(), handler,
+                          poll_interval=0.05, **kwargs)
+
+
+def test_submitted_job_succeeds():
+    async def main():
+        runner = _runner()
+        await runner.start()
+        job = await runner.submit(b"abc", "card.jpg")
+        assert job["status"] == jobs.QUEUED
+        finished = await runner.wait(job["_id"], 2.0)
+        await runner.stop()
+        return finished
+
+    job = asyncio.run(main())
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["result"] == {"value": 3}
+    # The upload and the lease are dropped once the job has finished.
+    assert "image" not in job and "lease_owner" not in job
+
+
+def test_job_failed_is_reported():
+    async def main():
+        runner = _runner(handler=_fail)
+        await runner.start()
+        job = await runner.submit(b"abc")
+        finished = await runner.wait(job["_id"], 2.0)
+        await runner.stop()
+        return finished
+
+    job = asyncio.run(main())
+    assert job["status"] == jobs.FAILED
+    assert job["error"] == "Could not extract text."
+
+
+def test_wait_returns_current_state_on_timeout():
+    async def main():
+        gate = asyncio.Event()
+
+        async def blocked(image_bytes):
+            await gate.wait()
+            return Result(value=1)
+
+        runner = _runner(handler=blocked)
+        await runner.start()
+        job = await runner.submit(b"x")
+        running = await runner.wait(job["_id"], 0.1)
+        gate.set()
+        finished = await runner.wait(job["_id"], 2.0)
+        await runner.stop()
+        return running, finished
+
+    running, finished = asyncio.run(main())
+    assert running["status"] == jobs.RUNNING
+    assert finished["status"] == jobs.SUCCEEDED
+
+
+def test_waiter_timing_out_does_not_strand_other_waiters():
+    async def main():
+        gate = asyncio.Event()
+
+        async def blocked(image_bytes):
+            await gate.wait()
+            return Result(value=1)
+
+        # A long poll interval, so the second waiter relies on the completion event.
+        runner = jobs.JobRunner(jobs.InMemoryJobStore(), jobs.InProcessQueue(), blocked, poll_interval=30)
+        await runner.start()
+        job = await runner.submit(b"x")
+        patient = asyncio.create_task(runner.wait(job["_id"], 30))
+        await runner.wait(job["_id"], 0.05)
+        gate.set()
+        finished = await asyncio.wait_for(patient, 2.0)
+        await runner.stop()
+        return finished, runner
+
+    finished, runner = asyncio.run(main())
+    assert finished["status"] == jobs.SUCCEEDED
+    assert not runner._finished and not runner._waiters
+
+
+def test_job_is_claimed_once():
+    async def main():
+        store = jobs.InMemoryJobStore()
+        first, second = _runner(store), _runner(store)
+        await first.start()
+        await second.start()
+        job = await first.submit(b"x")
+        assert await second.store.claim(job["_id"], "someone-else", jobs._now(), second._lease_expiry()) is None
+        finished = await first.wait(job["_id"], 2.0)
+        await first.stop()
+        await second.stop()
+        return finished
+
+    assert asyncio.run(main())["status"] == jobs.SUCCEEDED
+
+
+def test_live_runner_jobs_are_not_taken_over():
+    async def main():
+        store = jobs.InMemoryJobStore()
+        now = jobs._now()
+        await store.create({
+            "_id": "held", "status": jobs.RUNNING, "image": b"x", "created_at": now, "updated_at": now,
+            "lease_owner": "alive", "lease_expires_at": now + timedelta(seconds=60),
+        })
+        runner = _runner(store, lease_seconds=0.15)
+        await runner.start()
+        await asyncio.sleep(0.4)
+        await runner.stop()
+        return await store.get("held")
+
+    job = asyncio.run(main())
+    assert job["status"] == jobs.RUNNING and job["lease_owner"] == "alive"
+
+
+def test_lapsed_lease_is_recovered():
+    async def main():
+        store = jobs.InMemoryJobStore()
+        now = jobs._now()
+        await store.create({
+            "_id": "orphan", "status": jobs.RUNNING, "image": b"xy", "created_at": now, "updated_at": now,
+            "lease_owner": "dead", "lease_expires_at": now + timedelta(seconds=0.1),
+        })
+        runner = _runner(store, lease_seconds=0.15)
+        await runner.start()
+        finished = await runner.wait("orphan", 2.0)
+        await runner.stop()
+        return finished
+
+    job = asyncio.run(main())
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["result"] == {"value": 2}
+
+
+def test_events_stream_status_changes_until_finished():
+    async def main():
+        gate = asyncio.Event()
+
+        async def blocked(image_bytes):
+            await gate.wait()
+            return Result(value=1)
+
+        runner = _runner(handler=blocked)
+        await runner.start()
+        job = await runner.submit(b"x")
+        seen = []
+        async for current in runner.events(job["_id"], heartbeat_seconds=0.05):
+            seen.append(None if current is None else current["status"])
+            if seen.count(None) == 2:
+                gate.set()
+        await runner.stop()
+        return seen
+
+    seen = asyncio.run(main())
+    statuses = [status for status in seen if status is not None]
+    assert statuses[-1] == jobs.SUCCEEDED
+    assert statuses == list(dict.fromkeys(statuses))
+    assert None in seen
+
+
+def test_events_of_unknown_job_are_empty():
+    async def main():
+        runner = _runner()
+        return [event async for event in runner.events("missing", 0.05)]
+
+    assert asyncio.run(main()) == []
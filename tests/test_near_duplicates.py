@@ -0,0 +1,149 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+from app.services.document_classifier import DocumentType
+from app.services.near_duplicates import (
+    Fingerprint, HashIndex, NearDuplicateIndex, compute_fingerprint, hamming, image_fingerprint,
+)
+from app.services.pipeline import PipelineOutput
+
+MAX_DISTANCE = 8
+VERIFY_DISTANCE = 64
+
+
+def _random_hashes(rng: np.random.Generator, count: int) -> list[bytes]:
+    return [rng.integers(0, 2**64, 4, dtype=np.uint64).tobytes() for _ in range(count)]
+
+
+def _flip(value: bytes, bits: list[int]) -> bytes:
+    flipped = np.frombuffer(value, np.uint8).copy()
+    for bit in bits:
+        flipped[bit // 8] ^= 1 << (bit % 8)
+    return flipped.tobytes()
+
+
+def _digest(i: int) -> bytes:
+    return bytes([i % 256, i // 256]) * 16
+
+
+def _brute_force(hashes: list[bytes], query: bytes, max_distance: int) -> set[bytes]:
+    return {_digest(i) for i, value in enumerate(hashes) if hamming(value, query) <= max_distance}
+
+
+def test_hash_index_finds_exactly_the_hashes_within_the_radius():
+    rng = np.random.default_rng(5)
+    hashes = _random_hashes(rng, 3000)
+    index = HashIndex(max_bucket=10_000)
+    digests = [_digest(i) for i in range(len(hashes))]
+    index.add_many(hashes[:2000], digests[:2000])
+    index.merge()
+    # Left unmerged, so lookups cover the linear scan of recent additions too.
+    index.add_many(hashes[2000:], digests[2000:])
+
+    for max_distance in (0, 8, 15, 16, 24):
+        for position in (3, 1500, 2500):
+            # Every probe radius around the pigeonhole bound: up to one bit per chunk, and over it.
+            for flips in (0, max_distance // 2, max_distance, max_distance + 1):
+                query = _flip(hashes[position], rng.choice(256, flips, replace=False).tolist())
+                found = index.find(query, max_distance)
+                assert {digest for digest, _ in found} == _brute_force(hashes, query, max_distance)
+                assert [distance for _, distance in found] == sorted(distance for _, distance in found)
+
+
+def test_hash_index_skips_crowded_buckets_and_known_records():
+    rng = np.random.default_rng(6)
+    # Every hash shares its first chunk, like the layout every card of a type shares.
+    hashes = [b"\x00\x00" + value[2:] for value in _random_hashes(rng, 50)]
+    index = HashIndex(max_bucket=10)
+    index.add_many(hashes, [bytes([i]) * 32 for i in range(50)])
+    index.merge()
+    assert index.find(hashes[7], 0) == [(bytes([7]) * 32, 0)]
+    assert index.skipped_buckets > 0
+    assert index.add_many(hashes[:10], [bytes([i]) * 32 for i in range(10)], skip_known=True) == 0
+    assert index.size == 50
+
+
+def _card(name: str, number: str, seed: int) -> np.ndarray:
+    """A card of a fixed layout; only the name and number change."""
+    image = np.full((540, 856, 3), (235, 240, 245), np.uint8)
+    cv2.rectangle(image, (0, 0), (856, 90), (120, 60, 20), -1)
+    cv2.putText(image, "INCOME TAX DEPARTMENT", (40, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (255, 255, 255), 3)
+    cv2.rectangle(image, (640, 140), (800, 340), (150, 150, 150), -1)
+    cv2.putText(image, name, (40, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (20, 20, 30), 3)
+    cv2.putText(image, "01/02/1990", (40, 280), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (20, 20, 30), 3)
+    cv2.putText(image, number, (40, 420), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (20, 20, 30), 4)
+    # Sensor noise: a photographed card has no perfectly flat rows.
+    noise = np.random.default_rng(seed).normal(0, 8, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def _encode(image: np.ndarray, extension: str = ".png", *params: int) -> bytes:
+    return cv2.imencode(extension, image, list(params))[1].tobytes()
+
+
+def test_reencoded_and_resized_copies_match_and_another_card_does_not():
+    card = _card("RAHUL SHARMA", "ABCDE1234F", seed=1)
+    original = compute_fingerprint(_encode(card))
+    copies = [
+        _encode(card, ".jpg", cv2.IMWRITE_JPEG_QUALITY, 50),
+        _encode(cv2.resize(card, (428, 270), interpolation=cv2.INTER_AREA)),
+        _encode(cv2.resize(card, (1712, 1080), interpolation=cv2.INTER_CUBIC), ".jpg", cv2.IMWRITE_JPEG_QUALITY, 85),
+        # Letterboxed, as in a screenshot.
+        _encode(cv2.copyMakeBorder(card, 60, 60, 0, 0, cv2.BORDER_CONSTANT, value=(0, 0, 0))),
+    ]
+    for copy in copies:
+        fingerprint = compute_fingerprint(copy)
+        assert hamming(original.index_hash, fingerprint.index_hash) <= MAX_DISTANCE
+        assert hamming(original.verify_hash, fingerprint.verify_hash) <= VERIFY_DISTANCE
+
+    other = image_fingerprint(_card("ANITA DESAI", "PQRST6789U", seed=2))
+    assert hamming(original.verify_hash, other.verify_hash) > VERIFY_DISTANCE
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents: dict[str, dict] = {}
+
+    async def insert_one(self, document):
+        self.documents[document["digest"]] = document
+
+    def find(self, query, projection=None):
+        digests = query["digest"]["$in"]
+        return _Cursor([self.documents[digest] for digest in digests if digest in self.documents])
+
+
+class _Cursor:
+    def __init__(self, documents):
+        self.documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.documents)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+def test_index_returns_the_stored_result_only_after_verification():
+    card = _card("RAHUL SHARMA", "ABCDE1234F", seed=1)
+    stored = compute_fingerprint(_encode(card))
+    output = PipelineOutput(raw_text="RAHUL SHARMA ABCDE1234F", document_type=DocumentType.PAN_CARD)
+
+    async def main():
+        index = NearDuplicateIndex(FakeCollection(), MAX_DISTANCE, VERIFY_DISTANCE, max_bucket=5000)
+        await index.add("ab" * 32, stored, output)
+        hit = await index.find(compute_fingerprint(_encode(card, ".jpg", cv2.IMWRITE_JPEG_QUALITY, 60)))
+        # Same index hash, but the text the verification hash captures differs.
+        other = image_fingerprint(_card("ANITA DESAI", "PQRST6789U", seed=2))
+        miss = await index.find(Fingerprint(stored.index_hash, other.verify_hash))
+        return index, hit, miss
+
+    index, hit, miss = asyncio.run(main())
+    assert hit.digest == "ab" * 32
+    assert hit.output.raw_text == output.raw_text and hit.output.near_duplicate_of == "ab" * 32
+    assert miss is None
+    assert index.counters == {"lookups": 2, "candidates": 2, "rejected": 1, "hits": 1}
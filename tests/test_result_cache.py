@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from app.services import result_cache
+from app.services.document_classifier import DocumentType
+from app.services.pipeline import PipelineOutput
+from app.services.result_cache import MemoryTier, ResultCache, cache_key, from_entry, to_entry
+
+DIGEST = "ab" * 32
+
+
+def _output(text: str = "INCOME TAX DEPARTMENT") -> PipelineOutput:
+    return PipelineOutput(raw_text=text, document_type=DocumentType.UNKNOWN)
+
+
+class FailingTier:
+    async def setup(self):
+        pass
+
+    async def get(self, key):
+        raise ConnectionError("backing tier is down")
+
+    async def set(self, key, entry):
+        raise ConnectionError("backing tier is down")
+
+
+def test_concurrent_callers_share_one_computation():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return _output()
+
+    async def main():
+        cache = ResultCache(MemoryTier(10, 60))
+        results = await asyncio.gather(*(cache.get_or_compute(DIGEST, compute) for _ in range(5)))
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert calls == 1
+    assert [hit for _, hit in results].count(False) == 1
+    assert all(output.raw_text == "INCOME TAX DEPARTMENT" for output, _ in results)
+    assert (cache.misses, cache.coalesced) == (1, 4)
+    assert not cache._inflight
+
+
+def test_cancelled_owner_does_not_fail_coalesced_callers():
+    async def compute():
+        await asyncio.sleep(0.05)
+        return _output()
+
+    async def main():
+        cache = ResultCache(MemoryTier(10, 60))
+        owner = asyncio.create_task(cache.get_or_compute(DIGEST, compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute(DIGEST, compute))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        output, hit = await waiter
+        # The result is cached even though the caller that started it left.
+        cached = await cache.get(DIGEST)
+        return owner, output, hit, cached
+
+    owner, output, hit, cached = asyncio.run(main())
+    assert owner.cancelled()
+    assert output.raw_text == "INCOME TAX DEPARTMENT" and hit
+    assert cached is not None
+
+
+def test_failure_reaches_every_caller_and_is_not_cached():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("worker crashed")
+
+    async def main():
+        cache = ResultCache(MemoryTier(10, 60))
+        results = await asyncio.gather(*(cache.get_or_compute(DIGEST, compute) for _ in range(3)),
+                                       return_exceptions=True)
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(cache.memory) == 0
+
+
+def test_backing_tier_failure_does_not_fail_the_request():
+    async def compute():
+        return _output()
+
+    async def main():
+        cache = ResultCache(MemoryTier(10, 60), FailingTier())
+        return await cache.get_or_compute(DIGEST, compute)
+
+    output, hit = asyncio.run(main())
+    assert output.raw_text == "INCOME TAX DEPARTMENT" and not hit
+
+
+def test_memory_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    tier = MemoryTier(10, ttl_seconds=60)
+    tier.set("key", {"raw_text": "x"})
+    now[0] += 59
+    assert tier.get("key") is not None
+    now[0] += 2
+    assert tier.get("key") is None
+    assert len(tier) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    tier = MemoryTier(2, 60)
+    tier.set("a", {"n": 1})
+    tier.set("b", {"n": 2})
+    tier.get("a")
+    tier.set("c", {"n": 3})
+    assert tier.get("b") is None
+    assert tier.get("a") == {"n": 1} and tier.get("c") == {"n": 3}
+    assert tier.evictions == 1
+
+
+def test_results_of_another_pipeline_version_are_not_served(monkeypatch):
+    async def main():
+        cache = ResultCache(MemoryTier(10, 60))
+        await cache.put(DIGEST, _output())
+        before = await cache.get(DIGEST)
+        monkeypatch.setattr(result_cache, "_VERSION_TAG", "another-version")
+        return before, await cache.get(DIGEST)
+
+    before, after = asyncio.run(main())
+    assert before is not None and after is None
+    assert cache_key(DIGEST).startswith("another-version")
+
+
+def test_entries_round_trip():
+    output = _output()
+    output.near_duplicate_of = "cd" * 32
+    restored = from_entry(to_entry(output))
+    assert (restored.raw_text, restored.document_type, restored.near_duplicate_of) == (
+        output.raw_text, output.document_type, output.near_duplicate_of)
@@ -0,0 +1,12 @@
+from app import config, serve
+
+
+def test_ocr_threads_override_the_settings_derived_from_ocr_workers(monkeypatch):
+    for name in ("OCR_WORKERS", "JOB_CONCURRENCY", "PAGES_PARALLELISM"):
+        monkeypatch.setattr(config, name, getattr(config, name))
+    monkeypatch.delenv("JOB_CONCURRENCY", raising=False)
+    monkeypatch.setenv("PAGES_PARALLELISM", "6")
+    serve._set_ocr_workers(3)
+    assert (config.OCR_WORKERS, config.JOB_CONCURRENCY) == (3, 3)
+    # An explicit setting still wins.
+    assert config.PAGES_PARALLELISM == 6
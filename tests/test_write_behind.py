@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from app import persistence
+from app.services.document_classifier import DocumentType
+
+PAN = DocumentType.PAN_CARD
+
+
+class FakeCollection:
+    """Records insert_many calls and rejects numbers it already holds, like a unique index."""
+
+    def __init__(self, fail_with: BaseException | None = None, error_codes: dict | None = None):
+        self.numbers: set[str] = set()
+        self.batches: list[int] = []
+        self.fail_with = fail_with
+        # Number -> error code to report instead of storing it.
+        self.error_codes = error_codes or {}
+
+    async def insert_many(self, documents, ordered=True):
+        self.batches.append(len(documents))
+        if self.fail_with is not None:
+            error, self.fail_with = self.fail_with, None
+            raise error
+        errors = []
+        for index, document in enumerate(documents):
+            number = document["pan_number"]
+            if number in self.error_codes:
+                errors.append({"index": index, "code": self.error_codes[number], "errmsg": "rejected"})
+            elif number in self.numbers:
+                errors.append({"index": index, "code": persistence.DUPLICATE_KEY_ERROR, "errmsg": "duplicate"})
+            else:
+                self.numbers.add(number)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    fake = FakeCollection()
+    monkeypatch.setitem(persistence.KYC_COLLECTIONS, PAN, (fake, "pan_number"))
+    return fake
+
+
+def _run(coroutine_function, *args):
+    return asyncio.run(coroutine_function(*args))
+
+
+def test_outcomes_follow_the_unique_index(collection):
+    collection.numbers.add("AAAAA1111A")
+    collection.error_codes["CCCCC3333C"] = 121
+
+    async def main():
+        buffer = persistence.WriteBehindBuffer(max_batch=10, flush_interval=0.01)
+        buffer.start()
+        futures = [buffer.submit(PAN, {"pan_number": number})
+                   for number in ("AAAAA1111A", "BBBBB2222B", "CCCCC3333C", "BBBBB2222B")]
+        await buffer.close()
+        return buffer, futures
+
+    buffer, futures = _run(main)
+    assert futures[0].result() is True
+    assert futures[1].result() is False
+    assert isinstance(futures[2].exception(), OperationFailure)
+    # The same number twice in one batch: the second is the duplicate.
+    assert futures[3].result() is True
+    assert buffer.counters == {"flushes": 1, "inserted": 1, "duplicates": 2, "errors": 1}
+
+
+def test_full_batch_flushes_without_waiting(collection):
+    async def main():
+        buffer = persistence.WriteBehindBuffer(max_batch=3, flush_interval=60)
+        buffer.start()
+        futures = [buffer.submit(PAN, {"pan_number": f"AAAAA{i:04d}A"}) for i in range(3)]
+        await asyncio.wait_for(asyncio.gather(*futures), 1.0)
+        await buffer.close()
+
+    _run(main)
+    assert collection.batches == [3]
+
+
+def test_partial_batch_flushes_after_the_interval(collection):
+    async def main():
+        buffer = persistence.WriteBehindBuffer(max_batch=100, flush_interval=0.05)
+        buffer.start()
+        futures = [buffer.submit(PAN, {"pan_number": f"AAAAA{i:04d}A"}) for i in range(2)]
+        await asyncio.sleep(0.02)
+        assert collection.batches == []
+        await asyncio.wait_for(asyncio.gather(*futures), 1.0)
+        await buffer.close()
+
+    _run(main)
+    assert collection.batches == [2]
+
+
+def test_close_drains_every_pending_record(collection):
+    async def main():
+        buffer = persistence.WriteBehindBuffer(max_batch=2, flush_interval=60)
+        buffer.start()
+        futures = [buffer.submit(PAN, {"pan_number": f"AAAAA{i:04d}A"}) for i in range(5)]
+        # Without waiting out the flush interval for the last, partial batch.
+        await asyncio.wait_for(buffer.close(), 1.0)
+        return futures
+
+    futures = _run(main)
+    assert all(future.done() and future.result() is False for future in futures)
+    assert sum(collection.batches) == 5
+    with pytest.raises(RuntimeError):
+        persistence.WriteBehindBuffer(2, 60).submit(PAN, {})
+
+
+def test_buffer_survives_an_unexpected_insert_error(collection):
+    collection.fail_with = ValueError("cannot encode object")
+
+    async def main():
+        buffer = persistence.WriteBehindBuffer(max_batch=1, flush_interval=0.01)
+        buffer.start()
+        failed = buffer.submit(PAN, {"pan_number": "AAAAA1111A"})
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(failed, 1.0)
+        stored = await asyncio.wait_for(buffer.submit(PAN, {"pan_number": "BBBBB2222B"}), 1.0)
+        await buffer.close()
+        return stored
+
+    assert _run(main) is False
+    assert collection.numbers == {"BBBBB2222B"}
+
+
+class FakeDedupIndex:
+    def __init__(self):
+        self.added = []
+
+    def add(self, doc_type, number):
+        self.added.append(number)
+
+
+def test_unacknowledged_write_marks_number_seen_only_once_settled(monkeypatch):
+    dedup = FakeDedupIndex()
+    monkeypatch.setattr(persistence, "dedup_index", dedup)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        stored, failed, cancelled = loop.create_future(), loop.create_future(), loop.create_future()
+        stored.set_result(False)
+        failed.set_exception(OperationFailure("write failed"))
+        cancelled.cancel()
+        persistence._settle_unacknowledged(PAN, "AAAAA1111A", stored)
+        persistence._settle_unacknowledged(PAN, "BBBBB2222B", failed)
+        persistence._settle_unacknowledged(PAN, "CCCCC3333C", cancelled)
+
+    _run(main)
+    assert dedup.added == ["AAAAA1111A"]